@@ -1,12 +1,38 @@
 from __future__ import absolute_import, print_function
-from gsmodutils.project.interface import GSMProject
-from gsmodutils.project.project_config import ProjectConfig
-from gsmodutils.project.design import StrainDesign
-from gsmodutils.project.model import GSModutilsModel
-from gsmodutils.utils.io import load_model
+import importlib
 import logging
+import sys
 
 logger = logging.getLogger(__name__)
 
 
 __version__ = '0.0.4'
+
+# Public classes are imported on first use so that importing gsmodutils (e.g. for the command line interface) does not
+# pull in cobra, pandas and other heavy dependencies
+_lazy_imports = dict(
+    GSMProject='gsmodutils.project.interface',
+    ProjectConfig='gsmodutils.project.project_config',
+    StrainDesign='gsmodutils.project.design',
+    GSModutilsModel='gsmodutils.project.model',
+    load_model='gsmodutils.utils.io',
+)
+
+__all__ = list(_lazy_imports.keys())
+
+
+def __getattr__(name):
+    if name in _lazy_imports:
+        value = getattr(importlib.import_module(_lazy_imports[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+if sys.version_info < (3, 7):
+    # Module level __getattr__ is not supported, import everything eagerly
+    from gsmodutils.project.interface import GSMProject  # pragma: no cover
+    from gsmodutils.project.project_config import ProjectConfig  # pragma: no cover
+    from gsmodutils.project.design import StrainDesign  # pragma: no cover
+    from gsmodutils.project.model import GSModutilsModel  # pragma: no cover
+    from gsmodutils.utils.io import load_model  # pragma: no cover
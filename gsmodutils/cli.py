@@ -3,21 +3,27 @@ This module contains the main command line interface for project creation, testi
 """
 from __future__ import absolute_import, division, generators, print_function, nested_scopes, with_statement
 
+import functools
 import json
 import os
 
 import click
-import cobra
 
-from gsmodutils.exceptions import ProjectNotFound, ValidationError, DesignError, DesignOrphanError
-from gsmodutils.model_diff import model_diff
-from gsmodutils import GSMProject, load_model
-from gsmodutils.project.project_config import ProjectConfig
+from gsmodutils.exceptions import ProjectNotFound, DesignError, DesignOrphanError
+from gsmodutils import daemon
 from sys import exit
 
+# cobra, pandas and the project classes are imported inside the commands that use them. This keeps start up fast for
+# light commands and for commands that are forwarded to a project daemon.
+
 
 def _load_project(project_path):
-    project = None
+    from gsmodutils import GSMProject
+    # When running inside a project daemon, use its warm project
+    project = daemon.active_project(project_path)
+    if project is not None:
+        return project
+
     try:
         project = GSMProject(project_path)
     except ProjectNotFound:
@@ -27,18 +33,59 @@ def _load_project(project_path):
     return project
 
 
-@click.group()
+class _ArgsGroup(click.Group):
+    """ Group that keeps the raw command line arguments, so that commands can be forwarded to a project daemon """
+
+    def parse_args(self, ctx, args):
+        ctx.meta['gsmodutils_args'] = list(args)
+        return super(_ArgsGroup, self).parse_args(ctx, args)
+
+
+def _daemon_route(func):
+    """
+    Decorator for commands that can run in a project daemon.
+    If a daemon is running for the project, the command is executed there and its output is echoed.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ctx = click.get_current_context()
+        raw_args = ctx.find_root().meta.get('gsmodutils_args')
+        # Long running commands, such as watching for changes, are always run in this process
+        if raw_args is not None and not kwargs.get('watch', False):
+            result = daemon.forward_command(kwargs.get('project_path', '.'), raw_args,
+                                            color=not click.utils.should_strip_ansi())
+            if result is not None:
+                output, exit_code = result
+                click.echo(output, nl=False)
+                exit(exit_code)
+
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+@click.group(cls=_ArgsGroup)
 def cli():
     """Command line tools for management of gsmodutils genome scale model projects"""
     pass  # pragma: no cover
 
 
-def _output_child_logs(log, verbose=False, indent=4, baseindent=4):
+def _log_selected(log, test_ids):
+    """ True if the log, or any of its children, is for one of the selected tests """
+    if log.id in test_ids:
+        return True
+    return any(_log_selected(clog, test_ids) for clog in log.children.values())
+
+
+def _output_child_logs(log, verbose=False, indent=4, baseindent=4, test_ids=None):
     """
     Outputs logs with indentations and counts the total number of tests and errors
     """
     idt = " "*indent
     for cid, clog in log.children.items():
+        if test_ids is not None and not _log_selected(clog, test_ids):
+            continue
+
         style = 'red'
         if clog.is_success:
             style = 'green'
@@ -62,7 +109,7 @@ def _output_child_logs(log, verbose=False, indent=4, baseindent=4):
                     click.style(idt + "Assertion success: {}".format(msg), fg='green')
                 )
             
-        _output_child_logs(clog, verbose=verbose, indent=indent+baseindent)
+        _output_child_logs(clog, verbose=verbose, indent=indent+baseindent, test_ids=test_ids)
 
         if verbose and log.std_out not in [None, "", " "]:
             click.echo("-------- Start standard output ----------")
@@ -71,6 +118,102 @@ def _output_child_logs(log, verbose=False, indent=4, baseindent=4):
         click.echo()
         
 
+def _affected_tests(project, tester, path):
+    """
+    Tests affected by a model or saved model diff
+    :param project: GSMProject
+    :param tester: GSMTester with collected tests
+    :param path: path to a model file or json diff output by gsmodutils diff
+    :return: set of test ids
+    """
+    from gsmodutils.model_diff import ModelDiff, model_diff
+    mdiff = None
+    if path.endswith('.json'):
+        with open(path) as infile:
+            data = json.load(infile)
+        if 'removed_reactions' in data:
+            mdiff = ModelDiff(**data)
+
+    if mdiff is None:
+        from gsmodutils import load_model
+        mdiff = model_diff(project.load_model(), load_model(path))
+
+    return set(tester.affected_by(mdiff))
+
+
+def _watch_tests(project_path, skip_default, interval, max_cycles=None):
+    """ Run tests, then rerun affected tests each time project files change """
+    from gsmodutils.test.watch import TestWatcher
+    try:
+        watcher = TestWatcher(project_path, skip_default=skip_default)
+    except ProjectNotFound:
+        click.echo('Error project not found in path'.format(project_path))
+        exit(-1)
+
+    def report(wr):
+        for line in wr.lines():
+            if line.strip().startswith('FAIL') or line.strip().startswith('ERROR'):
+                click.echo(click.style(line, fg='red'))
+            elif line.strip().startswith('FIXED'):
+                click.echo(click.style(line, fg='green'))
+            else:
+                click.echo(line)
+
+    click.echo('Watching {} for changes, press Ctrl+C to stop'.format(watcher.project.project_path))
+    try:
+        watcher.watch(report, interval=interval, max_cycles=max_cycles)
+    except KeyboardInterrupt:
+        pass
+
+
+def _output_test_logs(logs, verbose=False, test_ids=None):
+    """
+    Output the results of test files
+    :param logs: dictionary of test file to ResultRecord
+    :param verbose: show successful assertions
+    :param test_ids: only show these tests (and their parents)
+    :return: tuple (total assertions, total errors)
+    """
+    barstr = "-"*25
+    ts = 0
+    te = 0
+
+    for tf, log in logs.items():
+        if test_ids is not None and not _log_selected(log, test_ids):
+            continue
+
+        if tf == 'default_tests':
+            click.echo('Default project file tests (models, designs, conditions):')
+            indicator = "Project file"
+        else:
+            click.echo("Test file {}:".format(tf))
+            indicator = "Test file"
+        lc = log.log_count
+        ts += lc[0]
+        te += lc[1]
+        click.echo("Counted {} test assertions with {} failures".format(*lc))
+        # Output base test file
+        if not log.is_success:
+            click.echo(click.style('{} has test errors'.format(indicator), fg='red'))
+        else:
+            click.echo(click.style('{} completed all tests without error'.format(indicator), fg='green'))
+
+        # Count total tests, count total assertions
+        _output_child_logs(log, verbose=verbose, test_ids=test_ids)
+
+        if log.std_out not in [None, "", " "]:
+            click.echo(
+                click.style(barstr + ' Captured standard output ' + barstr, fg='black', bg='white')
+            )
+            click.echo(log.std_out)
+            click.echo(
+                click.style(barstr + ' End standard output ' + barstr, fg='black', bg='white')
+            )
+    percent = round(((ts - te) / ts) * 100, 3) if ts else 100.0
+    click.echo('Ran {} test assertions with a total of {} errors ({}% success)'.format(ts, te, percent))
+    return ts, te
+
+
 @click.command()
 @click.option('--project_path', default='.', help='gsmodutils project path')
 @click.option('--test_id', default=None, help='specify a given test identifier to run - pyton filename, function or' +
@@ -78,17 +221,37 @@ def _output_child_logs(log, verbose=False, indent=4, baseindent=4):
 @click.option('--skip_default/--no_skip_default', default=False, help='skip default tests')
 @click.option('--verbose/--no_verbose', default=False, help='Display succesfully run test assertions')
 @click.option('--log_path', default=None, type=click.Path(writable=True), help='path to output json test log')
-def test(project_path, test_id, skip_default, verbose, log_path):
+@click.option('--log_format', default='json', type=click.Choice(['json', 'ndjson']),
+              help='json writes a nested log at the end of the run, ndjson writes a line as each test finishes')
+@click.option('--watch/--no_watch', default=False, help='Keep running, rerun tests affected by changes to project files')
+@click.option('--interval', default=1.0, type=float, help='Seconds between checks for changes in watch mode')
+@click.option('--affected_by', '--affected-by', 'affected_by', default=None, type=click.Path(exists=True),
+              help='Only run tests affected by changes in a model, or a json diff saved with gsmodutils diff')
+@click.option('--save_index/--no_save_index', default=False,
+              help='Save the references of each test in the project, used by --affected_by')
+@click.option('--shard', default=None, help='Only run one part of the tests, given as i/n for part i of n')
+@click.option('--durations_log', default=None, type=click.Path(exists=True),
+              help='json log of a previous run, used to give shards similar run times')
+@click.option('--isolate/--no_isolate', default=False,
+              help='Run tests in worker processes, so that crashes do not stop the test run')
+@click.option('--processes', default=1, type=int, help='Number of worker processes for isolated tests')
+@click.option('--timeout', default=None, type=float, help='Maximum seconds for each test, implies --isolate')
+@click.option('--memory_limit', default=None, type=float,
+              help='Maximum memory (MB) for each test worker, implies --isolate')
+@_daemon_route
+def test(project_path, test_id, skip_default, verbose, log_path, log_format, watch, interval, affected_by, save_index,
+         shard, durations_log, isolate, processes, timeout, memory_limit):
     """Run tests for a project"""
+    if watch:
+        _watch_tests(project_path, skip_default, interval)
+        exit(0)
+
     project = _load_project(project_path)
     tester = project.project_tester()
-    # Collect list of tests
-    click.echo('Collecting tests...')
-    tester.collect_tests()
 
     if test_id is not None:
-        # Only run specific test id
-        if test_id not in tester.test_ids:
+        # Only run specific test id, only the tests needed to find it are collected
+        if not tester.has_test(test_id):
             click.echo(
                 click.style('Test {} not found'.format(test_id), fg='red')
             )
@@ -99,9 +262,40 @@ def test(project_path, test_id, skip_default, verbose, log_path):
             click.echo("results for {}".format(log.id))
             # run test, get log
             _output_child_logs(log, verbose=verbose)
+            if save_index:
+                tester.update_impact_index()
         
         exit(0)
-    
+
+    # Collect list of tests
+    click.echo('Collecting tests...')
+    tester.collect_tests()
+
+    selected = None
+    if affected_by is not None:
+        selected = _affected_tests(project, tester, affected_by)
+        if skip_default:
+            selected -= set(tester.default_tests)
+        click.echo('{} tests affected by changes in {}'.format(len(selected), affected_by))
+        if not len(selected):
+            exit(0)
+
+    if shard is not None:
+        from gsmodutils.test.shard import select_shard, log_durations
+        from gsmodutils.test.report import read_log
+        durations = None
+        if durations_log is not None:
+            durations = log_durations(read_log(durations_log))
+
+        if selected is None:
+            selected = tester.leaf_ids(skip_default)
+        try:
+            selected = set(select_shard(selected, shard, durations))
+        except ValueError as exp:
+            click.echo(click.style(str(exp), fg='red'))
+            exit(-1)
+        click.echo('Running shard {} with {} tests'.format(shard, len(selected)))
+
     barstr = "-"*25
 
     click.echo(
@@ -112,43 +306,25 @@ def test(project_path, test_id, skip_default, verbose, log_path):
         click.echo("verbose mode, showing successes and failures")
         click.echo()
 
-    click.echo('Running tests: ')
-    tester.progress_tests(skip_default=skip_default)
-    click.echo()
-    ts = 0
-    te = 0
-
-    for tf, log in tester.log.items():
+    reporter = None
+    if log_path is not None and log_format == 'ndjson':
+        from gsmodutils.test.report import StreamReporter
+        reporter = StreamReporter(log_path)
 
-        if tf == 'default_tests':
-            click.echo('Default project file tests (models, designs, conditions):')
-            indicator = "Project file"
-        else:
-            click.echo("Test file {}:".format(tf))
-            indicator = "Test file"
-        lc = log.log_count
-        ts += lc[0]
-        te += lc[1]
-        click.echo("Counted {} test assertions with {} failures".format(*lc))
-        # Output base test file
-        if not log.is_success:
-            click.echo(click.style('{} has test errors'.format(indicator), fg='red'))
+    click.echo('Running tests: ')
+    try:
+        if isolate or timeout is not None or memory_limit is not None:
+            tester.isolated_tests(skip_default=skip_default, test_ids=selected, processes=processes, timeout=timeout,
+                                  memory_limit=memory_limit, callback=reporter)
         else:
-            click.echo(click.style('{} completed all tests without error'.format(indicator), fg='green'))
-
-        # Count total tests, count total assertions
-        _output_child_logs(log, verbose=verbose)
-
-        if log.std_out not in [None, "", " "]:
-            click.echo(
-                click.style(barstr + ' Captured standard output ' + barstr, fg='black', bg='white')
-            )
-            click.echo(log.std_out)
-            click.echo(
-                click.style(barstr + ' End standard output ' + barstr, fg='black', bg='white')
-            )
-    percent = round(((ts - te) / ts) * 100, 3)
-    click.echo('Ran {} test assertions with a total of {} errors ({}% success)'.format(ts, te, percent))
+            tester.progress_tests(skip_default=skip_default, test_ids=selected, callback=reporter)
+    finally:
+        if reporter is not None:
+            reporter.close()
+    if save_index or affected_by is not None:
+        tester.update_impact_index()
+    click.echo()
+    _output_test_logs(tester.log, verbose=verbose, test_ids=selected)
 
     # Display errors
     for tf, e in tester.load_errors:
@@ -170,12 +346,39 @@ def test(project_path, test_id, skip_default, verbose, log_path):
         click.echo('\t{}'.format(exception.message))
 
     # Save report to json log file
-    if log_path is not None:
+    if reporter is not None:
+        click.echo('log file written to {}'.format(log_path))
+    elif log_path is not None:
         with open(log_path, 'w+') as lf:
             json.dump(tester.to_dict(), lf, indent=4)
             click.echo('log file written to {}'.format(log_path))
 
 
+@click.command('merge-logs')
+@click.argument('log_paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--output', default=None, type=click.Path(writable=True), help='path to write the merged json log')
+@click.option('--verbose/--no_verbose', default=False, help='Display succesfully run test assertions')
+def merge_logs(log_paths, output, verbose):
+    """Combine json logs written by test shards in to one report"""
+    from gsmodutils.test.shard import merge_logs as merge_log_dicts
+    from gsmodutils.test.report import read_log
+    from gsmodutils.test.utils import ResultRecord
+
+    log_dicts = [read_log(lpath) for lpath in log_paths]
+
+    merged = merge_log_dicts(log_dicts)
+    logs = dict((tf, ResultRecord.from_dict(log)) for tf, log in merged.items())
+    _, te = _output_test_logs(logs, verbose=verbose)
+
+    if output is not None:
+        with open(output, 'w+') as lf:
+            json.dump(merged, lf, indent=4)
+            click.echo('log file written to {}'.format(output))
+
+    if te:
+        exit(-1)
+
+
 @click.command()
 @click.argument('project_path', type=click.Path(writable=True))
 @click.argument('default_model_path', type=click.Path(exists=True))
@@ -188,6 +391,8 @@ def test(project_path, test_id, skip_default, verbose, log_path):
 @click.option('--validate/--skip_validation', default=True, help='Require the model to be validated')
 def init(project_path, default_model_path, name, description, author, email, add_models, validate):
     """Create a new gsmodutils project"""
+    from gsmodutils.project.project_config import ProjectConfig
+
     click.echo('Project creation {}'.format(project_path))
     click.echo('Using model {}'.format(default_model_path))
 
@@ -227,8 +432,12 @@ def init(project_path, default_model_path, name, description, author, email, add
 @click.option('--parent', default=None, help='A parent design')
 @click.option('--output', default=None, help='A location to output the diff as a sjon file')
 @click.option('--names/--no-names', default=True, help='Output names of added or changed metabolites and reactions')
+@_daemon_route
 def diff(model_path, base_model, project_path, parent, output, names):
     """ View the changed reactions between a model and a base model """
+    from gsmodutils import load_model
+    from gsmodutils.model_diff import model_diff
+
     project = _load_project(project_path)
     base_model = project.load_model(base_model)
     if parent is not None:
@@ -285,6 +494,8 @@ def addmodel(path, project_path, validate):
     If validation is selected, where the model fails to conform to cobra standards, the model will not be added to the
     project.
     """
+    from gsmodutils.exceptions import ValidationError
+
     project = _load_project(project_path)
     try:
         project.add_model(path, validate=validate)
@@ -311,6 +522,8 @@ def addmodel(path, project_path, validate):
 @click.option('--from_diff/--not_from_diff', default=False, help='load a diff file instead of compatible model')
 def dimport(model_path, identifier, name, description, project_path, parent, base_model, overwrite, from_diff):
     """ Import a design into a model. This can be new or overwrite an existing design. """
+    from gsmodutils import load_model
+    from gsmodutils.exceptions import ValidationError
 
     project = _load_project(project_path)
     try:
@@ -362,6 +575,8 @@ def dimport(model_path, identifier, name, description, project_path, parent, bas
 @click.option('--growth/--no_growth', default=True, help='Should these conditions allow growth or not')
 def iconditions(path, ident, project_path, apply_to, growth):
     """ Add a given set of media condtions from a model (this ignores any added or removed reactions or metabolites)"""
+    from gsmodutils import load_model
+
     model = load_model(path)
     project = _load_project(project_path)
     project.save_conditions(model, ident, apply_to=apply_to, observe_growth=growth)
@@ -378,8 +593,11 @@ _output_fmts = ('json', 'yaml', 'sbml', 'matlab', 'mat', 'm', 'scrumpy', 'spy')
 @click.option('--conditions', default=None, help='conditions to apply')
 @click.option('--design', default=None, help='design to apply')
 @click.option('--overwrite/--no-overwrite', default=False, help='model id')
+@_daemon_route
 def export(file_format, filepath, project_path, model_id, design, conditions, overwrite):
     """ Export a given model with a specific design and conditions applied """
+    import cobra
+
     if os.path.exists(filepath) and not overwrite:
         click.echo('error - {} already exists. Must use overwrite option'.format(filepath))
         exit(-1)
@@ -410,8 +628,92 @@ def export(file_format, filepath, project_path, model_id, design, conditions, ov
 
 @click.command()
 @click.option('--project_path', default='.', help='gsmodutils project path')
+@click.option('--design', multiple=True, help='design to evaluate (default is all designs)')
+@click.option('--conditions', multiple=True, help='conditions to evaluate under (default is all conditions)')
+@click.option('--flux', multiple=True, help='reaction identifier to report the flux of')
+@click.option('--processes', default=None, type=int, help='number of worker processes to use')
+@click.option('--output', default=None, type=click.Path(writable=True), help='path to write csv output')
+def evaluate(project_path, design, conditions, flux, processes, output):
+    """ Evaluate the objective value and fluxes of every design under every set of conditions """
+    project = _load_project(project_path)
+
+    designs = list(design) if len(design) else None
+    conditions = list(conditions) if len(conditions) else None
+
+    try:
+        df = project.evaluate_designs(designs=designs, conditions=conditions, fluxes=list(flux), processes=processes)
+    except KeyError as exp:
+        click.echo(click.style('Error: {}'.format(exp), fg='red'))
+        exit(-1)
+
+    if output is not None:
+        df.to_csv(output)
+        click.echo('Results written to {}'.format(output))
+    else:
+        click.echo(df.to_string())
+
+
+@click.command()
+@click.option('--project_path', default='.', help='gsmodutils project path')
+@click.option('--model', multiple=True, help='model to validate (default is all models)')
+@click.option('--design', multiple=True, help='design to validate (default is all designs)')
+@click.option('--conditions', multiple=True, help='conditions to validate under (default is all conditions)')
+@click.option('--processes', default=None, type=int, help='number of worker processes to use')
+@click.option('--output', default=None, type=click.Path(writable=True), help='path to write json report')
+@click.option('--verbose/--no_verbose', default=False, help='Display warnings')
+def validate(project_path, model, design, conditions, processes, output, verbose):
+    """ Check mass balance, orphan metabolites and growth of every model and design under every set of conditions """
+    project = _load_project(project_path)
+
+    models = list(model) if len(model) else None
+    designs = list(design) if len(design) else None
+    conditions = list(conditions) if len(conditions) else None
+
+    # Selecting only models, or only designs, skips the other
+    if models is not None and designs is None:
+        designs = []
+    elif designs is not None and models is None:
+        models = []
+
+    try:
+        report = project.validate(models=models, designs=designs, conditions=conditions, processes=processes)
+    except KeyError as exp:
+        click.echo(click.style('Error: {}'.format(exp), fg='red'))
+        exit(-1)
+
+    for result in report['results']:
+        if result['design'] is not None:
+            name = 'design::{}'.format(result['design'])
+        else:
+            name = 'model::{}'.format(result['model'])
+
+        summary = '{} - {} errors, {} warnings'.format(name, len(result['errors']), len(result['warnings']))
+        click.echo(click.style(summary, fg='red' if len(result['errors']) else 'green'))
+        for error in result['errors']:
+            click.echo(click.style('\t{}'.format(error), fg='red'))
+        if verbose:
+            for warning in result['warnings']:
+                click.echo('\t{}'.format(warning))
+
+    click.echo('Validated {} models and designs with a total of {} errors and {} warnings'.format(
+        len(report['results']), report['errors'], report['warnings']))
+
+    if output is not None:
+        with open(output, 'w+') as report_file:
+            json.dump(report, report_file, indent=4)
+        click.echo('Report written to {}'.format(output))
+
+    if report['errors']:
+        exit(-1)
+
+
+@click.command()
+@click.option('--project_path', default='.', help='gsmodutils project path')
+@_daemon_route
 def info(project_path):
     """ Display all the information about a gsmodutils project (list models, paths, designs etc. """
+    from gsmodutils.exceptions import ValidationError
+
     project = _load_project(project_path)
 
     click.echo("-" * click.get_terminal_size()[0])
@@ -554,12 +856,43 @@ def docker(project_path, overwrite, build, save, tag, save_path):
             exit(-1)  # pragma: no cover
 
 
+@click.command()
+@click.option('--project_path', default='.', help='gsmodutils project path')
+@click.option('--stop/--start', default=False, help='stop a running daemon')
+def serve(project_path, stop):
+    """
+    Run a daemon that keeps the project, models and designs in memory.
+    While running, test, export, diff and info commands for the project are executed by the daemon.
+    The daemon reloads the project whenever files in the project change.
+    """
+    if stop:
+        if daemon.stop_daemon(project_path):
+            click.echo('Daemon stopped')
+        else:
+            click.echo('No daemon running for project {}'.format(os.path.abspath(project_path)))
+        return
+
+    project_daemon = daemon.ProjectDaemon(project_path)
+    # Ensure the path is a valid project before listening
+    _load_project(project_path)
+    click.echo('Serving project {} on {}'.format(project_daemon.project_path, daemon.socket_path(project_path)))
+    try:
+        project_daemon.serve()
+    except OSError as exp:
+        click.echo(click.style('Error: {}'.format(exp), fg='red'))
+        exit(-1)
+
+
 cli.add_command(test)
+cli.add_command(merge_logs)
 cli.add_command(addmodel)
 cli.add_command(export)
+cli.add_command(evaluate)
+cli.add_command(validate)
 cli.add_command(dimport)
 cli.add_command(init)
 cli.add_command(info)
 cli.add_command(diff)
 cli.add_command(iconditions)
 cli.add_command(docker)
+cli.add_command(serve)
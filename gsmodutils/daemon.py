@@ -0,0 +1,271 @@
+"""
+Optional long running project daemon.
+
+Running `gsmodutils serve` in a project directory starts a server listening on a unix socket inside the project.
+The server keeps the project, parsed models, designs and their solvers in memory. Command line calls for the project
+(test, export, diff and info) are forwarded to the server and executed there, avoiding the cost of importing
+dependencies and parsing models on every call.
+
+Before each request the daemon checks the modification times of the project configuration, model, design, conditions
+and test files. Only the cached models and designs read from changed files are dropped, the warm project is only
+rebuilt when the project configuration changes.
+
+Clients wait at most CONNECT_TIMEOUT seconds to connect to the daemon and, for commands, the number of seconds set by
+the GSMODUTILS_DAEMON_TIMEOUT environment variable for a response. If the daemon does not respond the command is run by
+the client instead.
+"""
+from __future__ import print_function, absolute_import, division
+
+import json
+import os
+import socket
+import sys
+
+SOCKET_NAME = '.gsmodutils.sock'
+DISABLE_ENV = 'GSMODUTILS_NO_DAEMON'
+TIMEOUT_ENV = 'GSMODUTILS_DAEMON_TIMEOUT'
+
+# Seconds to wait for the daemon to accept a connection
+CONNECT_TIMEOUT = 5.0
+# Seconds to wait for the response to a command, unless set in TIMEOUT_ENV
+DEFAULT_TIMEOUT = 3600.0
+
+# Set within the daemon process, projects loaded by the cli are taken from the warm daemon
+_active_daemon = None
+
+
+def socket_path(project_path):
+    """ Location of the daemon socket for a given project """
+    return os.path.join(os.path.abspath(project_path), SOCKET_NAME)
+
+
+def response_timeout():
+    """ Seconds to wait for the daemon to respond to a command """
+    try:
+        return float(os.environ.get(TIMEOUT_ENV, DEFAULT_TIMEOUT))
+    except ValueError:
+        return DEFAULT_TIMEOUT
+
+
+def _send(project_path, request, timeout=CONNECT_TIMEOUT):
+    """
+    Send a json request to a running daemon.
+    :param timeout: seconds to wait for the response
+    :return: decoded response, or None if no daemon is listening or it did not respond in time
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None  # pragma: no cover
+
+    spath = socket_path(project_path)
+    if not os.path.exists(spath):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(spath)
+        client.settimeout(timeout)
+        client.sendall((json.dumps(request) + "\n").encode('utf-8'))
+        with client.makefile('rb') as rfile:
+            line = rfile.readline()
+    except socket.timeout:
+        print("gsmodutils daemon did not respond, running command without it", file=sys.stderr)
+        return None
+    except (IOError, OSError):
+        # Stale socket left by a daemon that was not shut down
+        return None
+    finally:
+        client.close()
+
+    if not len(line):
+        return None
+
+    return json.loads(line.decode('utf-8'))
+
+
+def forward_command(project_path, args, color=False):
+    """
+    Run a cli command in a running daemon, if there is one.
+    :param project_path: project the command applies to
+    :param args: list of command line arguments (excluding the program name)
+    :param color: keep terminal styling in the output
+    :return: tuple (output, exit_code) or None if the command could not be forwarded
+    """
+    if _active_daemon is not None or os.environ.get(DISABLE_ENV):
+        return None
+
+    response = _send(project_path, dict(args=list(args), cwd=os.getcwd(), color=color), timeout=response_timeout())
+    if response is None:
+        return None
+
+    return response['output'], response['exit_code']
+
+
+def daemon_running(project_path):
+    """ True if a daemon is listening for the given project """
+    return _send(project_path, dict(ping=True)) is not None
+
+
+def stop_daemon(project_path):
+    """
+    Stop a running daemon
+    :return: True if a daemon was running
+    """
+    return _send(project_path, dict(shutdown=True)) is not None
+
+
+def active_project(project_path):
+    """
+    The warm project held by the daemon running in this process, None if this process is not a daemon or the path
+    refers to another project.
+    """
+    if _active_daemon is None:
+        return None
+    return _active_daemon.get_project(project_path)
+
+
+def project_snapshot(project):
+    """
+    Modification times and sizes of the files a project is loaded from: the project configuration, conditions, models
+    and the files in the design and test directories
+    :param project: GSMProject
+    :return: dictionary of absolute file path to (mtime, size) tuples
+    """
+    paths = [project.project_file, project.conditions_file]
+    paths += [os.path.join(project.project_path, mpath) for mpath in project.config.models]
+    for directory in [project.design_path, project.tests_dir]:
+        if os.path.isdir(directory):
+            paths += [os.path.join(directory, fname) for fname in os.listdir(directory)]
+
+    snapshot = dict()
+    for fpath in paths:
+        if not os.path.isfile(fpath):
+            continue
+        try:
+            stat = os.stat(fpath)
+        except OSError:
+            continue
+        snapshot[fpath] = (stat.st_mtime, stat.st_size)
+    return snapshot
+
+
+class ProjectDaemon(object):
+
+    def __init__(self, project_path):
+        """
+        Keeps a project and its caches in memory and executes cli commands against it
+        :param project_path: path to gsmodutils project
+        """
+        self.project_path = os.path.abspath(project_path)
+        self._project = None
+        self._snapshot = None
+        self.running = False
+
+    def invalidate(self):
+        """
+        Drop cached models and designs read from changed files, or the whole warm project if its configuration has
+        changed
+        """
+        if self._project is None:
+            return
+
+        snapshot = project_snapshot(self._project)
+        changed = [p for p in set(snapshot) | set(self._snapshot) if snapshot.get(p) != self._snapshot.get(p)]
+        if self._project.project_file in changed:
+            self._project = None
+            self._snapshot = None
+            return
+
+        self._project.clear_cache(changed)
+        self._snapshot = snapshot
+
+    def get_project(self, project_path):
+        if os.path.abspath(project_path) != self.project_path:
+            return None
+
+        if self._project is None:
+            from gsmodutils.project.interface import GSMProject
+            self._project = GSMProject(self.project_path, use_cache=True)
+            self._snapshot = project_snapshot(self._project)
+
+        return self._project
+
+    def run_command(self, args, cwd, color=False):
+        """
+        Execute a cli command in this process, capturing its output
+        :return: tuple (output, exit_code)
+        """
+        from click.testing import CliRunner
+        from gsmodutils.cli import cli
+
+        self.invalidate()
+        prev_cwd = os.getcwd()
+        try:
+            os.chdir(cwd)
+            result = CliRunner().invoke(cli, args, color=color)
+        finally:
+            os.chdir(prev_cwd)
+
+        output = result.output
+        if result.exception is not None and not isinstance(result.exception, SystemExit):
+            output += "Error running command in gsmodutils daemon: {}\n".format(result.exception)
+
+        return output, result.exit_code
+
+    def handle(self, request):
+        """ Process a decoded request, returns the response dictionary """
+        if request.get('shutdown'):
+            self.running = False
+            return dict(output='', exit_code=0)
+
+        if request.get('ping'):
+            return dict(output='', exit_code=0)
+
+        output, exit_code = self.run_command(request['args'], request['cwd'], request.get('color', False))
+        return dict(output=output, exit_code=exit_code)
+
+    def serve(self):
+        """ Listen on the project socket until a shutdown request is received """
+        global _active_daemon
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OSError('The gsmodutils daemon requires unix domain sockets')  # pragma: no cover
+
+        spath = socket_path(self.project_path)
+        if os.path.exists(spath):
+            if daemon_running(self.project_path):
+                raise OSError('A gsmodutils daemon is already running for {}'.format(self.project_path))
+            os.remove(spath)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(spath)
+        server.listen(5)
+        _active_daemon = self
+        self.running = True
+        # Parse the models up front so the first command is fast
+        self.invalidate()
+        project = self.get_project(self.project_path)
+        for mpath in project.config.models:
+            try:
+                project.read_model_file(mpath)
+            except Exception as exp:
+                # Errors are reported when a command tries to load the model
+                print("gsmodutils daemon could not load model {} {}".format(mpath, exp), file=sys.stderr)
+        try:
+            while self.running:
+                conn, _ = server.accept()
+                try:
+                    with conn.makefile('rb') as rfile:
+                        line = rfile.readline()
+                    if not len(line):
+                        continue
+                    response = self.handle(json.loads(line.decode('utf-8')))
+                    conn.sendall((json.dumps(response) + "\n").encode('utf-8'))
+                except (IOError, OSError, ValueError) as exp:
+                    print("gsmodutils daemon request failed {}".format(exp), file=sys.stderr)
+                finally:
+                    conn.close()
+        finally:
+            _active_daemon = None
+            server.close()
+            if os.path.exists(spath):
+                os.remove(spath)
@@ -1,5 +1,17 @@
 from __future__ import print_function, absolute_import, division
-from jsonschema import ValidationError
+import sys
+
+
+def __getattr__(name):
+    # jsonschema's ValidationError is re-exported here, but only imported when it is first used
+    if name == 'ValidationError':
+        from jsonschema import ValidationError
+        return ValidationError
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+if sys.version_info < (3, 7):
+    from jsonschema import ValidationError  # pragma: no cover
 
 
 class ProjectNotFound(Exception):
@@ -1,5 +1,6 @@
 from __future__ import print_function
 from cobra import Model
+from cobra.util.solver import linear_reaction_coefficients
 from gsmodutils.utils import check_obj_sim, convert_stoich, equal_stoich
 
 
@@ -269,6 +270,10 @@ class ModelDiff(dict):
             except KeyError:
                 self['removed_reactions'].append(ra.id)
 
+        # Objective coefficients are read from the objective once, rather than for each reaction
+        objective_a = dict((r.id, c) for r, c in linear_reaction_coefficients(model_a).items())
+        objective_b = dict((r.id, c) for r, c in linear_reaction_coefficients(model_b).items())
+
         for rb in model_b.reactions:
             # reaction is new
             try:
@@ -277,7 +282,8 @@ class ModelDiff(dict):
                 ra = None
 
             # reaction has changed or is new
-            if ra is None or not check_obj_sim(ra, rb, reacfields) or not equal_stoich(ra, rb):
+            if ra is None or not check_obj_sim(ra, rb, reacfields) or not equal_stoich(ra, rb) or \
+                    objective_a.get(rb.id, 0) != objective_b.get(rb.id, 0):
                 self['reactions'].append(
                     dict(
                         id=rb.id,
@@ -2,13 +2,11 @@ import json
 import os
 
 import cobra
-import pandas
 
 from gsmodutils.exceptions import DesignError, DesignOrphanError, DesignNotFoundError
 from gsmodutils.model_diff import model_diff
 import logging
 from six import exec_
-import jsonschema
 
 
 logger = logging.getLogger(__name__)
@@ -234,6 +232,7 @@ class StrainDesign(object):
         Return a dataframe of the reactions involved in the design
         :return:
         """
+        import pandas
         p_model = self.as_pathway_model()
         df = dict(lower_bound=[], upper_bound=[], reaction_string=[], id=[])
         index = []
@@ -252,6 +251,7 @@ class StrainDesign(object):
         Return a dataframe of the reactions involved in the design
         :return:
         """
+        import pandas
         p_model = self.as_pathway_model()
         df = dict(reactions=[], id=[], name=[])
         index = []
@@ -269,6 +269,7 @@ class StrainDesign(object):
         Return a dataframe of the reactions involved in the design
         :return:
         """
+        import pandas
         p_model = self.as_pathway_model()
         df = dict(reactions=[], id=[], name=[])
         index = []
@@ -487,6 +488,44 @@ class StrainDesign(object):
 
         return model
 
+    def changed_reactions(self, model):
+        """
+        Reactions added or changed by this design, or using metabolites changed by this design
+        :param model: cobra model with the design applied
+        :return: list of reaction ids, None for python designs which may change any part of the model
+        """
+        if self.is_pydesign:
+            return None
+
+        changed = set(reaction['id'] for reaction in self.reactions)
+        for metabolite in self.metabolites:
+            if metabolite['id'] in model.metabolites:
+                changed |= set(r.id for r in model.metabolites.get_by_id(metabolite['id']).reactions)
+        return [reaction.id for reaction in model.reactions if reaction.id in changed]
+
+    def validate(self, model=None):
+        """
+        Check the mass balance and orphan metabolites of the model with this design applied.
+        Only the reactions and metabolites changed by the design are checked, the rest of the model is checked when it
+        is added to the project. Used by GSMProject.validate.
+        :param model: cobra model with the design applied, loaded if None
+        :return: dictionary of errors and warnings, see gsmodutils.utils.validator.check_structure
+        """
+        from gsmodutils.utils.validator import check_structure
+
+        if model is None:
+            model = self.load()
+
+        reaction_ids = self.changed_reactions(model)
+        metabolite_ids = None
+        if reaction_ids is not None:
+            metabolite_ids = set(m['id'] for m in self.metabolites if m['id'] in model.metabolites)
+            for rid in reaction_ids:
+                metabolite_ids |= set(m.id for m in model.reactions.get_by_id(rid).metabolites)
+            metabolite_ids = sorted(metabolite_ids)
+
+        return check_structure(model, reaction_ids, metabolite_ids)
+
     def as_pathway_model(self):
         """
         Loads a cobra model with just the reactions present in this design
@@ -628,6 +667,7 @@ class StrainDesign(object):
         :param throw_exceptions: Throw json schema exceptions. If false, returns bool on any exception
         :return:
         """
+        import jsonschema
         try:
             jsonschema.validate(design_dict, StrainDesign.design_schema)
         except (jsonschema.ValidationError, jsonschema.SchemaError) as exp:
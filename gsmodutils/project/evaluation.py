@@ -0,0 +1,421 @@
+"""
+Evaluation of project models and designs under the growth conditions saved in a project.
+
+A single model instance is reused for every set of conditions. Each set of conditions is applied inside a reversible
+model context, so the solver keeps its previous basis and each optimisation is warm started. Conditions are visited
+in an order that keeps the number of bound changes between consecutive solves small.
+"""
+from __future__ import print_function, absolute_import, division
+
+import logging
+import math
+
+from gsmodutils.utils.parallel import map_tasks, worker_model, worker_project, chunk_tasks
+
+logger = logging.getLogger(__name__)
+
+_MEMORY_MODEL_KEY = '__in_memory_model__'
+
+
+def conditions_distance(cx_a, cx_b):
+    """
+    Number of bounds or objective settings that differ between two conditions entries
+    :param cx_a: conditions dictionary
+    :param cx_b: conditions dictionary
+    :return: int
+    """
+    media_a = cx_a.get('media', {})
+    media_b = cx_b.get('media', {})
+    distance = 0
+    for rid in set(media_a) | set(media_b):
+        if media_a.get(rid, 0) != media_b.get(rid, 0):
+            distance += 1
+
+    if cx_a.get('carbon_source') != cx_b.get('carbon_source'):
+        distance += 2
+
+    if cx_a.get('objective_reactions') != cx_b.get('objective_reactions') or \
+            cx_a.get('objective_direction') != cx_b.get('objective_direction'):
+        distance += 1
+
+    return distance
+
+
+def order_conditions(conditions):
+    """
+    Greedy nearest neighbour ordering of conditions so that consecutive conditions differ by as few bounds as possible
+    :param conditions: list of (conditions_id, conditions dict) tuples
+    :return: reordered list of (conditions_id, conditions dict) tuples
+    """
+    # Entries without conditions leave the model as loaded, so are always evaluated first
+    ordered = [c for c in conditions if c[1] is None]
+    remaining = [c for c in conditions if c[1] is not None]
+    if not len(remaining):
+        return ordered
+
+    ordered.append(remaining.pop(0))
+    while len(remaining):
+        prev = ordered[-1][1]
+        if prev is None:
+            idx = 0
+        else:
+            idx = min(range(len(remaining)), key=lambda i: conditions_distance(prev, remaining[i][1]))
+        ordered.append(remaining.pop(idx))
+
+    return ordered
+
+
+def solve_conditions(model, conditions, fluxes):
+    """
+    Optimise an already loaded model under each set of conditions in turn.
+    The model is left unchanged.
+
+    :param model: cobra model
+    :param conditions: list of (conditions_id, conditions dict) tuples
+    :param fluxes: list of reaction ids to report fluxes for
+    :return: list of result dictionaries
+    """
+    from gsmodutils.project.interface import GSMProject
+    rows = []
+    for cid, cx in conditions:
+        row = dict(conditions=cid, status=None, objective_value=float('nan'))
+        for rid in fluxes:
+            row[rid] = float('nan')
+
+        with model:
+            try:
+                if cx is not None:
+                    GSMProject.apply_conditions(model, cx)
+            except KeyError as exp:
+                logger.warning("Could not apply conditions {} to model {}".format(cid, exp))
+                row['status'] = 'error'
+                rows.append(row)
+                continue
+
+            row['status'] = model.solver.optimize()
+            if row['status'] == 'optimal':
+                row['objective_value'] = model.solver.objective.value
+                for rid in fluxes:
+                    if rid in model.reactions:
+                        row[rid] = model.reactions.get_by_id(rid).flux
+        rows.append(row)
+
+    return rows
+
+
+def _conditions_entries(conditions_store, conditions):
+    """ List of (conditions_id, conditions dict) tuples, raises KeyError for unknown conditions """
+    entries = []
+    for cid in conditions:
+        if cid is None:
+            entries.append((None, None))
+        elif cid not in conditions_store:
+            raise KeyError("Conditions {} not found in project".format(cid))
+        else:
+            entries.append((cid, conditions_store[cid]))
+    return entries
+
+
+def _evaluate_task(task):
+    """ Worker task, evaluate a chunk of conditions with a cached model """
+    model_id, design_id, conditions, fluxes = task
+    model = worker_model(model_id, design_id)
+    rows = solve_conditions(model, conditions, fluxes)
+    for row in rows:
+        row['model'] = model_id
+        row['design'] = design_id
+    return rows
+
+
+def evaluate_conditions(project, model_or_design=None, conditions=None, fluxes=None, processes=None):
+    """
+    Evaluate a model or design under a set of saved conditions
+
+    :param project: GSMProject instance
+    :param model_or_design: project model path, design identifier or cobra model instance. Default model if None
+    :param conditions: list of conditions identifiers, defaults to all conditions in the project.
+        A None entry evaluates the model without applying any saved conditions.
+    :param fluxes: list of reaction identifiers to report fluxes of
+    :param processes: number of worker processes to spread conditions over, None runs in this process
+    :return: pandas.DataFrame indexed by conditions id with status, objective_value and flux columns
+    """
+    import cobra
+    import pandas
+    conditions_store = project.get_conditions(update=True)['growth_conditions']
+
+    if conditions is None:
+        conditions = list(conditions_store.keys())
+
+    if fluxes is None:
+        fluxes = []
+
+    memory_models = dict()
+    model_id = None
+    design_id = None
+    if model_or_design is None:
+        model_id = project.config.default_model
+    elif isinstance(model_or_design, cobra.Model):
+        model_id = _MEMORY_MODEL_KEY
+        memory_models[model_id] = model_or_design
+    elif model_or_design in project.config.models:
+        model_id = model_or_design
+    elif model_or_design in project.list_designs:
+        design_id = model_or_design
+    else:
+        raise KeyError("{} is not a model or design in the project".format(model_or_design))
+
+    ordered = order_conditions(_conditions_entries(conditions_store, conditions))
+    n_chunks = 1 if processes is None else processes
+    tasks = [(model_id, design_id, chunk, fluxes) for chunk in chunk_tasks(ordered, n_chunks)]
+
+    rows = dict()
+    for result in map_tasks(_evaluate_task, tasks, project, processes=processes, memory_models=memory_models):
+        for row in result:
+            row.pop('model')
+            row.pop('design')
+            rows[row['conditions']] = row
+
+    columns = ['status', 'objective_value'] + list(fluxes)
+    data = dict((c, [rows[cid][c] for cid in conditions]) for c in columns)
+    return pandas.DataFrame(data, index=pandas.Index(conditions, name='conditions'), columns=columns)
+
+
+def evaluate_designs(project, designs=None, conditions=None, fluxes=None, processes=None):
+    """
+    Evaluate every design under every set of conditions
+
+    Each design is loaded at most once per worker process, tasks are split so that workers receive all (or a large
+    contiguous block of) the conditions for a single design.
+
+    :param project: GSMProject instance
+    :param designs: list of design identifiers, defaults to all designs in the project
+    :param conditions: list of conditions identifiers, defaults to all conditions in the project.
+        If the project has no saved conditions, designs are evaluated as loaded.
+    :param fluxes: list of reaction identifiers to report fluxes of
+    :param processes: number of worker processes, None runs in this process
+    :return: pandas.DataFrame with a (design, conditions) MultiIndex and status, objective_value and flux columns
+    """
+    import pandas
+    conditions_store = project.get_conditions(update=True)['growth_conditions']
+
+    if designs is None:
+        designs = project.list_designs
+
+    if conditions is None:
+        conditions = list(conditions_store.keys())
+        if not len(conditions):
+            conditions = [None]
+
+    if fluxes is None:
+        fluxes = []
+
+    for did in designs:
+        if did not in project.list_designs:
+            raise KeyError("Design {} not found in project".format(did))
+
+    ordered = order_conditions(_conditions_entries(conditions_store, conditions))
+
+    # Split conditions for each design only when there are spare worker processes
+    n_chunks = 1
+    if processes is not None and len(designs):
+        n_chunks = max(1, processes // len(designs))
+
+    tasks = []
+    for did in designs:
+        for chunk in chunk_tasks(ordered, n_chunks):
+            tasks.append((None, did, chunk, fluxes))
+
+    rows = dict()
+    for result in map_tasks(_evaluate_task, tasks, project, processes=processes):
+        for row in result:
+            rows[(row['design'], row['conditions'])] = row
+
+    columns = ['status', 'objective_value'] + list(fluxes)
+    index = [(did, cid) for did in designs for cid in conditions]
+    data = dict((c, [rows[idx][c] for idx in index]) for c in columns)
+    return pandas.DataFrame(data, index=pandas.MultiIndex.from_tuples(index, names=['design', 'conditions']),
+                            columns=columns)
+
+
+def _biomass_debug_task(task):
+    """ Worker task, check which of a chunk of a design's biomass precursors it can produce """
+    from gsmodutils.utils import precursor_producibility
+    design_id, objective_reaction, chunk, n_chunks = task
+    model = worker_model(design_id=design_id)
+    if objective_reaction not in model.reactions:
+        raise KeyError("Reaction {} not found in design {}".format(objective_reaction, design_id))
+
+    precursors = [m.id for m in model.reactions.get_by_id(objective_reaction).reactants]
+    chunks = chunk_tasks(precursors, n_chunks)
+    metabolite_ids = chunks[chunk] if chunk < len(chunks) else []
+    return design_id, precursors, precursor_producibility(model, metabolite_ids)
+
+
+def biomass_debug_designs(project, objective_reaction, designs=None, processes=None):
+    """
+    Check which precursors of a biomass reaction each design can produce
+
+    Each design is loaded at most once per worker process. When there are more worker processes than designs, the
+    precursors of each design are split between workers.
+
+    :param project: GSMProject instance
+    :param objective_reaction: biomass reaction identifier, the reaction's reactants are the precursors checked
+    :param designs: list of design identifiers, defaults to all designs in the project
+    :param processes: number of worker processes, None runs in this process
+    :return: pandas.DataFrame indexed by design with a column for each precursor. Values are True if the precursor
+        can be produced, False if it can not and missing if the metabolite is not a precursor in the design
+    """
+    import pandas
+
+    if designs is None:
+        designs = project.list_designs
+
+    for did in designs:
+        if did not in project.list_designs:
+            raise KeyError("Design {} not found in project".format(did))
+
+    # Split precursors for each design only when there are spare worker processes
+    n_chunks = 1
+    if processes is not None and len(designs):
+        n_chunks = max(1, processes // len(designs))
+
+    tasks = [(did, objective_reaction, chunk, n_chunks) for did in designs for chunk in range(n_chunks)]
+
+    columns = []
+    results = dict((did, dict()) for did in designs)
+    for did, precursors, producible in map_tasks(_biomass_debug_task, tasks, project, processes=processes):
+        columns += [mid for mid in precursors if mid not in columns]
+        results[did].update(producible)
+
+    data = [[results[did].get(mid) for mid in columns] for did in designs]
+    return pandas.DataFrame(data, index=pandas.Index(designs, name='design'), columns=columns)
+
+
+def _validate_task(task):
+    """ Worker task, validate a model or design under a chunk of conditions """
+    from gsmodutils.utils.validator import check_structure
+    model_id, design_id, conditions, structure = task
+    result = dict(model=model_id, design=design_id, errors=[], warnings=[], conditions=[])
+
+    try:
+        model = worker_model(model_id, design_id)
+    except Exception as ex:
+        result['errors'].append("Error loading model {}".format(ex))
+        return result
+
+    if structure:
+        if design_id is not None:
+            # Only the parts of the model a design changes need checking, the base model is validated separately
+            checks = worker_project().get_design(design_id).validate(model)
+        else:
+            checks = check_structure(model)
+        result['errors'] += checks['errors']
+        result['warnings'] += checks['warnings']
+        result['unbalanced'] = checks['unbalanced']
+        result['orphans'] = checks['orphans']
+
+    for cid, cx in conditions:
+        label = 'without conditions' if cid is None else 'with conditions {}'.format(cid)
+        reason = ''
+        try:
+            row = solve_conditions(model, [(cid, cx)], [])[0]
+        except Exception as ex:
+            row = dict(conditions=cid, status='error', objective_value=float('nan'))
+            reason = ' ({})'.format(ex)
+
+        growth_expected = True if cx is None else bool(cx.get('observe_growth', True))
+        objective_value = row['objective_value']
+        # Solvers can report numerical noise in place of an exact zero
+        grows = row['status'] == 'optimal' and objective_value > model.tolerance
+
+        if row['status'] == 'error':
+            result['errors'].append("conditions {} could not be applied{}".format(cid, reason))
+        elif grows and not growth_expected:
+            result['errors'].append("model grows {} when it should not".format(label))
+        elif not grows and growth_expected:
+            result['errors'].append("model does not grow {} (status '{}')".format(label, row['status']))
+
+        result['conditions'].append(dict(
+            conditions=cid,
+            status=row['status'],
+            objective_value=None if math.isnan(objective_value) else objective_value,
+            growth_expected=growth_expected,
+        ))
+
+    return result
+
+
+def validate_project(project, models=None, designs=None, conditions=None, processes=None):
+    """
+    Validate every model and design in a project under each set of conditions that applies to it.
+
+    Models and designs are checked for mass balance and orphan metabolites once, designs only for the reactions and
+    metabolites they change. Every model and design must then have a feasible solution without conditions and grow, or
+    not grow, as expected under each saved set of conditions. Designs are validated on their base model.
+    Each model and design is loaded at most once per worker process.
+
+    :param project: GSMProject instance
+    :param models: list of project model paths, defaults to all models in the project
+    :param designs: list of design identifiers, defaults to all designs in the project
+    :param conditions: list of conditions identifiers, defaults to all conditions in the project
+    :param processes: number of worker processes, None runs in this process
+    :return: dictionary report, containing total errors and warnings and a list of results for each model and design
+    """
+    conditions_store = project.get_conditions(update=True)['growth_conditions']
+
+    if models is None:
+        models = project.config.models
+
+    if designs is None:
+        designs = project.list_designs
+
+    if conditions is None:
+        conditions = list(conditions_store.keys())
+
+    for mid in models:
+        if mid not in project.config.models:
+            raise KeyError("Model {} not found in project".format(mid))
+
+    for did in designs:
+        if did not in project.list_designs:
+            raise KeyError("Design {} not found in project".format(did))
+
+    entries = _conditions_entries(conditions_store, conditions)
+
+    def applicable(model_id):
+        # Conditions without a list of models apply to every model
+        return [(None, None)] + order_conditions([(cid, cx) for cid, cx in entries
+                                                   if not len(cx.get('models', [])) or model_id in cx['models']])
+
+    targets = [(mid, None, applicable(mid)) for mid in models]
+    for did in designs:
+        base_model = project.get_design(did).base_model
+        targets.append((None, did, applicable(base_model or project.config.default_model)))
+
+    # Split conditions for each model or design only when there are spare worker processes
+    n_chunks = 1
+    if processes is not None and len(targets):
+        n_chunks = max(1, processes // len(targets))
+
+    tasks = []
+    for mid, did, target_conditions in targets:
+        for i, chunk in enumerate(chunk_tasks(target_conditions, n_chunks)):
+            tasks.append((mid, did, chunk, i == 0))
+
+    results = dict()
+    for result in map_tasks(_validate_task, tasks, project, processes=processes):
+        key = (result['model'], result['design'])
+        if key not in results:
+            results[key] = result
+        else:
+            for k in ['errors', 'warnings', 'conditions']:
+                results[key][k] += result[k]
+
+    report = dict(project=project.project_path, errors=0, warnings=0, results=[])
+    for mid, did, _ in targets:
+        result = results[(mid, did)]
+        report['errors'] += len(result['errors'])
+        report['warnings'] += len(result['warnings'])
+        report['results'].append(result)
+
+    return report
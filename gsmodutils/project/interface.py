@@ -3,21 +3,21 @@ from __future__ import print_function, absolute_import, division
 import glob
 import json
 import os
-import fasteners
 
 from cobra.exceptions import Infeasible
 from six import string_types
 
-from gsmodutils.exceptions import ProjectNotFound, DesignError, DesignNotFoundError, ValidationError
+from gsmodutils.exceptions import ProjectNotFound, DesignError, DesignNotFoundError
 from gsmodutils.model_diff import model_diff
 from gsmodutils.project.design import StrainDesign
+from gsmodutils.project.evaluation import evaluate_conditions, evaluate_designs, biomass_debug_designs, \
+    validate_project
 from gsmodutils.project.model import GSModutilsModel
 from gsmodutils.project.project_config import ProjectConfig, default_project_file
 from gsmodutils.test.tester import GSMTester
 from gsmodutils.utils import validator
-from gsmodutils.utils.io import load_medium
+from gsmodutils.utils.io import load_medium, load_model
 import logging
-import jsonschema
 
 
 logger = logging.getLogger(__name__)
@@ -69,11 +69,15 @@ class GSMProject(object):
         }
     }
 
-    def __init__(self, path="."):
+    def __init__(self, path=".", use_cache=False):
         """
         Project class finds a gsmodutlils.json file in a given path and creates a project which allows a user to load:
             Models included within the project
             Designs that the model uses
+
+        :param path: project path
+        :param use_cache: keep parsed models and json designs in memory, reloading them only when the file on disk
+            changes. Loaded models are copies of the cached model.
         """
         logger.info("Attempting to load project in path {}".format(path))
         self._project_path = os.path.abspath(path)
@@ -82,6 +86,9 @@ class GSMProject(object):
         self._designs_store = dict()  # In memory store for designs
         self._py_compiled_designs = dict()
         self._py_func_mapper = dict()
+        self.use_cache = use_cache
+        self._model_cache = dict()
+        self._json_design_cache = dict()
 
     @property
     def project_path(self):
@@ -91,10 +98,21 @@ class GSMProject(object):
     def _context_file(self):
         return os.path.join(self._project_path, default_project_file)
 
+    @property
+    def project_file(self):
+        """ Path of the project configuration file """
+        return self._context_file
+
+    @property
+    def conditions_file(self):
+        """ Path of the file storing growth conditions """
+        return self._conditions_file
+
     def _load_config(self, configuration):
         """
         Sanatizes configuration input
         """
+        import jsonschema
         jsonschema.validate(configuration, ProjectConfig.config_schema)
         self.config = ProjectConfig(**configuration)
 
@@ -124,6 +142,7 @@ class GSMProject(object):
         This software is not designed to be used in multiple user environments, so this is slow. However, it provides
         some degree of protection for the user against modifying the same files
         """
+        import fasteners
         lock_path = os.path.join(self._project_path, '.gsmodultils_project_lock')
         return fasteners.InterProcessLock(lock_path)
 
@@ -197,6 +216,50 @@ class GSMProject(object):
         mdl._gsm_model_path = mpath
         return mdl
 
+    def read_model_file(self, mpath):
+        """
+        Parse a project model file, returns a cobra model.
+        When the project cache is enabled the file is only parsed when it has changed on disk.
+        :param mpath: relative path of the model
+        :return: cobra.Model
+        """
+        model_path = os.path.join(self._project_path, mpath)
+        if not self.use_cache:
+            return load_model(model_path)
+
+        mtime = os.path.getmtime(model_path)
+        if mpath not in self._model_cache or self._model_cache[mpath][0] != mtime:
+            self._model_cache[mpath] = (mtime, load_model(model_path))
+
+        return self._model_cache[mpath][1].copy()
+
+    def clear_cache(self, paths=None):
+        """
+        Forget models and designs cached in memory, they are read again when they are next loaded
+        :param paths: absolute paths of the model and design files to forget, everything is forgotten if None
+        """
+        if paths is None:
+            self._model_cache.clear()
+            self._json_design_cache.clear()
+            self._py_compiled_designs.clear()
+            self._py_func_mapper.clear()
+            self._designs_store.clear()
+            return
+
+        for path in paths:
+            rel_path = os.path.relpath(path, self._project_path)
+            fname = os.path.basename(path)
+            if rel_path in self._model_cache:
+                del self._model_cache[rel_path]
+            elif os.path.dirname(path) == self.design_path and fname.endswith('.json'):
+                did = fname[:-len('.json')]
+                self._json_design_cache.pop(did, None)
+                self._designs_store.pop(did, None)
+            elif path in self._py_compiled_designs:
+                for dname in self._py_compiled_designs.pop(path)[1]:
+                    self._py_func_mapper.pop(dname, None)
+                    self._designs_store.pop(dname, None)
+
     @property
     def model(self):
         """
@@ -216,6 +279,7 @@ class GSMProject(object):
         if validate:
             result = validator.validate_model_file(model_path)
             if len(result["errors"]):
+                from gsmodutils.exceptions import ValidationError
                 raise ValidationError("Model contains errors, will not add to project")
 
         # check model isn't in the project already
@@ -255,6 +319,18 @@ class GSMProject(object):
 
         return py_designs
 
+    def py_design_files(self):
+        """
+        Python design files and the designs they define
+        :return: dictionary of file path to list of design ids
+        """
+        self._py_designs  # compiles new or modified python design files
+        files = dict()
+        for pyfile, (_, dnames, _) in self._py_compiled_designs.items():
+            if os.path.exists(pyfile):
+                files[pyfile] = list(dnames.keys())
+        return files
+
     @property
     def _json_designs(self):
         designs_direct = glob.glob(os.path.join(self.design_path, '*.json'))
@@ -287,6 +363,23 @@ class GSMProject(object):
         func_name, pyfile = self._py_func_mapper[dname]
         return StrainDesign.from_pydesign(self, dname, func_name, self._py_compiled_designs[pyfile][2])
 
+    def _cached_design_current(self, design):
+        """ Checks a cached json design, and any json parents, are unchanged on disk """
+        while design is not None:
+            if design not in self._json_design_cache:
+                return False
+
+            des_path = os.path.join(self.design_path, '{}.json'.format(design))
+            mtime, cached = self._json_design_cache[design]
+            if not os.path.exists(des_path) or os.path.getmtime(des_path) != mtime:
+                return False
+
+            design = None
+            if cached.parent is not None and not cached.parent.is_pydesign:
+                design = cached.parent.id
+
+        return True
+
     def get_design(self, design):
         """
         Get the StrainDesign object (not resulting model) of a design
@@ -298,7 +391,13 @@ class GSMProject(object):
 
         if design in self._json_designs:
             des_path = os.path.join(self._project_path, self.config.design_dir, '{}.json'.format(design))
-            self._designs_store[design] = StrainDesign.from_json(design, des_path, self)
+            if self.use_cache:
+                if not self._cached_design_current(design):
+                    mtime = os.path.getmtime(des_path)
+                    self._json_design_cache[design] = (mtime, StrainDesign.from_json(design, des_path, self))
+                self._designs_store[design] = self._json_design_cache[design][1]
+            else:
+                self._designs_store[design] = StrainDesign.from_json(design, des_path, self)
         else:
             try:
                 self._designs_store[design] = self._load_py_design(design)
@@ -442,6 +541,17 @@ class GSMProject(object):
         else:
             mdl = model
 
+        return self.apply_conditions(mdl, cx, set_objective=set_objective)
+
+    @staticmethod
+    def apply_conditions(mdl, cx, set_objective=True):
+        """
+        Apply a conditions entry (a value of the project's growth_conditions) to a model in place
+        :param mdl: cobrapy model
+        :param cx: conditions dictionary
+        :param set_objective: set objective function (if stored)
+        :return: mdl
+        """
         load_medium(mdl, cx['media'])
         if "carbon_source" in cx and cx["carbon_source"] is not None:
             # Will throw error if invalid transporter
@@ -459,18 +569,66 @@ class GSMProject(object):
                     break
 
             if set_objective:
-                for reaction in mdl.reactions:
-                    reaction.objective_coefficient = 0.0
-
-                for objective in cx["objective_reactions"]:
-                    objective_reaction = mdl.reactions.get_by_id(objective)
-                    objective_reaction.objective_coefficient = 1.0
+                # Replaces the whole objective in one step rather than zeroing every reaction coefficient
+                mdl.objective = dict((mdl.reactions.get_by_id(objective), 1.0)
+                                     for objective in cx["objective_reactions"])
 
                 if "objective_direction" in cx:
                     mdl.objective_direction = cx["objective_direction"]
 
         return mdl
 
+    def evaluate_conditions(self, model_or_design=None, conditions=None, fluxes=None, processes=None):
+        """
+        Optimise a model or design under each of the saved conditions.
+        The model is only loaded once and each set of conditions is applied as a reversible change, allowing the
+        solver to warm start from the previous solution.
+
+        :param model_or_design: project model path, design identifier or cobra model. Default model if None
+        :param conditions: list of conditions identifiers (default is all conditions)
+        :param fluxes: list of reaction identifiers to include fluxes for
+        :param processes: number of worker processes to use. By default, runs in the current process
+        :return: pandas.DataFrame indexed by conditions id, with status, objective value and reaction fluxes
+        """
+        return evaluate_conditions(self, model_or_design, conditions=conditions, fluxes=fluxes, processes=processes)
+
+    def evaluate_designs(self, designs=None, conditions=None, fluxes=None, processes=None):
+        """
+        Compute the design x conditions matrix of objective values and fluxes.
+
+        :param designs: list of design identifiers (default is all designs)
+        :param conditions: list of conditions identifiers (default is all conditions)
+        :param fluxes: list of reaction identifiers to include fluxes for
+        :param processes: number of worker processes to use. By default, runs in the current process
+        :return: pandas.DataFrame indexed by (design, conditions)
+        """
+        return evaluate_designs(self, designs=designs, conditions=conditions, fluxes=fluxes, processes=processes)
+
+    def biomass_debug_designs(self, objective_reaction, designs=None, processes=None):
+        """
+        Compute the design x precursor matrix of which biomass precursors each design can produce.
+        Useful for finding which designs have lost the ability to produce biomass components.
+
+        :param objective_reaction: biomass reaction identifier
+        :param designs: list of design identifiers (default is all designs)
+        :param processes: number of worker processes to use. By default, runs in the current process
+        :return: pandas.DataFrame indexed by design with a boolean column for each precursor
+        """
+        return biomass_debug_designs(self, objective_reaction, designs=designs, processes=processes)
+
+    def validate(self, models=None, designs=None, conditions=None, processes=None):
+        """
+        Validate every model and design under each set of conditions that applies to it.
+        Checks mass balance, orphan metabolites and that each model grows (or does not grow) as expected.
+
+        :param models: list of model paths (default is all models)
+        :param designs: list of design identifiers (default is all designs)
+        :param conditions: list of conditions identifiers (default is all conditions)
+        :param processes: number of worker processes to use. By default, runs in the current process
+        :return: dictionary report with total errors and warnings and the results for each model and design
+        """
+        return validate_project(self, models=models, designs=designs, conditions=conditions, processes=processes)
+
     def growth_condition(self, conditions_id):
         conditions_store = self.get_conditions(update=True)
         return conditions_store['growth_conditions'][conditions_id]['observe_growth']
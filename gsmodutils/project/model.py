@@ -5,13 +5,11 @@ from cobra.core.dictlist import DictList
 from six import iteritems
 import cobra
 import gsmodutils
-from gsmodutils.utils.io import load_model
 from gsmodutils.model_diff import model_diff
 from gsmodutils.utils.scrumpy import load_scrumpy_model
 import os
 import logging
 import collections
-from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
@@ -74,7 +72,7 @@ class GSModutilsModel(cobra.Model):
         if self.design is not None:
             return self.design.load()
 
-        return load_model(self.model_path)
+        return self.project.read_model_file(self.mpath)
 
     def diff(self, model=None):
         """
@@ -282,6 +280,7 @@ class GSModutilsModel(cobra.Model):
         :param display_progress: display the progress of running tests
         :return:
         """
+        from tqdm import tqdm
         tester = self.project.project_tester()
         tester.collect_tests()
 
@@ -0,0 +1,242 @@
+"""
+Tests comparing model predictions against tables of experimental data.
+
+A dataset test is an entry in a json test file that references a csv or tsv file in the tests directory. Each row of
+the dataset is a measured condition. Columns are identified by their headers:
+
+    id - optional identifier of the row, used in the test log
+    lb:<reaction id> - lower bound applied to the reaction for the row (e.g. a measured uptake rate)
+    ub:<reaction id> - upper bound applied to the reaction for the row
+    flux:<reaction id> - measured flux the predicted flux is compared to
+
+Empty cells are ignored, other columns are kept for reference only.
+All rows are solved with the same loaded model. Row bounds are applied in a context and rolled back, so the solver
+keeps its basis between rows and each solve is warm started from the previous solution.
+"""
+from __future__ import print_function, absolute_import, division
+
+import os
+
+import numpy as np
+
+from gsmodutils.test.instances import EntryTestInstance
+from gsmodutils.test.utils import reaction_fluxes
+from gsmodutils.utils.parallel import chunk_tasks, map_tasks, worker_model
+
+
+class Dataset(object):
+
+    def __init__(self, row_ids, bounds, measured_ids, measured):
+        """
+        Rows of a dataset test
+        :param row_ids: list of row identifiers
+        :param bounds: list, for each row, of (reaction id, lower bound, upper bound) with None for bounds not set
+        :param measured_ids: list of reactions with measured fluxes
+        :param measured: numpy array of measured fluxes, rows by measured reactions, nan where not measured
+        """
+        self.row_ids = row_ids
+        self.bounds = bounds
+        self.measured_ids = measured_ids
+        self.measured = measured
+
+    @property
+    def reaction_ids(self):
+        """ All reactions referenced by the dataset """
+        rids = set(self.measured_ids)
+        for row in self.bounds:
+            rids |= set(rid for rid, _, _ in row)
+        return rids
+
+    @classmethod
+    def read(cls, path):
+        """
+        Load a dataset from a csv file, or a tab separated file if the extension is .tsv or .tab
+        :param path: file path
+        :return: Dataset
+        """
+        import pandas
+        sep = '\t' if os.path.splitext(path)[1].lower() in ['.tsv', '.tab'] else ','
+        frame = pandas.read_csv(path, sep=sep)
+
+        if 'id' in frame.columns:
+            row_ids = [str(rid) for rid in frame['id']]
+        else:
+            row_ids = [str(i + 1) for i in range(len(frame))]
+
+        if len(set(row_ids)) != len(row_ids):
+            raise ValueError('Dataset {} has duplicate row ids'.format(os.path.basename(path)))
+
+        lower = dict((col[3:], frame[col].values.astype(float)) for col in frame.columns if col.startswith('lb:'))
+        upper = dict((col[3:], frame[col].values.astype(float)) for col in frame.columns if col.startswith('ub:'))
+        measured_ids = [col[5:] for col in frame.columns if col.startswith('flux:')]
+        measured = frame[['flux:' + rid for rid in measured_ids]].values.astype(float).reshape(len(frame), -1)
+
+        bounds = []
+        for i in range(len(frame)):
+            row = []
+            for rid in sorted(set(lower) | set(upper)):
+                lb = lower[rid][i] if rid in lower and not np.isnan(lower[rid][i]) else None
+                ub = upper[rid][i] if rid in upper and not np.isnan(upper[rid][i]) else None
+                if lb is not None or ub is not None:
+                    row.append((rid, lb, ub))
+            bounds.append(row)
+
+        return cls(row_ids, bounds, measured_ids, measured)
+
+
+def solve_rows(model, bounds, measured_ids, rows):
+    """
+    Solve the model with the bounds of each row
+    :param model: cobra model
+    :param bounds: row bounds, see Dataset, indexed by row number
+    :param measured_ids: reactions to get fluxes for
+    :param rows: indexes of the rows to solve
+    :return: list of solver status strings and numpy array of fluxes for the rows, nan where there is no solution
+    """
+    statuses = []
+    fluxes = np.full((len(rows), len(measured_ids)), np.nan)
+    for i, row in enumerate(rows):
+        with model:
+            try:
+                for rid, lb, ub in bounds[row]:
+                    reaction = model.reactions.get_by_id(rid)
+                    reaction.bounds = (reaction.lower_bound if lb is None else lb,
+                                       reaction.upper_bound if ub is None else ub)
+            except ValueError:
+                # Lower bound greater than upper bound
+                statuses.append('invalid_bounds')
+                continue
+
+            status = model.solver.optimize()
+            statuses.append(status)
+            if status == 'optimal':
+                fluxes[i] = reaction_fluxes(model, measured_ids)
+
+    return statuses, fluxes
+
+
+def _solve_chunk(task):
+    """ Solve a chunk of dataset rows with the worker's copy of the model """
+    bounds, measured_ids, rows = task
+    return solve_rows(worker_model('dataset'), bounds, measured_ids, rows)
+
+
+def solve_dataset(model, dataset, processes=1):
+    """
+    Solve every row of a dataset, spreading the rows across worker processes
+    :param model: cobra model with the tested configuration loaded
+    :param dataset: Dataset
+    :param processes: number of worker processes
+    :return: list of solver statuses and numpy array of fluxes of the measured reactions, one row per dataset row
+    """
+    rows = list(range(len(dataset.row_ids)))
+    processes = max(1, min(processes, len(rows)))
+    if processes == 1:
+        return solve_rows(model, dataset.bounds, dataset.measured_ids, rows)
+
+    # Each task only carries the bounds of its own rows
+    tasks = []
+    for chunk in chunk_tasks(rows, processes):
+        bounds = dict((row, dataset.bounds[row]) for row in chunk)
+        tasks.append((bounds, dataset.measured_ids, chunk))
+
+    results = map_tasks(_solve_chunk, tasks, None, processes=processes, memory_models=dict(dataset=model))
+
+    statuses = []
+    for chunk_status, _ in results:
+        statuses += chunk_status
+    fluxes = np.vstack([chunk_fluxes for _, chunk_fluxes in results])
+    return statuses, fluxes
+
+
+class DatasetTestInstance(EntryTestInstance):
+
+    schema = {
+        "type": "object",
+        "properties": {
+            "type": {"enum": ["dataset"]},
+            "models": {"type": "array", "items": {"type": "string"}},
+            "conditions": {"type": "array", "items": {"type": "string"}},
+            "designs": {"type": "array", "items": {"type": "string"}},
+            "dataset": {"type": "string"},
+            "tolerance": {"type": "number", "minimum": 0},
+            "relative_tolerance": {"type": "number", "minimum": 0},
+            "processes": {"type": "integer", "minimum": 1},
+            "description": {"type": "string"},
+            "id": {"type": "string"}
+        },
+        "required": ["type", "dataset", "description"],
+    }
+
+    @property
+    def dataset_path(self):
+        return os.path.join(self.project.tests_dir, self.entry['dataset'])
+
+    def data_files(self):
+        return [self.dataset_path]
+
+    def _fexec(self, model=None):
+        """
+        Solve each row of the dataset and compare predicted fluxes to measured fluxes.
+        Each row is logged as a child of the test's log.
+        """
+        try:
+            dataset = Dataset.read(self.dataset_path)
+        except (IOError, OSError, ValueError, KeyError) as ex:
+            self.log.add_error("Error loading dataset {} - {}".format(self.entry['dataset'], ex), '.dataset')
+            return self.log
+
+        model = self.load_model(model)
+        if model is None:
+            return self.log
+
+        missing = sorted(rid for rid in dataset.reaction_ids if rid not in model.reactions)
+        for rid in missing:
+            self.log.add_error("dataset reaction {} not found in model".format(rid), '.dataset .reaction_not_found')
+        if len(missing):
+            return self.log
+
+        statuses, predicted = solve_dataset(model, dataset, processes=self.entry.get('processes', 1))
+
+        # All comparisons are made at once, unmeasured values are nan and skipped below
+        tolerance = self.entry.get('tolerance', 1e-3) + \
+            self.entry.get('relative_tolerance', 0.0) * np.abs(dataset.measured)
+        with np.errstate(invalid='ignore'):
+            within = np.abs(predicted - dataset.measured) <= tolerance
+        measured = ~np.isnan(dataset.measured)
+
+        for i, row_id in enumerate(dataset.row_ids):
+            rlog = self.log.create_child("{}::{}".format(self.id, row_id), param_child=True)
+            if statuses[i] == 'invalid_bounds':
+                rlog.add_error("row {} lower bounds are greater than upper bounds".format(row_id), '.invalid_bounds')
+                continue
+            elif statuses[i] != 'optimal':
+                rlog.add_error("No solution found for row {} ({})".format(row_id, statuses[i]), '.no_solution')
+                continue
+
+            for j, rid in enumerate(dataset.measured_ids):
+                if not measured[i, j]:
+                    continue
+                rlog.assertion(
+                    within[i, j],
+                    success_msg='reaction {} flux {:.6g} matches measured {:.6g}'.format(
+                        rid, predicted[i, j], dataset.measured[i, j]),
+                    error_msg='reaction {} flux {:.6g} differs from measured {:.6g}'.format(
+                        rid, predicted[i, j], dataset.measured[i, j]),
+                    desc='.dataset'
+                )
+
+        return self.log
+
+    def applies_to_model(self, model_id, design_id=None):
+        return False
+
+    def references(self):
+        if self._master:
+            return super(DatasetTestInstance, self).references()
+
+        try:
+            reactions = Dataset.read(self.dataset_path).reaction_ids
+        except (IOError, OSError, ValueError, KeyError):
+            reactions = set()
+        return dict(reactions=reactions, metabolites=set(), genes=set(), solves=True)
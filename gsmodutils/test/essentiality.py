@@ -0,0 +1,139 @@
+"""
+Tests asserting which genes and reactions are essential.
+
+Essentiality tests list genes and reactions with whether their deletion is expected to stop growth. Single deletions
+are run in bulk for every selected model, conditions and design. Each deletion is made in a model context and rolled
+back, rather than on a copy of the model, and deletions can be spread across worker processes.
+"""
+from __future__ import print_function, absolute_import, division
+
+import numpy as np
+import six
+
+from gsmodutils.test.instances import EntryTestInstance
+from gsmodutils.utils.parallel import can_start_workers
+
+
+def _deletion_growth(frame):
+    """
+    Growth rate of each single deletion in a cobra deletion result. Newer versions of cobra list the deleted ids in an
+    'ids' column, older versions index the result by the deleted ids.
+    :param frame: pandas.DataFrame returned by single_gene_deletion or single_reaction_deletion
+    :return: dictionary of deleted id to growth, nan if the deletion has no solution
+    """
+    ids = frame['ids'] if 'ids' in frame.columns else frame.index
+    growth = dict()
+    for deleted, value, status in zip(ids, frame['growth'], frame['status']):
+        if not isinstance(deleted, six.string_types):
+            deleted = next(iter(deleted))
+        growth[deleted] = value if status == 'optimal' else np.nan
+    return growth
+
+
+def deletion_growth(model, gene_ids=(), reaction_ids=(), processes=1):
+    """
+    Growth rate of the model after deleting each gene and reaction on its own
+    :param model: cobra model
+    :param gene_ids: ids of genes in the model
+    :param reaction_ids: ids of reactions in the model
+    :param processes: number of worker processes
+    :return: dictionaries of gene id to growth and reaction id to growth, nan if the deletion has no solution
+    """
+    from cobra.flux_analysis import single_gene_deletion, single_reaction_deletion
+    if not can_start_workers():
+        processes = 1
+
+    genes, reactions = dict(), dict()
+    if len(gene_ids):
+        genes = _deletion_growth(single_gene_deletion(model, list(gene_ids), processes=processes))
+    if len(reaction_ids):
+        reactions = _deletion_growth(single_reaction_deletion(model, list(reaction_ids), processes=processes))
+    return genes, reactions
+
+
+class EssentialityTestInstance(EntryTestInstance):
+
+    _expected = {
+        "type": "object",
+        "patternProperties": {
+            "^.*$": {"type": "boolean"}
+        }
+    }
+
+    schema = {
+        "type": "object",
+        "properties": {
+            "type": {"enum": ["essentiality"]},
+            "models": {"type": "array", "items": {"type": "string"}},
+            "conditions": {"type": "array", "items": {"type": "string"}},
+            "designs": {"type": "array", "items": {"type": "string"}},
+            "genes": _expected,
+            "reactions": _expected,
+            "threshold": {"type": "number", "minimum": 0, "maximum": 1},
+            "processes": {"type": "integer", "minimum": 1},
+            "description": {"type": "string"},
+            "id": {"type": "string"}
+        },
+        "required": ["type", "description"],
+    }
+
+    def _fexec(self, model=None):
+        """
+        Delete each listed gene and reaction and compare whether the model still grows with the expected outcome
+        """
+        model = self.load_model(model)
+        if model is None:
+            return self.log
+
+        expected = [('gene', gid, essential, gid in model.genes)
+                    for gid, essential in self.entry.get('genes', dict()).items()]
+        expected += [('reaction', rid, essential, rid in model.reactions)
+                     for rid, essential in self.entry.get('reactions', dict()).items()]
+
+        wild_type = model.slim_optimize(error_value=np.nan)
+        if np.isnan(wild_type) or wild_type <= 0:
+            self.log.add_error("No solution found with model configuration", '.no_solution')
+            return self.log
+
+        genes, reactions = deletion_growth(
+            model,
+            gene_ids=[oid for kind, oid, _, found in expected if kind == 'gene' and found],
+            reaction_ids=[oid for kind, oid, _, found in expected if kind == 'reaction' and found],
+            processes=self.entry.get('processes', 1)
+        )
+        growth = dict(gene=genes, reaction=reactions)
+
+        # Deletions are lethal if growth falls below a fraction of the wild type growth
+        min_growth = self.entry.get('threshold', 0.01) * wild_type
+        for kind, oid, essential, found in expected:
+            if not found:
+                self.log.assertion(
+                    False,
+                    success_msg='',
+                    error_msg="{} {} not found in model".format(kind, oid),
+                    desc='.essentiality .{}_not_found'.format(kind)
+                )
+                continue
+
+            value = growth[kind][oid]
+            lethal = bool(np.isnan(value) or value < min_growth)
+            result = 'essential' if lethal else 'not essential (growth {:.6g})'.format(value)
+            self.log.assertion(
+                lethal == essential,
+                success_msg='{} {} is {}'.format(kind, oid, result),
+                error_msg='{} {} is {}, expected {}'.format(kind, oid, result,
+                                                           'essential' if essential else 'not essential'),
+                desc='.essentiality'
+            )
+
+        return self.log
+
+    def applies_to_model(self, model_id, design_id=None):
+        return False
+
+    def references(self):
+        if self._master:
+            return super(EssentialityTestInstance, self).references()
+
+        return dict(reactions=set(self.entry.get('reactions', dict())), metabolites=set(),
+                    genes=set(self.entry.get('genes', dict())), solves=True)
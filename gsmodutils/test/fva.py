@@ -0,0 +1,244 @@
+"""
+Tests asserting the flux variability of reactions.
+
+An FBA solution is usually one of many optimal solutions, so json tests asserting single fluxes can pass or fail
+depending on the solver. FVA tests assert the minimum and maximum flux each reaction can carry instead.
+
+FVA is run once for each configured model. When a tester collects tests every FVA test joins the batch of its model,
+conditions and design. The first test of a batch to run loads the model and computes the ranges of every reaction in
+the batch, the other tests read the results without loading the model. Results are also cached for each project against
+a structural hash of the configured model, so later testers of the same project, or different configurations that
+produce the same model, reuse them. The cache is dropped with the project, e.g. when the daemon reloads it.
+"""
+from __future__ import print_function, absolute_import, division
+
+import collections
+import hashlib
+import weakref
+
+from cobra.exceptions import OptimizationError
+
+from gsmodutils.test.instances import EntryTestInstance
+from gsmodutils.utils.parallel import can_start_workers
+
+# Number of model configurations kept in the cache
+CACHE_SIZE = 32
+
+# Project to FVA results of its most recently used model configurations
+_fva_cache = weakref.WeakKeyDictionary()
+
+
+def model_hash(model):
+    """
+    Hash of the structure of a model: reaction stoichiometry and bounds, the objective and any additional constraints.
+    Models with the same hash give the same FVA results.
+    :param model: cobra model
+    :return: hex digest string
+    """
+    sha = hashlib.sha1()
+    for reaction in sorted(model.reactions, key=lambda r: r.id):
+        stoichiometry = sorted((m.id, c) for m, c in reaction.metabolites.items())
+        sha.update(repr((reaction.id, reaction.bounds, stoichiometry)).encode('utf-8'))
+
+    sha.update(repr((model.objective.direction, str(model.objective.expression))).encode('utf-8'))
+
+    metabolites = set(m.id for m in model.metabolites)
+    for constraint in sorted(model.constraints, key=lambda c: c.name):
+        if constraint.name not in metabolites:
+            sha.update(repr((constraint.name, constraint.lb, constraint.ub, str(constraint.expression))).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+def clear_cache(project=None):
+    """
+    Forget cached FVA results
+    :param project: GSMProject to forget the results of, all projects if None
+    """
+    if project is None:
+        _fva_cache.clear()
+    else:
+        _fva_cache.pop(project, None)
+
+
+def fva_ranges(model, reaction_ids, fraction_of_optimum=1.0, processes=1, project=None):
+    """
+    Minimum and maximum fluxes of reactions, computed in one batch for reactions without cached results
+    :param model: cobra model
+    :param reaction_ids: ids of reactions in the model
+    :param fraction_of_optimum: fraction of the optimal objective value the fluxes must maintain
+    :param processes: number of worker processes for the FVA
+    :param project: GSMProject the results are cached for, results are not cached if None
+    :return: dictionary of reaction id to (minimum, maximum)
+    :raises cobra.exceptions.OptimizationError: if the model has no solution
+    """
+    cache = collections.OrderedDict()
+    if project is not None:
+        if project not in _fva_cache:
+            _fva_cache[project] = collections.OrderedDict()
+        cache = _fva_cache[project]
+
+    key = (model_hash(model), fraction_of_optimum)
+    if key in cache:
+        cache[key] = cache.pop(key)
+    else:
+        cache[key] = dict()
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+    cached = cache[key]
+    missing = sorted(set(rid for rid in reaction_ids if rid not in cached))
+    if len(missing):
+        from cobra.flux_analysis import flux_variability_analysis
+        if not can_start_workers():
+            processes = 1
+        frame = flux_variability_analysis(model, missing, fraction_of_optimum=fraction_of_optimum,
+                                          processes=processes)
+        for rid in missing:
+            cached[rid] = (frame.loc[rid, 'minimum'], frame.loc[rid, 'maximum'])
+
+    return dict((rid, cached[rid]) for rid in reaction_ids)
+
+
+class FVABatch(object):
+
+    def __init__(self):
+        """
+        Reactions of the FVA tests on one model configuration and, once the first of the tests has run, their ranges
+        """
+        self.reaction_ids = set()
+        self.computed_ids = set()  # reactions the ranges were computed for, tests can join after they are computed
+        self.model_reactions = set()  # ids of the computed reactions that are in the model
+        self.ranges = dict()
+        self.solved = None
+
+    def computed(self, reaction_ids):
+        """ True if the ranges of the reactions have been computed """
+        return self.solved is not None and set(reaction_ids) <= self.computed_ids
+
+    def compute(self, model, fraction_of_optimum=1.0, processes=1, project=None):
+        """
+        Compute the ranges of every reaction in the batch
+        :param model: configured cobra model
+        """
+        self.computed_ids = set(self.reaction_ids)
+        self.model_reactions = set(rid for rid in self.computed_ids if rid in model.reactions)
+        try:
+            self.ranges = fva_ranges(model, sorted(self.model_reactions), fraction_of_optimum=fraction_of_optimum,
+                                     processes=processes, project=project)
+            self.solved = True
+        except OptimizationError:
+            self.ranges = dict()
+            self.solved = False
+
+
+class FVATestInstance(EntryTestInstance):
+
+    _range = {"type": "array", "minItems": 2, "maxItems": 2, "items": {"type": "number"}}
+
+    schema = {
+        "type": "object",
+        "properties": {
+            "type": {"enum": ["fva"]},
+            "models": {"type": "array", "items": {"type": "string"}},
+            "conditions": {"type": "array", "items": {"type": "string"}},
+            "designs": {"type": "array", "items": {"type": "string"}},
+            "reaction_ranges": {
+                "type": "object",
+                "patternProperties": {
+                    "^.*$": {
+                        "type": "object",
+                        "properties": {
+                            "minimum": _range,
+                            "maximum": _range,
+                        },
+                        "additionalProperties": False,
+                    }
+                }
+            },
+            "fraction_of_optimum": {"type": "number", "minimum": 0, "maximum": 1},
+            "tolerance": {"type": "number", "minimum": 0},
+            "processes": {"type": "integer", "minimum": 1},
+            "description": {"type": "string"},
+            "id": {"type": "string"}
+        },
+        "required": ["type", "reaction_ranges", "description"],
+    }
+
+    def __init__(self, project, log, entry, master=True, model_loader=None, file_path=None, **kwargs):
+        super(FVATestInstance, self).__init__(project, log, entry, master=master, model_loader=model_loader,
+                                              file_path=file_path, **kwargs)
+        self._batch = None
+
+    def join_batch(self, batches):
+        """ Add the reactions of this test to the batch of its model configuration """
+        if self._master or self._model_loader is None:
+            return
+
+        ml = self._model_loader
+        key = ('fva', ml.model_id, ml.conditions_id, ml.design_id, self.entry.get('fraction_of_optimum', 1.0))
+        if key not in batches:
+            batches[key] = FVABatch()
+        self._batch = batches[key]
+        self._batch.reaction_ids |= set(self.entry['reaction_ranges'])
+
+    def _fexec(self, model=None):
+        """
+        Compare the FVA minimum and maximum fluxes of each reaction against the expected ranges
+        """
+        ranges = self.entry['reaction_ranges']
+        batch = self._batch
+        if batch is None or self._override_model is not None or model is not None:
+            # Not part of a tester's batch, or running on a model given to this test
+            batch = FVABatch()
+            batch.reaction_ids |= set(ranges)
+
+        if not batch.computed(ranges):
+            model = self.load_model(model)
+            if model is None:
+                return self.log
+            batch.compute(model, fraction_of_optimum=self.entry.get('fraction_of_optimum', 1.0),
+                          processes=self.entry.get('processes', 1), project=self.project)
+
+        for rid in ranges:
+            if rid not in batch.model_reactions:
+                self.log.assertion(
+                    False,
+                    success_msg='',
+                    error_msg="required reaction {} not found in model".format(rid),
+                    desc='.fva .reaction_not_found'
+                )
+
+        if not batch.solved:
+            self.log.add_error("No solution found with model configuration", '.no_solution')
+            return self.log
+
+        fva = batch.ranges
+
+        tolerance = self.entry.get('tolerance', 1e-6)
+        for rid, expected in ranges.items():
+            if rid not in fva:
+                continue
+
+            for idx, bound in enumerate(['minimum', 'maximum']):
+                if bound not in expected:
+                    continue
+                lb, ub = expected[bound]
+                value = fva[rid][idx]
+                self.log.assertion(
+                    lb - tolerance <= value <= ub + tolerance,
+                    success_msg='reaction {} {} flux {:.6g} inside {}, {}'.format(rid, bound, value, lb, ub),
+                    error_msg='reaction {} {} flux {:.6g} outside {}, {}'.format(rid, bound, value, lb, ub),
+                    desc='.fva'
+                )
+
+        return self.log
+
+    def applies_to_model(self, model_id, design_id=None):
+        return False
+
+    def references(self):
+        if self._master:
+            return super(FVATestInstance, self).references()
+
+        return dict(reactions=set(self.entry['reaction_ranges']), metabolites=set(), genes=set(), solves=True)
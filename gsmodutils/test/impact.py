@@ -0,0 +1,216 @@
+"""
+Change impact analysis for project tests.
+
+Each collected test is indexed by the reactions, metabolites and genes it references and whether it solves the model.
+For json tests these are read from the test entries, python tests have the objects they access, and any use of the
+solver, recorded while they run. The index is saved in the project so that the references of python tests are known
+without running them again.
+
+Any change to reactions or metabolites can change the solution of a model, so tests that solve the model are affected
+by every diff that changes them. Only tests that purely check the structure of a model (e.g. that a reaction is
+present) are selected by the objects they reference.
+"""
+from __future__ import print_function, absolute_import, division
+
+import contextlib
+import json
+import os
+
+from cobra.core.dictlist import DictList
+from six import string_types
+
+INDEX_FILE = '.gsmodutils_test_index.json'
+
+# Model attributes that are recorded
+_recorded_attrs = ['reactions', 'metabolites', 'genes']
+
+
+class RecordingDictList(DictList):
+    """
+    DictList that records the identifiers of objects looked up by id.
+    Instances are only ever created by switching the class of an existing DictList, see record_accesses
+    """
+
+    def _record(self, oid):
+        accessed = self.__dict__.get('_accessed')
+        if accessed is not None:
+            accessed.add(oid)
+
+    def get_by_id(self, id):
+        self._record(id)
+        return super(RecordingDictList, self).get_by_id(id)
+
+    def has_id(self, id):
+        self._record(id)
+        return super(RecordingDictList, self).has_id(id)
+
+    def __contains__(self, entity):
+        if isinstance(entity, string_types):
+            self._record(entity)
+        elif hasattr(entity, 'id'):
+            self._record(entity.id)
+        return super(RecordingDictList, self).__contains__(entity)
+
+    def __getitem__(self, i):
+        if isinstance(i, string_types):
+            self._record(i)
+        elif hasattr(i, 'id'):
+            self._record(i.id)
+        return super(RecordingDictList, self).__getitem__(i)
+
+    def __getattr__(self, attr):
+        result = super(RecordingDictList, self).__getattr__(attr)
+        self._record(attr)
+        return result
+
+
+@contextlib.contextmanager
+def record_accesses(model):
+    """
+    Context that records which reactions, metabolites and genes of a model are accessed by identifier
+    Use of the model's solver is also recorded, solving copies of the model is not.
+    :param model: cobra model
+    :return: dictionary of attribute name to set of accessed identifiers, and 'solves' which is True if the model was
+        optimized
+    """
+    accessed = dict((attr, set()) for attr in _recorded_attrs)
+    accessed['solves'] = False
+    swapped = []
+    for attr in _recorded_attrs:
+        dlist = getattr(model, attr)
+        if type(dlist) is DictList:
+            dlist.__class__ = RecordingDictList
+            dlist._accessed = accessed[attr]
+            swapped.append(dlist)
+
+    solver = model.solver
+    optimize = solver.optimize
+
+    def _optimize(*args, **kwargs):
+        accessed['solves'] = True
+        return optimize(*args, **kwargs)
+
+    solver.optimize = _optimize
+    try:
+        yield accessed
+    finally:
+        for dlist in swapped:
+            del dlist._accessed
+            dlist.__class__ = DictList
+        del solver.optimize
+
+
+def index_path(project):
+    """ Location of the saved impact index for a project """
+    return os.path.join(project.project_path, INDEX_FILE)
+
+
+def load_index(project):
+    """
+    Load the saved impact index
+    :param project: GSMProject instance
+    :return: dictionary of test id to references, empty if no index has been saved
+    """
+    ipath = index_path(project)
+    if not os.path.exists(ipath):
+        return dict()
+
+    try:
+        with open(ipath) as infile:
+            return json.load(infile)
+    except (IOError, OSError, ValueError):
+        return dict()
+
+
+def save_index(project, index):
+    """
+    Save the impact index in the project directory
+    :param project: GSMProject instance
+    :param index: dictionary of test id to references
+    :return:
+    """
+    with open(index_path(project), 'w') as outfile:
+        json.dump(index, outfile, indent=4, sort_keys=True)
+
+
+def build_index(tester, previous=None):
+    """
+    Index every leaf test of a tester by the objects and project resources it references.
+    Python tests that have not been run in this session take their references from the previous index.
+
+    :param tester: GSMTester instance with collected tests
+    :param previous: previously saved index
+    :return: dictionary of test id to dictionary of references. References are None if they are unknown, in which
+        case the test is assumed to be affected by any change. References of tests that solve the model have 'solves'
+        set to True
+    """
+    if previous is None:
+        previous = dict()
+
+    index = dict()
+    if not tester._tests_collected:
+        # Only some tests have been loaded, keep the entries of other tests
+        index.update(previous)
+
+    for tid, test in tester._test_map.items():
+        if len(test.children):
+            continue
+
+        refs = test.references()
+        if refs is None and tid in previous:
+            refs = previous[tid].get('references')
+        elif refs is not None:
+            refs = dict((k, sorted(v)) if k in _recorded_attrs else (k, v) for k, v in refs.items())
+
+        resources = dict()
+        for rtype, rid in test.dependencies():
+            resources.setdefault(rtype, []).append(rid)
+
+        index[tid] = dict(
+            references=refs,
+            resources=dict((k, sorted(v)) for k, v in resources.items())
+        )
+
+    return index
+
+
+def diff_references(mdiff):
+    """
+    The identifiers of objects added, changed or removed in a model diff
+    :param mdiff: ModelDiff, or dictionary in the same format
+    :return: dictionary of reactions, metabolites and genes to sets of identifiers
+    """
+    refs = dict()
+    for attr in _recorded_attrs:
+        ids = set(mdiff.get('removed_' + attr, []))
+        for entry in mdiff.get(attr, []):
+            ids.add(entry['id'])
+        refs[attr] = ids
+
+    # Metabolites in the stoichiometry of changed reactions
+    for entry in mdiff.get('reactions', []):
+        refs['metabolites'] |= set(entry.get('metabolites', dict()).keys())
+
+    return refs
+
+
+def affected_tests(index, mdiff):
+    """
+    Tests from an impact index that could be affected by a model diff. Tests that solve the model are affected by any
+    change to reactions (including bounds and objective coefficients) or metabolites, other tests only if they
+    reference a changed object.
+    :param index: dictionary returned by build_index
+    :param mdiff: ModelDiff, or dictionary in the same format
+    :return: sorted list of test ids
+    """
+    changed = diff_references(mdiff)
+    changes_solution = len(changed['reactions']) or len(changed['metabolites'])
+
+    affected = []
+    for tid, entry in index.items():
+        refs = entry.get('references')
+        if refs is None or (refs.get('solves', True) and changes_solution) or \
+                any(len(changed[attr] & set(refs.get(attr, []))) for attr in _recorded_attrs):
+            affected.append(tid)
+
+    return sorted(affected)
@@ -3,10 +3,13 @@ from six import exec_, add_metaclass
 import sys
 import os
 import traceback
-from gsmodutils.test.utils import stdout_ctx, ModelLoader, ResultRecord
+from gsmodutils.test.utils import stdout_ctx, ModelLoader, ResultRecord, reaction_fluxes
+from gsmodutils.test.impact import record_accesses
 import jsonschema
 from cobra.exceptions import Infeasible
+from cobra.util.solver import check_solver_status
 import cobra
+import numpy as np
 from cobra.core import get_solution
 import json
 
@@ -19,10 +22,24 @@ class TestInstance:
         Abstract base class for test instances
         """
         self._override_model = None
-        self.children = []
+        self._children = None
         self.log = log
         self.project = project
-        self.log.__test = self
+
+    @property
+    def children(self):
+        """ Child tests, created when they are first accessed """
+        if self._children is None:
+            self._children = []
+            self._collect()
+        return self._children
+
+    def _collect(self):
+        """
+        Create child tests by appending to self.children. Called on first access of children, so that expensive test
+        expansion is only done for tests that are selected.
+        """
+        pass
 
     @abstractmethod
     def run(self):
@@ -77,6 +94,41 @@ class TestInstance:
     def applies_to_model(self, model_id, design_id=None):
         pass
 
+    def dependencies(self):
+        """
+        Project resources that this test uses. Used to find the tests affected by changes to a project.
+        Resources are tuples of the form ('model', model path), ('conditions', conditions id), ('design', design id) or
+        ('file', test file path)
+        :return: set of tuples
+        """
+        deps = set()
+        for child in self.children:
+            deps |= child.dependencies()
+        return deps
+
+    def join_batch(self, batches):
+        """
+        Share work with other tests of the same tester, called when the tester registers the test
+        :param batches: dictionary shared by the tests of a tester, rebuilt when tests are collected
+        :return:
+        """
+        pass
+
+    def references(self):
+        """
+        Identifiers of the reactions, metabolites and genes that this test uses and whether it solves the model
+        :return: dictionary of 'reactions', 'metabolites' and 'genes' to sets of identifiers and 'solves' to a bool, or
+            None if unknown
+        """
+        refs = dict(reactions=set(), metabolites=set(), genes=set(), solves=False)
+        for child in self.children:
+            crefs = child.references()
+            if crefs is None:
+                return None
+            for k, v in crefs.items():
+                refs[k] |= v
+        return refs
+
 
 class PyTestFileInstance(TestInstance):
 
@@ -154,11 +206,15 @@ class PyTestInstance(TestInstance):
         self._function = self.pyfile.global_namespace[func_name]
         self.model_loader = model_loader
         self._is_master = False
+        self.accessed = None
 
         if model_loader is None and hasattr(self._function, '_is_test_selector'):
+            # This is not an individual test case, children are created on first access
             self._is_master = True
+
+    def _collect(self):
+        if self._is_master:
             _func_id = "{}::{}".format(self.pyfile.name, self.func_name)
-            # This is not an individual test case
             if self._function.models == "*":
                 self._function.models = self.project.list_models
 
@@ -198,8 +254,8 @@ class PyTestInstance(TestInstance):
 
                         model_loader = ModelLoader(self.project, mn, cid, did)
                         task_id = "{}::{}".format(_func_id, tid)
-                        nlog = log.create_child(task_id, param_child=True)
-                        self.children.append(PyTestInstance(self.project, nlog, func_name, self, self.pyfile,
+                        nlog = self.log.create_child(task_id, param_child=True)
+                        self.children.append(PyTestInstance(self.project, nlog, self.func_name, self, self.pyfile,
                                                             model_loader))
 
     def run(self):
@@ -210,6 +266,23 @@ class PyTestInstance(TestInstance):
             self._fexec()
         return self.log
 
+    def dependencies(self):
+        if len(self.children):
+            return super(PyTestInstance, self).dependencies()
+
+        deps = {('file', self.pyfile.file_path)}
+        if self.model_loader is not None:
+            deps |= self.model_loader.dependencies()
+        else:
+            deps.add(('model', self.project.config.default_model))
+        return deps
+
+    def references(self):
+        if len(self.children):
+            return super(PyTestInstance, self).references()
+        # Only known once the test has been run
+        return self.accessed
+
     def _fexec(self, model=None):
         """
         Execute the python test with encapsulation
@@ -231,7 +304,9 @@ class PyTestInstance(TestInstance):
             try:
                 # Call the function
                 # Uses standardised prototypes
-                self._function(model, self.project, self.log)
+                with record_accesses(model) as accessed:
+                    self._function(model, self.project, self.log)
+                self.accessed = accessed
             except Exception as ex:
                 _, _, tb = sys.exc_info()
                 self.tb_info = traceback.extract_tb(tb)[-1]  # Store the traceback information
@@ -271,6 +346,7 @@ class JsonTestInstance(TestInstance):
         id_key = os.path.basename(file_path)
         log = ResultRecord(id_key)
         super(JsonTestInstance, self).__init__(project, log, **kwargs)
+        self.file_path = file_path
         self.load_errors = None
         self.invalid_tests = None
 
@@ -281,7 +357,7 @@ class JsonTestInstance(TestInstance):
                     clog = self.log.create_child("{}::{}".format(self.id, entry_key))
                     # Test to see if individual test entries are valid or not
                     try:
-                        dt = DictTestInstance(self.project, clog, entry)
+                        dt = entry_class(entry)(self.project, clog, entry, file_path=file_path)
                         self.children.append(dt)
                     except jsonschema.ValidationError as exp:
                         self.log.add_error(entry_key, exp)
@@ -301,78 +377,64 @@ class JsonTestInstance(TestInstance):
         return False
 
 
-class DictTestInstance(TestInstance):
-
-    schema = {
-        "type": "object",
-        "properties": {
-
-            'models': {
-                "type": "array",
-                "items": {
-                    "type": "string"
-                }
-            },
-
-            'conditions': {
-                "type": "array",
-                "items": {
-                    "minItems": 0,
-                    "type": "string"
-                }
-            },
-
-            'designs': {
-                "type": "array",
-                "items": {
-                    "type": "string"
-                }
-            },
-            'reaction_fluxes': {
-                "type": "object",
-                "patternProperties": {
-                    "^.*$": {
-                        "type": "array",
-                        "minItems": 2,
-                        "maxItems": 2,
-                        "items": {"type": "number"}
-                    }
-                }
-            },
-            'required_reactions': {
-                "type": "array",
-                "items": {
-                    "type": "string"
-                }
-            },
-            "description": {"type": "string"},
-            "id": {"type": "string"}
-        },
-        "required": ["description", "reaction_fluxes", "conditions", "models", "designs"],
-    }
-
-    def __init__(self, project, log, entry, master=True, model_loader=None, **kwargs):
-        super(DictTestInstance, self).__init__(project, log, **kwargs)
+def entry_class(entry):
+    """
+    Test instance class for an entry in a json test file, selected by the entry's type.
+    Entries without a type are flux tests.
+    :param entry: dictionary loaded from a json test file
+    :return: EntryTestInstance subclass
+    :raises jsonschema.ValidationError: if the type is not known
+    """
+    entry_type = entry.get('type', 'flux') if isinstance(entry, dict) else 'flux'
+    if entry_type == 'flux':
+        return DictTestInstance
+    elif entry_type == 'dataset':
+        from gsmodutils.test.dataset import DatasetTestInstance
+        return DatasetTestInstance
+    elif entry_type == 'fva':
+        from gsmodutils.test.fva import FVATestInstance
+        return FVATestInstance
+    elif entry_type == 'essentiality':
+        from gsmodutils.test.essentiality import EssentialityTestInstance
+        return EssentialityTestInstance
+
+    raise jsonschema.ValidationError("Unknown test type {}".format(entry_type))
+
+
+class EntryTestInstance(TestInstance):
+    """
+    Base class for entries in json test files.
+    The entry runs once for every combination of the models, conditions and designs it lists. The master instance
+    creates a child for each combination and the children run the test with their model.
+    """
+
+    schema = None
+
+    def __init__(self, project, log, entry, master=True, model_loader=None, file_path=None, **kwargs):
+        super(EntryTestInstance, self).__init__(project, log, **kwargs)
+        self.file_path = file_path
 
         # Test to see if individual test entries are valid or not
         # Exception should be handled when test is loaded
-        jsonschema.validate(entry, DictTestInstance.schema)
+        jsonschema.validate(entry, self.schema)
         self.entry = entry.copy()
+        self._source_entry = entry
         self._master = master
         self._model_loader = model_loader
 
         if self._master:
 
-            if not len(self.entry['conditions']):
+            if not len(entry.get('conditions', [])):
                 self.entry['conditions'] = [None]
 
-            if not len(entry['designs']):
+            if not len(entry.get('designs', [])):
                 self.entry['designs'] = [None]
 
-            if not len(entry['models']):
+            if not len(entry.get('models', [])):
                 self.entry['models'] = self.project.config.models
 
-            # Create children
+    def _collect(self):
+        if self._master:
             for mn in self.entry["models"]:
                 for cid in self.entry["conditions"]:
                     for did in self.entry["designs"]:
@@ -391,7 +453,7 @@ class DictTestInstance(TestInstance):
                         tid = "{}::{}".format(self.id, test_id)
                         clog = self.log.create_child(tid)
                         ml = ModelLoader(self.project, mn, cid, did)
-                        cinst = DictTestInstance(project, clog, entry, False, ml)
+                        cinst = type(self)(self.project, clog, self._source_entry, False, ml, file_path=self.file_path)
                         self.children.append(cinst)
 
     def run(self):
@@ -403,44 +465,134 @@ class DictTestInstance(TestInstance):
                 child.run()
         return self.log
 
-    def _fexec(self, model=None):
+    def load_model(self, model=None):
         """
-        broken up code for testing individual entries
+        Model the test runs on, errors loading the model are added to the log
+        :param model: cobra model to use if the test has no model loader
+        :return: cobra model or None if the model could not be loaded
         """
         if self._override_model is not None:
-            model = self._override_model
+            return self._override_model
         elif model is None and self._model_loader is None:
-            model = self. project.load_model()
+            return self.project.load_model()
         elif self._model_loader is not None:
             try:
-                model = self._model_loader.load(self.log)
+                return self._model_loader.load(self.log)
             except Exception as ex:
                 self.log.add_error("Error loading model {}".format(ex))
-                return self.log
+                return None
 
         elif not isinstance(model, cobra.Model):
             raise TypeError("Expected gsmodutils or cobra model")
 
+        return model
+
+    @abstractmethod
+    def _fexec(self, model=None):
+        pass
+
+    def data_files(self):
+        """ Paths of files, other than the json test file, that the test reads """
+        return []
+
+    def dependencies(self):
+        if self._master:
+            return super(EntryTestInstance, self).dependencies()
+
+        deps = set()
+        if self.file_path is not None:
+            deps.add(('file', self.file_path))
+        for path in self.data_files():
+            deps.add(('file', path))
+        if self._model_loader is not None:
+            deps |= self._model_loader.dependencies()
+        else:
+            deps.add(('model', self.project.config.default_model))
+        return deps
+
+
+class DictTestInstance(EntryTestInstance):
+
+    schema = {
+        "type": "object",
+        "properties": {
+
+            'models': {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                }
+            },
+
+            'conditions': {
+                "type": "array",
+                "items": {
+                    "minItems": 0,
+                    "type": "string"
+                }
+            },
+
+            'designs': {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                }
+            },
+            'reaction_fluxes': {
+                "type": "object",
+                "patternProperties": {
+                    "^.*$": {
+                        "type": "array",
+                        "minItems": 2,
+                        "maxItems": 2,
+                        "items": {"type": "number"}
+                    }
+                }
+            },
+            'required_reactions': {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                }
+            },
+            "description": {"type": "string"},
+            "id": {"type": "string"}
+        },
+        "required": ["description", "reaction_fluxes", "conditions", "models", "designs"],
+    }
+
+    def _fexec(self, model=None):
+        """
+        broken up code for testing individual entries
+        """
+        model = self.load_model(model)
+        if model is None:
+            return self.log
+
         try:
             status = model.solver.optimize()
 
             if status == 'infeasible':
                 raise Infeasible('Cannot find solution')
 
-            # Test entries that require non-zero fluxes
-            for rid in self.entry['required_reactions']:
+            required = self.entry.get('required_reactions', [])
+            flux_ranges = self.entry.get('reaction_fluxes', dict())
+            required_ids = [rid for rid in required if rid in model.reactions]
+            range_ids = [rid for rid in flux_ranges if rid in model.reactions]
 
-                try:
-                    reac = model.reactions.get_by_id(rid)
+            if len(required_ids) or len(range_ids):
+                check_solver_status(status)
 
-                    self.log.assertion(
-                        reac.flux == 0,
-                        success_msg='required reaction {} not active'.format(rid),
-                        error_msg='required reaction {} present at steady state'.format(rid),
-                        desc='.required_reaction'
-                    )
+            # All checks are evaluated against a single query of the solver
+            fluxes = reaction_fluxes(model, required_ids + range_ids)
+            inactive = iter(fluxes[:len(required_ids)] == 0)
+            bounds = np.array([flux_ranges[rid] for rid in range_ids], dtype=float).reshape(-1, 2)
+            range_fluxes = fluxes[len(required_ids):]
+            outside = iter((range_fluxes < bounds[:, 0]) | (range_fluxes > bounds[:, 1]))
 
-                except KeyError:
+            # Test entries that require non-zero fluxes
+            for rid in required:
+                if rid not in model.reactions:
                     self.log.assertion(
                         False,
                         success_msg='',
@@ -449,17 +601,16 @@ class DictTestInstance(TestInstance):
                     )
                     continue
 
+                self.log.assertion(
+                    next(inactive),
+                    success_msg='required reaction {} not active'.format(rid),
+                    error_msg='required reaction {} present at steady state'.format(rid),
+                    desc='.required_reaction'
+                )
+
             # tests for specific reaction flux ranges
-            for rid, (lb, ub) in self.entry['reaction_fluxes'].items():
-                try:
-                    reac = model.reactions.get_by_id(rid)
-                    if reac.flux < lb or reac.flux > ub:
-                        err = 'reaction {} outside of flux bounds {}, {}'.format(rid, lb, ub)
-                        self.log.error.append((err, '.reaction_flux'))
-                    else:
-                        msg = 'reaction {} inside flux bounds {}, {}'.format(rid, lb, ub)
-                        self.log.success.append((msg, '.reaction_flux'))
-                except KeyError:
+            for rid, (lb, ub) in flux_ranges.items():
+                if rid not in model.reactions:
                     # Error log of reaction not found
                     self.log.assertion(
                         False,
@@ -469,6 +620,13 @@ class DictTestInstance(TestInstance):
                     )
                     continue
 
+                if next(outside):
+                    err = 'reaction {} outside of flux bounds {}, {}'.format(rid, lb, ub)
+                    self.log.error.append((err, '.reaction_flux'))
+                else:
+                    msg = 'reaction {} inside flux bounds {}, {}'.format(rid, lb, ub)
+                    self.log.success.append((msg, '.reaction_flux'))
+
         except Infeasible:
             # This is a full test failure (i.e. the model does not work)
             # not a conditional assertion
@@ -480,10 +638,19 @@ class DictTestInstance(TestInstance):
         if len(self.children):
             return False
 
+    def references(self):
+        if self._master:
+            return super(DictTestInstance, self).references()
+
+        reactions = set(self.entry.get('required_reactions', [])) | set(self.entry.get('reaction_fluxes', dict()))
+        return dict(reactions=reactions, metabolites=set(), genes=set(), solves=True)
+
 
 class DefaultTestInstance(TestInstance):
 
-    def __init__(self, project, log_id="default_tests", **kwargs):
+    root_id = "default_tests"
+
+    def __init__(self, project, log_id=root_id, **kwargs):
         """
 
         :param project:
@@ -493,6 +660,7 @@ class DefaultTestInstance(TestInstance):
         log = ResultRecord(log_id)
         super(DefaultTestInstance, self).__init__(project, log, **kwargs)
 
+    def _collect(self):
         for model_path in self.project.config.models:
             # Checking model functions without design
             tf_name = 'model::{}'.format(model_path)
@@ -554,6 +722,16 @@ class ModelTestInstance(TestInstance):
 
             return False
 
+        def references(self):
+            # Default tests check the whole model is feasible so any change can affect them
+            return None
+
+        def dependencies(self):
+            deps = {('model', self.model_path)}
+            if self.conditions is not None:
+                deps.add(('conditions', self.conditions))
+            return deps
+
         @staticmethod
         def _model_check(model):
             """
@@ -654,3 +832,9 @@ class DesignTestInstance(ModelTestInstance):
         if design_id != self.design:
             return False
         return True
+
+    def dependencies(self):
+        deps = {('design', self.design)}
+        if self.conditions is not None:
+            deps.add(('conditions', self.conditions))
+        return deps
@@ -0,0 +1,221 @@
+"""
+Running tests in isolated worker processes.
+
+Each worker is a separate process holding its own project and tester, so models stay loaded between tests. The
+parent sends one test id at a time and waits for the result. If a test takes longer than the allowed time, or the
+worker dies (for example a crash in the solver or running out of memory), the error is recorded against the test,
+the worker is replaced and the remaining tests continue.
+"""
+from __future__ import print_function, absolute_import, division
+
+import collections
+import multiprocessing
+import time
+
+try:
+    from multiprocessing.connection import wait
+except ImportError:  # pragma: no cover
+    # Python 2.7, workers are polled instead
+    wait = None
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+from gsmodutils.test.utils import ResultRecord
+
+# Seconds between checks of busy workers when multiprocessing.connection.wait is not available
+POLL_INTERVAL = 0.05
+
+
+def _set_memory_limit(memory_limit):
+    """ Limit the address space of this process, in megabytes """
+    if resource is None or memory_limit is None:
+        return
+    limit = int(memory_limit * 1024 * 1024)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, project_path, memory_limit):
+    """ Worker process loop, runs test ids received on conn until None is received """
+    _set_memory_limit(memory_limit)
+    from gsmodutils.project.interface import GSMProject
+    tester = GSMProject(project_path, use_cache=True).project_tester()
+
+    while True:
+        tid = conn.recv()
+        if tid is None:
+            break
+
+        try:
+            log = tester.run_by_id(tid)
+            result = dict(log=log.to_dict(), warnings=log.warnings, std_out=log.std_out,
+                          accessed=getattr(tester.get_test(tid), 'accessed', None))
+        except Exception as ex:
+            result = dict(exception="{}: {}".format(type(ex).__name__, ex))
+        conn.send(result)
+
+    conn.close()
+
+
+class _Worker(object):
+
+    def __init__(self, project_path, memory_limit):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn, project_path, memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.tid = None
+        self.started = None
+
+    def send(self, tid):
+        self.tid = tid
+        self.started = time.time()
+        self.conn.send(tid)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        if self.process.is_alive() and hasattr(self.process, 'kill'):
+            # Native code can ignore SIGTERM
+            self.process.kill()
+            self.process.join(1)
+        self.conn.close()
+
+
+def apply_result(log, result):
+    """
+    Copy the result of a test run in a worker in to the test's log
+    :param log: ResultRecord of the test in this process
+    :param result: dictionary returned by a worker
+    :return:
+    """
+    if 'exception' in result:
+        log.add_error("Error running test in worker - {}".format(result['exception']), '.worker_error')
+        return
+
+    record = ResultRecord.from_dict(result['log'])
+    log.reset()
+    log.error = record.error
+    log.success = record.success
+    log.duration = record.duration
+    # Tests such as dataset tests record their assertions in child records
+    for child in result['log'].get('children', dict()).values():
+        ResultRecord.from_dict(child, parent=log)
+    log.warnings = [tuple(w) for w in result['warnings']]
+    log.std_out = result['std_out']
+
+
+def _wait_workers(busy, timeout):
+    """
+    Wait until a busy worker has sent a result or exited
+    :param busy: list of _Worker instances running a test
+    :param timeout: maximum seconds to wait, waits until a worker is ready if None
+    :return: list of workers with results and list of workers that have exited
+    """
+    if wait is not None:
+        ready = wait([w.conn for w in busy] + [w.process.sentinel for w in busy], timeout)
+        return [w for w in busy if w.conn in ready], [w for w in busy if w.process.sentinel in ready]
+
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        results = [w for w in busy if w.conn.poll()]
+        exited = [w for w in busy if not w.process.is_alive()]
+        if len(results) or len(exited) or (deadline is not None and time.time() >= deadline):
+            return results, exited
+        busy[0].conn.poll(POLL_INTERVAL)
+
+
+def run_isolated(tester, test_ids, processes=1, timeout=None, memory_limit=None, callback=None):
+    """
+    Run tests in worker processes, recording the results in the tester's logs
+
+    :param tester: GSMTester for the project
+    :param test_ids: list of leaf test ids to run
+    :param processes: number of worker processes
+    :param timeout: seconds a single test may run for before it is stopped and recorded as an error
+    :param memory_limit: maximum memory of each worker in megabytes
+    :param callback: function called with each test id once it has finished
+    :return: dictionary of test id to ResultRecord
+    """
+    project_path = tester.project.project_path
+    pending = collections.deque(test_ids)
+    workers = [_Worker(project_path, memory_limit) for _ in range(max(1, min(processes, len(pending))))]
+    logs = dict()
+
+    def _finish(worker, error=None, result=None):
+        test = tester.get_test(worker.tid)
+        log = test.log
+        if error is not None:
+            log.add_error(error[0], error[1])
+            log.duration = time.time() - worker.started
+        else:
+            apply_result(log, result)
+            # References recorded by python tests, used by the impact index
+            if result.get('accessed') is not None and hasattr(test, 'accessed'):
+                test.accessed = result['accessed']
+        logs[worker.tid] = log
+        if callback is not None:
+            callback(worker.tid)
+        worker.tid = None
+
+    try:
+        while True:
+            for i, worker in enumerate(workers):
+                if worker.tid is None and len(pending):
+                    try:
+                        worker.send(pending[0])
+                    except (IOError, OSError):
+                        # Worker died between tests
+                        worker.kill()
+                        workers[i] = _Worker(project_path, memory_limit)
+                        continue
+                    pending.popleft()
+
+            busy = [w for w in workers if w.tid is not None]
+            if not len(busy):
+                break
+
+            wait_time = None
+            if timeout is not None:
+                wait_time = max(0, min(w.started + timeout for w in busy) - time.time())
+
+            results, exited = _wait_workers(busy, wait_time)
+            for i, worker in enumerate(workers):
+                if worker.tid is None:
+                    continue
+
+                if worker in results:
+                    try:
+                        _finish(worker, result=worker.conn.recv())
+                        continue
+                    except (EOFError, IOError, OSError):
+                        pass
+
+                if worker in results or worker in exited:
+                    worker.process.join(1)
+                    msg = "Test worker crashed (exit code {})".format(worker.process.exitcode)
+                    _finish(worker, error=(msg, '.worker_crash'))
+                elif timeout is not None and time.time() - worker.started > timeout:
+                    _finish(worker, error=("Test timed out after {} seconds".format(timeout), '.timeout'))
+                else:
+                    continue
+
+                worker.kill()
+                workers[i] = _Worker(project_path, memory_limit)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    return logs
@@ -0,0 +1,138 @@
+"""
+Streaming test reports.
+
+The nested json log is only written once every test has finished. The streaming reporter instead appends one json
+line (ndjson) for each test as soon as it finishes, so results are kept if a run is interrupted. The nested log format
+can be rebuilt from the stream afterwards.
+"""
+from __future__ import print_function, absolute_import, division
+
+import json
+
+from gsmodutils.test.utils import serialise_entries
+
+
+def _log_path(log):
+    """ Ids of a log and its parents, from the top level test file down """
+    path = []
+    while log is not None:
+        path.append(str(log.id))
+        log = log.parent
+    return path[::-1]
+
+
+def stream_entry(log):
+    """
+    Single line dictionary for a finished leaf test. Child records of the test, such as the rows of a dataset test,
+    are included in their nested form.
+    :param log: ResultRecord
+    :return: dict
+    """
+    return dict(
+        id=str(log.id),
+        path=_log_path(log),
+        status='passed' if log.is_success else 'failed',
+        run_time=log.run_time,
+        duration=log.duration,
+        error=serialise_entries(log.error),
+        success=serialise_entries(log.success),
+        warnings=log.warnings,
+        std_out=log.std_out,
+        children=dict((str(cid), child.to_dict()) for cid, child in log.children.items()),
+    )
+
+
+class StreamReporter(object):
+
+    def __init__(self, path):
+        """
+        Writes one json line per finished test to a file. Each line is flushed as it is written.
+        :param path: output file path, overwritten if it exists
+        """
+        self.path = path
+        self._file = open(path, 'w')
+
+    def __call__(self, log):
+        """ Record a finished test """
+        self._file.write(json.dumps(stream_entry(log), default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _new_node(tid):
+    return dict(id=tid, children=dict(), error=[], success=[], is_success=True, run_time=None, duration=None)
+
+
+def _set_success(node):
+    children_ok = [_set_success(c) for c in node['children'].values()]
+    failed = node.pop('failed', False)
+    node['is_success'] = not failed and not len(node['error']) and all(children_ok)
+    return node['is_success']
+
+
+def nested_from_stream(lines):
+    """
+    Rebuild the nested log format (as written by GSMTester.to_dict) from streamed lines
+    :param lines: iterable of json strings, one per test
+    :return: dictionary of test file to nested log dictionaries
+    """
+    logs = dict()
+    for line in lines:
+        if not line.strip():
+            continue
+        # A run that was killed mid write can leave a partial last line
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+
+        path = entry['path']
+        if path[0] not in logs:
+            logs[path[0]] = _new_node(path[0])
+
+        node = logs[path[0]]
+        for tid in path[1:]:
+            if tid not in node['children']:
+                node['children'][tid] = _new_node(tid)
+            node = node['children'][tid]
+
+        node['error'] = entry['error']
+        node['success'] = entry['success']
+        node['run_time'] = entry['run_time']
+        node['duration'] = entry['duration']
+        node['children'].update(entry.get('children', dict()))
+        node['failed'] = entry.get('status') == 'failed'
+
+    for node in logs.values():
+        _set_success(node)
+
+    return logs
+
+
+def read_log(path):
+    """
+    Load a test log written as nested json or as a stream of json lines
+    :param path: log file path
+    :return: dictionary of test file to nested log dictionaries
+    """
+    with open(path) as infile:
+        content = infile.read()
+
+    try:
+        log = json.loads(content)
+    except ValueError:
+        return nested_from_stream(content.splitlines())
+
+    if 'path' in log and 'status' in log:
+        # Stream containing a single test
+        return nested_from_stream([content])
+    return log
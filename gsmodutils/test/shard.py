@@ -0,0 +1,127 @@
+"""
+Splitting project tests across machines.
+
+Leaf tests are partitioned deterministically, so that every machine computes the same shards from the same project.
+When the durations of tests are known from a previous json log, tests are assigned longest first to the shard with
+the least total work, so that shards take a similar amount of time. Logs written by each shard can be merged back in
+to a single log.
+"""
+from __future__ import print_function, absolute_import, division
+
+
+def parse_shard(spec):
+    """
+    Parse a shard specification of the form i/n, where shards are numbered from 1 to n
+    :param spec: string
+    :return: tuple (i, n)
+    """
+    try:
+        index, count = [int(x) for x in spec.split('/')]
+    except ValueError:
+        raise ValueError('Shard should be of the form i/n, got {}'.format(spec))
+
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError('Shard {} out of range, expected 1 <= i <= n'.format(spec))
+
+    return index, count
+
+
+def log_durations(log_dict):
+    """
+    Durations of every test recorded in a json test log
+    :param log_dict: dictionary of test file to nested test logs, as written by gsmodutils test --log_path
+    :return: dictionary of test id to duration in seconds
+    """
+    durations = dict()
+
+    def _walk(log):
+        if log.get('duration') is not None:
+            durations[log['id']] = log['duration']
+        for child in log.get('children', dict()).values():
+            _walk(child)
+
+    for log in log_dict.values():
+        _walk(log)
+
+    return durations
+
+
+def partition(test_ids, n_shards, durations=None):
+    """
+    Deterministically split tests in to shards.
+    Tests are assigned longest first to the shard with the smallest total duration. Tests without a known duration
+    are assumed to take the mean duration of known tests, so without any durations tests are dealt out in order.
+
+    :param test_ids: iterable of test ids
+    :param n_shards: number of shards
+    :param durations: dictionary of test id to duration
+    :return: list of n_shards sorted lists of test ids
+    """
+    if durations is None:
+        durations = dict()
+
+    test_ids = sorted(set(test_ids))
+    known = [durations[tid] for tid in test_ids if tid in durations]
+    default = sum(known) / len(known) if len(known) else 1.0
+    weights = dict((tid, durations.get(tid, default)) for tid in test_ids)
+
+    shards = [[] for _ in range(n_shards)]
+    totals = [0.0] * n_shards
+    for tid in sorted(test_ids, key=lambda t: (-weights[t], t)):
+        idx = min(range(n_shards), key=lambda i: (totals[i], i))
+        shards[idx].append(tid)
+        totals[idx] += weights[tid]
+
+    return [sorted(shard) for shard in shards]
+
+
+def select_shard(test_ids, spec, durations=None):
+    """
+    Tests belonging to a given shard
+    :param test_ids: iterable of all test ids
+    :param spec: shard specification string i/n
+    :param durations: dictionary of test id to duration
+    :return: list of test ids
+    """
+    index, count = parse_shard(spec)
+    return partition(test_ids, count, durations)[index - 1]
+
+
+def _merge_log(log_a, log_b):
+    """ Merge two nested log dictionaries for the same test """
+    children = dict(log_a.get('children', dict()))
+    for cid, child in log_b.get('children', dict()).items():
+        if cid in children:
+            children[cid] = _merge_log(children[cid], child)
+        else:
+            children[cid] = child
+
+    durations = [d for d in [log_a.get('duration'), log_b.get('duration')] if d is not None]
+    # Logs rebuilt from streams have no run time for tests that only contain other tests
+    run_times = [t for t in [log_a.get('run_time'), log_b.get('run_time')] if t is not None]
+    error = list(log_a.get('error', [])) + list(log_b.get('error', []))
+    return dict(
+        id=log_a['id'],
+        children=children,
+        error=error,
+        success=list(log_a.get('success', [])) + list(log_b.get('success', [])),
+        is_success=not len(error) and all(c.get('is_success', True) for c in children.values()),
+        run_time=min(run_times) if len(run_times) else None,
+        duration=sum(durations) if len(durations) else None,
+    )
+
+
+def merge_logs(log_dicts):
+    """
+    Combine the json logs of several shards in to a single log
+    :param log_dicts: list of dictionaries of test file to nested test logs
+    :return: dictionary of test file to nested test logs
+    """
+    merged = dict()
+    for log_dict in log_dicts:
+        for tf, log in log_dict.items():
+            if tf in merged:
+                merged[tf] = _merge_log(merged[tf], log)
+            else:
+                merged[tf] = log
+    return merged
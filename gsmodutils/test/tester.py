@@ -1,9 +1,10 @@
 import glob
 import os
+import time
 from gsmodutils.test.instances import JsonTestInstance, PyTestFileInstance, DefaultTestInstance
+from gsmodutils.test.impact import build_index, load_index, save_index, affected_tests
 from gsmodutils.test.utils import ResultRecord
 import gsmodutils
-from tqdm import tqdm
 
 
 class GSMTester(object):
@@ -21,6 +22,10 @@ class GSMTester(object):
             raise TypeError('Requires valid gsmodutils project')
             
         self.project = project
+        self._clear()
+
+    def _clear(self):
+        """ Forget all collected tests and their logs """
         self.log = dict()
         self.load_errors = []
         self.invalid_tests = []
@@ -34,73 +39,219 @@ class GSMTester(object):
         self._tests_collected = False
 
         self._test_map = dict()
+        self._test_roots = dict()
         self._id_tree = dict()
-    
-    def _load_json_tests(self):
-        """
-        populate all json files from test directory, validate format and add tests to be run
-        """
-        for tf in glob.glob(os.path.join(self.project.tests_dir, "test_*.json")):
-            ti = JsonTestInstance(self.project, tf)
-            self.log[ti.id] = ti.log
-            self._test_map[ti.id] = ti
-            if ti.load_errors is not None:
-                self.load_errors += [ti.load_errors]
-                continue
+        self._roots = dict()
+        self._batches = dict()
 
-            if ti.invalid_tests is not None:
-                self.invalid_tests += [ti.invalid_tests]
-                continue
+    def _register(self, test, root_id):
+        """ Add a materialised test to the map of known tests """
+        if test.id in self._test_map:
+            return
+        self._test_map[test.id] = test
+        self._test_roots[test.id] = root_id
+        test.join_batch(self._batches)
+        if root_id == DefaultTestInstance.root_id and test.id != root_id:
+            self.default_tests.append(test.id)
 
-            self.json_tests.append(ti.id)
+    def _load_json_test(self, tf):
+        """
+        Load a json test file and validate the format of its entries
+        :return: JsonTestInstance or None if the file has errors
+        """
+        ti = JsonTestInstance(self.project, tf)
+        self.log[ti.id] = ti.log
+        self._test_map[ti.id] = ti
+        if ti.load_errors is not None:
+            self.load_errors += [ti.load_errors]
+            return None
 
-            for k, v in ti.get_children(flatten=True).items():
-                self._test_map[k] = v
+        if ti.invalid_tests is not None:
+            self.invalid_tests += [ti.invalid_tests]
+            return None
 
-            self._id_tree[ti.id] = ti.get_id_tree()
+        self.json_tests.append(ti.id)
+        return ti
 
-    def _load_py_tests(self):
+    def _load_py_test(self, pyfile):
         """
-        Loads and compiles each python test in the project's test path
+        Load and compile a python test file
+        :return: PyTestFileInstance or None if the file has syntax errors
         """
-        test_files = os.path.join(self.project.tests_dir, "test_*.py")
-        for pyfile in glob.glob(test_files):
-            tf_name = os.path.basename(pyfile)
-            self.log[tf_name] = ResultRecord(tf_name)
-            testf = PyTestFileInstance(self.project, self.log[tf_name], pyfile)
-
-            if testf.syntax_errors is not None:
-                self.syntax_errors[pyfile] = testf.syntax_errors
-                continue
+        tf_name = os.path.basename(pyfile)
+        self.log[tf_name] = ResultRecord(tf_name)
+        testf = PyTestFileInstance(self.project, self.log[tf_name], pyfile)
 
-            self.python_tests.append(testf.id)
-            self._test_map[testf.id] = testf
-            for k, v in testf.get_children(flatten=True).items():
-                self._test_map[k] = v
+        if testf.syntax_errors is not None:
+            self.syntax_errors[pyfile] = testf.syntax_errors
+            return None
 
-            self._id_tree[tf_name] = testf.get_id_tree()
+        self.python_tests.append(testf.id)
+        self._test_map[testf.id] = testf
+        return testf
 
-    def _load_default_tests(self):
+    def _load_default_test(self):
         dti = DefaultTestInstance(self.project)
         self.log[dti.id] = dti.log
         self._test_map[dti.id] = dti
+        return dti
+
+    def _root(self, root_id):
+        """
+        The top level test for a test file, or the default tests. Loaded on first use.
+        :param root_id: test file name or DefaultTestInstance.root_id
+        :return: test instance or None if the test file does not exist or cannot be loaded
+        """
+        if root_id not in self._roots:
+            path = os.path.join(self.project.tests_dir, root_id)
+            root = None
+            if root_id == DefaultTestInstance.root_id:
+                root = self._load_default_test()
+            elif root_id.startswith('test_') and os.path.isfile(path):
+                if root_id.endswith('.json'):
+                    root = self._load_json_test(path)
+                elif root_id.endswith('.py'):
+                    root = self._load_py_test(path)
+            self._roots[root_id] = root
+
+        return self._roots[root_id]
+
+    def _forget(self, root_id):
+        """ Remove a top level test and every test below it """
+        self._roots.pop(root_id, None)
+        self._id_tree.pop(root_id, None)
+        self.log.pop(root_id, None)
+        self._test_map.pop(root_id, None)
+
+        removed = set(tid for tid, rid in self._test_roots.items() if rid == root_id) | {root_id}
+        for tid in removed:
+            self._test_map.pop(tid, None)
+            self._test_roots.pop(tid, None)
+
+        self.json_tests = [tid for tid in self.json_tests if tid not in removed]
+        self.python_tests = [tid for tid in self.python_tests if tid not in removed]
+        self.default_tests = [tid for tid in self.default_tests if tid not in removed]
+        self.load_errors = [err for err in self.load_errors if err[0] != root_id]
+        self.invalid_tests = [err for err in self.invalid_tests if err[0] != root_id]
+        self.syntax_errors = dict((path, err) for path, err in self.syntax_errors.items()
+                                  if os.path.basename(path) != root_id)
+        self.reset_batches()
+
+    def reset_batches(self):
+        """
+        Forget work shared between tests, such as FVA ranges computed for a batch of tests. Call when project files
+        change between test runs.
+        """
+        self._batches = dict()
+        for test in self._test_map.values():
+            test.join_batch(self._batches)
+
+    def _materialise(self, root_id):
+        """ Create every test below a top level test """
+        root = self._root(root_id)
+        if root is None:
+            return
+
+        for test in root.get_children(flatten=True).values():
+            self._register(test, root_id)
+        self._id_tree[root_id] = root.get_id_tree()
+
+    def _find(self, tid):
+        """
+        Find a test, only creating the tests on the path from its top level test
+        :raises KeyError: if the test does not exist
+        """
+        if tid in self._test_map:
+            return self._test_map[tid]
+
+        root_id = tid.split('::')[0]
+        if not (root_id.endswith('.json') or root_id.endswith('.py')):
+            # Default test ids are of the form model::<model> and design::<design>
+            root_id = DefaultTestInstance.root_id
+
+        root = self._root(root_id)
+        stack = [] if root is None else [root]
+        while len(stack):
+            test = stack.pop()
+            if test.id == tid:
+                return test
+
+            for child in test.children:
+                self._register(child, root_id)
+                if child.id == tid:
+                    return child
+
+            stack += [child for child in test.children if tid.startswith(child.id + '::')]
+
+        raise KeyError('Test {} not found'.format(tid))
+
+    def _test_files(self, pattern):
+        return glob.glob(os.path.join(self.project.tests_dir, pattern))
+
+    def _load_json_tests(self):
+        """
+        populate all json files from test directory, validate format and add tests to be run
+        """
+        for tf in self._test_files("test_*.json"):
+            self._materialise(os.path.basename(tf))
+
+    def _load_py_tests(self):
+        """
+        Loads and compiles each python test in the project's test path
+        """
+        for pyfile in self._test_files("test_*.py"):
+            self._materialise(os.path.basename(pyfile))
 
-        self._id_tree[dti.id] = dti.get_id_tree()
-        for k, v in dti.get_children(flatten=True).items():
-            self._test_map[k] = v
-            self.default_tests.append(v.id)
+    def _load_default_tests(self):
+        self._materialise(DefaultTestInstance.root_id)
 
     @property
     def test_ids(self):
+        """ All test ids, collects every test """
+        if not self._tests_collected:
+            self.collect_tests()
         return list(self._test_map.keys())
 
+    def has_test(self, tid):
+        """
+        Check a test exists. Only the test files needed to find the test are loaded
+        :param tid: test id
+        :return: bool
+        """
+        try:
+            self._find(tid)
+        except KeyError:
+            return False
+        return True
+
     def get_test(self, tid):
-        return self._test_map[tid]
+        """
+        Get a test instance by id. Only the test files needed to find the test are loaded
+        :param tid: test id
+        :return: TestInstance
+        """
+        return self._find(tid)
+
+    def leaf_ids(self, skip_default=False):
+        """
+        Ids of the individual tests that have no child tests
+        :param skip_default: exclude default tests
+        :return: list of test ids
+        """
+        ids = []
+        for tid, test in self._test_map.items():
+            if skip_default and tid in self.default_tests:
+                continue
+            if not len(test.children):
+                ids.append(tid)
+        return ids
 
     def run_by_id(self, tid):
         """ Returns result of individual test function """
-
-        return self._test_map[tid].run()
+        start = time.time()
+        log = self.get_test(tid).run()
+        log.duration = time.time() - start
+        return log
 
     def collect_tests(self):
         """
@@ -111,25 +262,109 @@ class GSMTester(object):
         self._load_py_tests()
         self._tests_collected = True
 
+    def update_tests(self, paths=None):
+        """
+        Reload tests after test files have been added, modified or removed. Tests of other files are kept, so only
+        the changed files are loaded again.
+        :param paths: changed test file paths, all tests (including the default tests) are reloaded if None
+        :return:
+        """
+        collected = self._tests_collected
+        if paths is None:
+            self._clear()
+            if collected:
+                self.collect_tests()
+            return
+
+        for path in paths:
+            root_id = os.path.basename(path)
+            self._forget(root_id)
+            if collected and os.path.isfile(path):
+                self._materialise(root_id)
+
     def iter_tests(self, recollect=False):
-        if not self._tests_collected or recollect:
+        if recollect:
+            self._clear()
+
+        if not self._tests_collected:
             self.collect_tests()
 
         for test in self._test_map:
             yield self.run_by_id(test)
 
-    def progress_tests(self, skip_default=False):
+    def progress_tests(self, skip_default=False, test_ids=None, callback=None):
         """
         Run tests with a progressbar
         :param skip_default:
+        :param test_ids: only run these tests
+        :param callback: function called with the ResultRecord of each test as it finishes
         :return:
         """
+        from tqdm import tqdm
         for tid, test in tqdm(self._test_map.items()):
             if skip_default and tid in self.default_tests:
                 continue
 
+            if test_ids is not None and tid not in test_ids:
+                continue
+
             if not len(test.children):
-                test.run()
+                log = self.run_by_id(tid)
+                if callback is not None:
+                    callback(log)
+
+    def impact_index(self):
+        """
+        Index of each collected test to the reactions, metabolites, genes, designs and conditions it references.
+        References of python tests are recorded when they run, for python tests that have not been run in this session
+        the saved index is used.
+        """
+        return build_index(self, load_index(self.project))
+
+    def update_impact_index(self):
+        """ Save the impact index in the project, call after running tests """
+        index = self.impact_index()
+        save_index(self.project, index)
+        return index
+
+    def affected_by(self, mdiff):
+        """
+        Ids of tests that could be affected by the changes in a model diff.
+        Default tests and python tests that have never been run are always included.
+        :param mdiff: ModelDiff instance or dictionary loaded from a saved diff
+        :return: list of test ids
+        """
+        return affected_tests(self.impact_index(), mdiff)
+
+    def isolated_tests(self, skip_default=False, test_ids=None, processes=1, timeout=None, memory_limit=None,
+                       callback=None):
+        """
+        Run tests with a progressbar in separate worker processes. Tests that exceed the timeout, or crash their
+        worker, are recorded as errors and the remaining tests continue in a new worker.
+        :param skip_default: skip default tests
+        :param test_ids: only run these tests
+        :param processes: number of worker processes
+        :param timeout: maximum seconds for each test
+        :param memory_limit: maximum memory for each worker process in megabytes
+        :param callback: function called with the ResultRecord of each test as it finishes
+        :return:
+        """
+        from tqdm import tqdm
+        from gsmodutils.test.isolation import run_isolated
+
+        if not self._tests_collected:
+            self.collect_tests()
+
+        run_ids = [tid for tid in self.leaf_ids(skip_default) if test_ids is None or tid in test_ids]
+
+        def _finished(tid):
+            pbar.update(1)
+            if callback is not None:
+                callback(self.get_test(tid).log)
+
+        with tqdm(total=len(run_ids)) as pbar:
+            run_isolated(self, run_ids, processes=processes, timeout=timeout, memory_limit=memory_limit,
+                         callback=_finished)
 
     def run_all(self):
         """Find and run all tests for a project, executes rather than returning generator"""
@@ -63,34 +63,228 @@ class ModelTestSelector(object):
         return func
 
 
+class AssertionInfo(object):
+    """
+    Description and time of a single assertion entry. Behaves like the dictionary used in json logs, but stores
+    the two values in slots as large test runs can hold many thousands of entries.
+    """
+    __slots__ = ('desc', 'ex_time')
+
+    def __init__(self, desc='', ex_time=None):
+        self.desc = desc
+        self.ex_time = time.time() if ex_time is None else ex_time
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if isinstance(other, AssertionInfo):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getstate__(self):
+        return self.desc, self.ex_time
+
+    def __setstate__(self, state):
+        self.desc, self.ex_time = state
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        return dict(desc=self.desc, ex_time=self.ex_time)
+
+
+def serialise_entries(entries):
+    """
+    Assertion entries in json serialisable form
+    :param entries: list of (message, description) tuples
+    :return: list
+    """
+    return [(msg, desc.to_dict() if isinstance(desc, AssertionInfo) else desc) for msg, desc in entries]
+
+
+def _load_entry(entry):
+    """ Assertion entry from its json form """
+    msg, desc = entry
+    if isinstance(desc, dict):
+        desc = AssertionInfo(desc.get('desc', ''), desc.get('ex_time'))
+    return msg, desc
+
+
+class _EntryList(list):
+    """
+    List of assertion entries that tells its ResultRecord when entries are added or removed, so that the record
+    can keep its aggregate counts up to date
+    """
+    __slots__ = ('_owner', '_kind')
+
+    def __init__(self, owner, kind, entries=()):
+        list.__init__(self, entries)
+        self._owner = owner
+        self._kind = kind
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def _changed(self, before):
+        self._owner._entries_changed(self._kind, len(self) - before)
+
+    def append(self, item):
+        before = len(self)
+        list.append(self, item)
+        self._changed(before)
+
+    def extend(self, items):
+        before = len(self)
+        list.extend(self, items)
+        self._changed(before)
+
+    def insert(self, index, item):
+        before = len(self)
+        list.insert(self, index, item)
+        self._changed(before)
+
+    def pop(self, *args):
+        before = len(self)
+        item = list.pop(self, *args)
+        self._changed(before)
+        return item
+
+    def remove(self, item):
+        before = len(self)
+        list.remove(self, item)
+        self._changed(before)
+
+    def clear(self):
+        before = len(self)
+        del self[:]
+        self._changed(before)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __setitem__(self, index, item):
+        before = len(self)
+        list.__setitem__(self, index, item)
+        self._changed(before)
+
+    def __delitem__(self, index):
+        before = len(self)
+        list.__delitem__(self, index)
+        self._changed(before)
+
+    # Slice assignment and deletion in python 2
+    def __setslice__(self, i, j, items):
+        self.__setitem__(slice(i, j), items)
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(i, j))
+
+
 class ResultRecord(object):
     """
     Class for handling logging of errors in tester
     follows a hierarchical pattern as log records allow child records
     This is a bit of a weird data structure but the objective is to (in a future version) encapsulate all tests inside
     an instance of Test Record
+
+    Assertion and error counts for each record and its children are kept up to date as entries are added, so checking
+    the status of any part of a large tree does not require walking it.
     """
+    __slots__ = ('id', 'parent', '_success', '_error', 'warnings', 'std_out', 'run_time', 'duration', 'children',
+                 'param_child', '_total', '_errors', '_failed_children', '__weakref__')
+
     def __init__(self, tid='', parent=None, param_child=False):
         self.id = tid
         self.parent = parent
-        self.success = []
-        self.error = []
+        self._total = 0  # assertions of self and children
+        self._errors = 0  # errors of self and children
+        self._failed_children = 0  # direct children that are not successful
+        self._success = _EntryList(self, 'success')
+        self._error = _EntryList(self, 'error')
         self.warnings = []
         self.std_out = None  # Reserved for messages
         self.run_time = time.time()
+        self.duration = None  # Seconds taken to execute the test, set by the tester
         self.children = {}
         # tells us if this is a parameter varaiation of parent (i.e. as low a level as the logs should get)
         self.param_child = param_child
-        
+
+    @property
+    def success(self):
+        return self._success
+
+    @success.setter
+    def success(self, entries):
+        before = len(self._success)
+        self._success = _EntryList(self, 'success', entries)
+        self._entries_changed('success', len(self._success) - before)
+
+    @property
+    def error(self):
+        return self._error
+
+    @error.setter
+    def error(self, entries):
+        before = len(self._error)
+        self._error = _EntryList(self, 'error', entries)
+        self._entries_changed('error', len(self._error) - before)
+
+    def _entries_changed(self, kind, delta):
+        """
+        Update aggregate counts of this record and its parents after entries are added or removed
+        :param kind: 'success' or 'error'
+        :param delta: change in the number of entries
+        """
+        if not delta:
+            return
+
+        d_errors = delta if kind == 'error' else 0
+        if kind == 'error':
+            was_success = not (len(self._error) - delta) and not self._failed_children
+        else:
+            was_success = self.is_success
+
+        self._update_counts(delta, d_errors, was_success)
+
+    def _update_counts(self, d_total, d_errors, was_success):
+        """
+        Add to the aggregate counts of this record and its parents
+        :param d_total: change in the number of assertions
+        :param d_errors: change in the number of errors
+        :param was_success: is_success of this record before the change
+        """
+        node = self
+        while node is not None:
+            node._total += d_total
+            node._errors += d_errors
+            parent = node.parent
+            if parent is not None:
+                parent_was_success = parent.is_success
+                now_success = node.is_success
+                if was_success != now_success:
+                    parent._failed_children += -1 if now_success else 1
+                was_success = parent_was_success
+            node = parent
+
     def assertion(self, statement, success_msg, error_msg, desc=''):
         """
         Called within test functions to store errors and successes
         Results will be appended to the correct log reccords
         """
-        desc = dict(
-            desc=desc,
-            ex_time=time.time()
-        )
+        desc = AssertionInfo(desc)
         if statement:
             self.success.append((success_msg, desc))
         else:
@@ -109,12 +303,32 @@ class ResultRecord(object):
         For errors loading tests, e.g. success cases can't be reached because the model doesn't load or can't get a
         feasable solution
         """
-        desc = dict(
-            desc=desc,
-            ex_time=time.time()
-        )
-        self.error.append((msg, desc))
+        self.error.append((msg, AssertionInfo(desc)))
     
+    def _remove_child(self, child_id):
+        """ Remove a child record and its counts from the aggregates of this record and its parents """
+        child = self.children.get(child_id)
+        if child is None:
+            return
+
+        was_success = self.is_success
+        del self.children[child_id]
+        if not child.is_success:
+            self._failed_children -= 1
+        child.parent = None
+        self._update_counts(-child._total, -child._errors, was_success)
+
+    def reset(self):
+        """ Remove all entries and child records, used before a test is run again """
+        for child_id in list(self.children):
+            self._remove_child(child_id)
+        self.success = []
+        self.error = []
+        self.warnings = []
+        self.std_out = None
+        self.run_time = time.time()
+        self.duration = None
+
     def create_child(self, new_id, param_child=False):
         """
         Used within decorator helper functions to allow multiple tests with the same function but where other parameters
@@ -122,7 +336,9 @@ class ResultRecord(object):
         """
         if self.param_child:
             raise TypeError('Parameter variations should not have child logs')
-        
+
+        # A replaced child no longer counts towards this record
+        self._remove_child(new_id)
         newlog = ResultRecord(new_id, parent=self, param_child=param_child)
         self.children[new_id] = newlog
         return newlog
@@ -132,22 +348,12 @@ class ResultRecord(object):
         """
         The test function is considered a failure if there are one or more error logs
         """
-        if len([x for x in self.children.values() if not x.is_success]) + len(self.error):
-            return False
-        return True
+        return not len(self._error) and not self._failed_children
 
     @property
     def log_count(self):
         """ count total errors for self and children """
-        total = len(self.success) + len(self.error)
-        error = len(self.error)
-        
-        for child in self.children.values():
-            ct, ce = child.log_count
-            error += ce
-            total += ct
-            
-        return total, error
+        return self._total, self._errors
 
     def to_dict(self, stk=None):
         """
@@ -157,21 +363,68 @@ class ResultRecord(object):
         if stk is None:
             stk = []
 
+        # stk is shared by the whole traversal rather than copied at each level
+        stk.append(self.id)
         children = {}
         for child in self.children.values():
             if child.id not in stk:
-                children[str(child.id)] = child.to_dict(stk=stk + [self.id])
-            
+                children[str(child.id)] = child.to_dict(stk=stk)
+        stk.pop()
+
         result = dict(
             id=str(self.id),
             children=children,
-            error=self.error,
-            success=self.success,
+            error=serialise_entries(self.error),
+            success=serialise_entries(self.success),
             is_success=self.is_success,
             run_time=self.run_time,
+            duration=self.duration,
         )
         return result
 
+    @classmethod
+    def from_dict(cls, result, parent=None):
+        """
+        Recreate a log from its dictionary form
+        :param result: dictionary created with to_dict, or loaded from a json log
+        :param parent: parent ResultRecord, the log is added to (or replaces the child with the same id of) its children
+        :return: ResultRecord
+        """
+        if parent is not None:
+            parent._remove_child(result['id'])
+        log = cls(result['id'], parent=parent)
+        if parent is not None:
+            parent.children[log.id] = log
+        log.error = [_load_entry(e) for e in result.get('error', [])]
+        log.success = [_load_entry(s) for s in result.get('success', [])]
+        log.run_time = result.get('run_time', log.run_time)
+        log.duration = result.get('duration')
+        for child in result.get('children', dict()).values():
+            cls.from_dict(child, parent=log)
+        return log
+
+
+def reaction_fluxes(model, reaction_ids):
+    """
+    Fluxes of several reactions from a single query of the solver's primal values.
+    Reading reaction.flux queries the solver for every reaction, which is slow for thousands of reactions.
+
+    :param model: optimised cobra model
+    :param reaction_ids: list of ids of reactions in the model
+    :return: numpy array of fluxes in the order of reaction_ids
+    """
+    import numpy as np
+    if not len(reaction_ids):
+        return np.zeros(0)
+
+    primals = model.solver.primal_values
+    values = np.fromiter(primals.values(), dtype=float, count=len(primals))
+    positions = dict((name, i) for i, name in enumerate(primals))
+    reactions = [model.reactions.get_by_id(rid) for rid in reaction_ids]
+    forward = np.array([positions[r.id] for r in reactions], dtype=int)
+    reverse = np.array([positions[r.reverse_id] for r in reactions], dtype=int)
+    return values[forward] - values[reverse]
+
 
 @contextlib.contextmanager
 def stdout_ctx(stdout=None):
@@ -202,6 +455,22 @@ class ModelLoader(object):
         self.conditions_id = conditions_id
         self.design_id = design_id
 
+    def dependencies(self):
+        """
+        Project resources used to load the model
+        :return: set of (resource type, identifier) tuples
+        """
+        model_id = self.model_id
+        if model_id is None:
+            model_id = self.project.config.default_model
+
+        deps = {('model', model_id)}
+        if self.conditions_id is not None:
+            deps.add(('conditions', self.conditions_id))
+        if self.design_id is not None:
+            deps.add(('design', self.design_id))
+        return deps
+
     def load(self, log):
         mdl = self.project.load_model(self.model_id)
         if self.conditions_id is not None:
@@ -0,0 +1,239 @@
+"""
+Continuous testing for gsmodutils projects.
+
+The watcher keeps a single project in memory with model and design caching enabled, so parsed models are reused
+between test runs. The project directory is polled for changes and only the tests that depend on a changed model,
+design, conditions entry or test file are run again. Tests are collected once, changed test files are loaded again
+and every test is only collected again when models, designs or conditions are added or removed.
+"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import time
+
+from gsmodutils.daemon import project_snapshot
+from gsmodutils.exceptions import DesignError
+from gsmodutils.project.interface import GSMProject
+from gsmodutils.test.tester import GSMTester
+
+
+class WatchReport(object):
+
+    def __init__(self, changed, ran, failures, fixed, total, total_failing, load_errors):
+        """
+        Summary of a single watch cycle
+        :param changed: list of changed file paths, relative to the project
+        :param ran: list of test ids that were run
+        :param failures: dictionary of failing test id to list of error messages, for tests run in this cycle
+        :param fixed: list of test ids that failed in the previous run and now pass
+        :param total: total number of tests in the project
+        :param total_failing: number of failing tests in the project
+        :param load_errors: list of messages for test files that could not be loaded
+        """
+        self.changed = changed
+        self.ran = ran
+        self.failures = failures
+        self.fixed = fixed
+        self.total = total
+        self.total_failing = total_failing
+        self.load_errors = load_errors
+
+    def lines(self):
+        """ Compact, human readable report """
+        n_failed = len(self.failures)
+        lines = ["[{}] {} file(s) changed - ran {} tests, {} passed, {} failed".format(
+            time.strftime("%H:%M:%S"), len(self.changed), len(self.ran), len(self.ran) - n_failed, n_failed)]
+
+        for tid in sorted(self.failures):
+            msgs = self.failures[tid]
+            lines.append("  FAIL  {} {}".format(tid, msgs[0] if len(msgs) else ""))
+
+        for tid in sorted(self.fixed):
+            lines.append("  FIXED {}".format(tid))
+
+        for msg in self.load_errors:
+            lines.append("  ERROR {}".format(msg))
+
+        lines.append("  project: {} tests, {} failing".format(self.total, self.total_failing))
+        return lines
+
+
+class TestWatcher(object):
+
+    def __init__(self, project_path, skip_default=False):
+        """
+        Runs project tests and reruns the tests affected by changes to project files
+        :param project_path: path to gsmodutils project
+        :param skip_default: skip default model, design and conditions tests
+        """
+        self.project = GSMProject(project_path, use_cache=True)
+        self.skip_default = skip_default
+        self.tester = GSMTester(self.project)
+        self._snapshot = dict()
+        self._catalogue = None
+        self._conditions = dict()
+        self._py_design_names = dict()
+        self._results = dict()
+
+    def _read_conditions(self):
+        try:
+            return self.project.get_conditions()['growth_conditions']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def _update_design_names(self):
+        """ Python design file to design names, used when design files are changed or removed """
+        self._py_design_names = dict((pyfile, set(dnames)) for pyfile, dnames in self.project.py_design_files().items())
+
+    def _read_catalogue(self):
+        """ Models, designs and conditions in the project, tests are collected again when these change """
+        conditions = self._read_conditions() or dict()
+        return (sorted(self.project.config.models), sorted(self.project.list_designs),
+                sorted((cid, sorted(cdf.get('models', []))) for cid, cdf in conditions.items()))
+
+    def _design_dependencies(self, did):
+        """ Resources a design is built from """
+        try:
+            design = self.project.get_design(did)
+        except DesignError:
+            return set()
+
+        base_model = design.base_model
+        if base_model is None:
+            base_model = self.project.config.default_model
+
+        deps = {('model', base_model)}
+        if design.conditions is not None:
+            deps.add(('conditions', design.conditions))
+        if design.parent is not None:
+            deps.add(('design', design.parent.id))
+        return deps
+
+    def changed_resources(self, changed):
+        """
+        Map changed files to the project resources they define
+        :param changed: list of absolute file paths
+        :return: set of resource tuples (see TestInstance.dependencies) or None if every test is affected
+        """
+        if self.project.project_file in changed:
+            self.project.update()
+            return None
+
+        resources = set()
+        for path in changed:
+            rel_path = os.path.relpath(path, self.project.project_path)
+            fname = os.path.basename(path)
+            if rel_path in self.project.config.models:
+                resources.add(('model', rel_path))
+            elif path == self.project.conditions_file:
+                conditions = self._read_conditions()
+                if conditions is None:
+                    return None
+                for cid in set(conditions) | set(self._conditions):
+                    if conditions.get(cid) != self._conditions.get(cid):
+                        resources.add(('conditions', cid))
+                self._conditions = conditions
+            elif os.path.dirname(path) == self.project.design_path:
+                if fname.endswith('.json'):
+                    resources.add(('design', fname[:-len('.json')]))
+                elif fname.startswith('design_') and fname.endswith('.py'):
+                    names = self._py_design_names.get(path, set())
+                    self._update_design_names()
+                    names = names | self._py_design_names.get(path, set())
+                    resources |= set(('design', dn) for dn in names)
+            elif os.path.dirname(path) == self.project.tests_dir:
+                resources.add(('file', path))
+
+        # Designs built from changed models, conditions or parent designs are also changed
+        designs = set(self.project.list_designs)
+        updated = True
+        while updated:
+            updated = False
+            for did in designs:
+                if ('design', did) not in resources and len(self._design_dependencies(did) & resources):
+                    resources.add(('design', did))
+                    updated = True
+
+        return resources
+
+    def _run(self, changed, resources):
+        """ Run the tests affected by changed resources (all tests if resources is None) """
+        catalogue = self._read_catalogue()
+        if catalogue != self._catalogue:
+            # Models, designs or conditions have been added or removed, so the set of tests may change
+            self._catalogue = catalogue
+            self.tester.update_tests()
+        else:
+            self.tester.update_tests([p for p in changed if os.path.dirname(p) == self.project.tests_dir])
+            self.tester.reset_batches()
+
+        leaves = dict((tid, self.tester.get_test(tid)) for tid in self.tester.leaf_ids(self.skip_default))
+
+        ran = []
+        failures = dict()
+        fixed = []
+        for tid, test in leaves.items():
+            if resources is not None and tid in self._results and not len(test.dependencies() & resources):
+                continue
+
+            test.log.reset()
+            test.run()
+            ran.append(tid)
+            success = test.log.is_success
+            if not success:
+                failures[tid] = [msg for msg, _ in test.log.error]
+            elif self._results.get(tid) is False:
+                fixed.append(tid)
+            self._results[tid] = success
+
+        # Forget tests that have been removed
+        self._results = dict((tid, res) for tid, res in self._results.items() if tid in leaves)
+
+        load_errors = ["{} {}".format(tf, e) for tf, e in self.tester.load_errors]
+        load_errors += ["{} {} {}".format(tf, entry_key, e) for tf, entry_key, e in self.tester.invalid_tests]
+        load_errors += ["{} {}".format(tf, e) for tf, e in self.tester.syntax_errors.items()]
+
+        rel_changed = sorted(os.path.relpath(p, self.project.project_path) for p in changed)
+        total_failing = len([r for r in self._results.values() if not r])
+        return WatchReport(rel_changed, ran, failures, fixed, len(self._results), total_failing, load_errors)
+
+    def run_all(self):
+        """ Run every test, recording the current state of the project files """
+        self._snapshot = project_snapshot(self.project)
+        self._conditions = self._read_conditions() or dict()
+        self._update_design_names()
+        self._results = dict()
+        self._catalogue = self._read_catalogue()
+        self.tester.update_tests()
+        self.tester.collect_tests()
+        return self._run([], None)
+
+    def poll(self):
+        """
+        Check the project for changed files and run affected tests
+        :return: WatchReport or None if nothing has changed
+        """
+        snapshot = project_snapshot(self.project)
+        changed = [p for p in set(snapshot) | set(self._snapshot) if snapshot.get(p) != self._snapshot.get(p)]
+        if not len(changed):
+            return None
+
+        self._snapshot = snapshot
+        return self._run(changed, self.changed_resources(changed))
+
+    def watch(self, callback, interval=1.0, max_cycles=None):
+        """
+        Run all tests then poll for changes until interrupted
+        :param callback: function called with each WatchReport
+        :param interval: seconds between checks for changed files
+        :param max_cycles: stop after this many polls, runs forever if None
+        :return:
+        """
+        callback(self.run_all())
+        cycles = 0
+        while max_cycles is None or cycles < max_cycles:
+            time.sleep(interval)
+            report = self.poll()
+            if report is not None:
+                callback(report)
+            cycles += 1
@@ -1,5 +1,4 @@
 import cobra
-from cobra.exceptions import Infeasible
 from six import string_types, StringIO
 import sys
 
@@ -87,12 +86,47 @@ def equal_stoich(reaction_a, reaction_b):
     return convert_stoich(reaction_a.metabolites) == convert_stoich(reaction_b.metabolites)
 
 
-def biomass_debug(model, objective_reaction):
+def precursor_producibility(model, metabolite_ids):
+    """
+    Check if the model can produce each metabolite.
+    A sink is added for every metabolite, closed, and each sink is in turn opened and maximised. All changes are
+    made in model contexts, so the model is left unchanged and the solver is warm started between metabolites.
+
+    :param model: cobrapy model instance
+    :param metabolite_ids: list of metabolite ids in the model
+    :return: dictionary of metabolite id to bool, True if the metabolite can be produced
+    """
+    producible = dict()
+    with model:
+        sinks = dict()
+        for mid in metabolite_ids:
+            sink = model.add_boundary(model.metabolites.get_by_id(mid), type='sink', reaction_id='test_BM_{}'.format(mid))
+            sinks[mid] = (sink, sink.bounds)
+            sink.bounds = (0, 0)
+
+        for mid in metabolite_ids:
+            sink, bounds = sinks[mid]
+            with model:
+                sink.bounds = bounds
+                model.objective = sink
+                # Warm started solves can leave numerical noise in place of an exact zero
+                producible[mid] = model.slim_optimize(error_value=0.0) > model.tolerance
+
+    return producible
+
+
+def _debug_task(metabolite_ids):
+    from gsmodutils.utils.parallel import worker_model
+    return precursor_producibility(worker_model('biomass_debug'), metabolite_ids)
+
+
+def biomass_debug(model, objective_reaction, processes=None):
     """
     Utility for debugging a model where changes removed the ability to produce certain biomass components.
     Returns a set of components that cannot be produced
     :param model: cobrapy model instance
     :param objective_reaction: string or reaction id (must be from model)
+    :param processes: number of worker processes to spread precursors over, None runs in this process
     :return:
     """
 
@@ -107,24 +141,19 @@ def biomass_debug(model, objective_reaction):
     elif objective_reaction.model != model:
         raise KeyError('Reaction must be from specified model')
 
-    biomass_metabs = objective_reaction.reactants
-    non_products = []
-    mtest = model.copy()
-    for metab in biomass_metabs:
-        target = mtest.metabolites.get_by_id(metab.id)
-        nobjective = mtest.add_boundary(target, type='sink', reaction_id='test_BM')
-        mtest.objective = nobjective
-
-        try:
-            sol = mtest.optimize()
-            if sol.objective_value == 0.0:
-                non_products.append(target.id)
-        # Some versions of cobra seem to throw exceptions some don't
-        except Infeasible:
-            non_products.append(target.id)
-        nobjective.remove_from_model()
-
-    return non_products
+    biomass_metabs = [metab.id for metab in objective_reaction.reactants]
+
+    if processes is None or processes <= 1 or len(biomass_metabs) <= 1:
+        producible = precursor_producibility(model, biomass_metabs)
+    else:
+        from gsmodutils.utils.parallel import chunk_tasks, map_tasks
+        producible = dict()
+        results = map_tasks(_debug_task, chunk_tasks(biomass_metabs, processes), None, processes=processes,
+                            memory_models=dict(biomass_debug=model))
+        for result in results:
+            producible.update(result)
+
+    return [mid for mid in biomass_metabs if not producible[mid]]
 
 
 def design_annotation(name="", description=None, base_model=None, parent=None, conditions=None):
@@ -1,22 +1,283 @@
+import json
+import multiprocessing
 import os
-from collections import defaultdict, Counter
-from gsmodutils.utils.io import load_model
+import pickle
+import sqlite3
+from collections import Counter
 from cobra import Reaction, Metabolite, Model
-from cobra.io import save_json_model
+from six.moves import intern
+from gsmodutils.utils.parallel import can_start_workers
 import sys
 
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    from collections import Mapping
 
-def parse_db(db_path):
-    """ Parse metacyc dat files to build dict containing entries """
-    compounds_path = os.path.join(db_path, 'compounds.dat')
-    enzymes_path = os.path.join(db_path, 'enzrxns.dat')
-    reactions_path = os.path.join(db_path, 'reactions.dat')
+# Database tables, with the dat file they are parsed from and the fields that only have a single value in each entry
+DB_FILES = dict(
+    compounds=('compounds.dat', ["UNIQUE-ID", "INCHI", "SMILES", "INCHI-KEY"]),
+    reactions=('reactions.dat', ["UNIQUE-ID", "REACTION-DIRECTION"]),
+    enzymes=('enzrxns.dat', ["UNIQUE-ID"]),
+)
 
-    database = dict(
-        compounds=parse_metacyc_file(compounds_path, ["UNIQUE-ID", "INCHI", "SMILES", "INCHI-KEY"]),
-        reactions=parse_metacyc_file(reactions_path, ["UNIQUE-ID", "REACTION-DIRECTION"]),
-        enzymes=parse_metacyc_file(enzymes_path, ["UNIQUE-ID"]),
-    )
+DB_CACHE_NAME = '.gsmodutils_metacyc.sqlite'
+# Caches written with a different version are rebuilt
+DB_CACHE_VERSION = 2
+
+
+# Fields of each table used by gsmodutils, passing these to parse_db greatly reduces its memory use
+DB_FIELDS = dict(
+    compounds=["UNIQUE-ID", "COMMON-NAME"],
+    reactions=["UNIQUE-ID", "COMMON-NAME", "LEFT", "RIGHT", "EC-NUMBER", "REACTION-DIRECTION"],
+    enzymes=["UNIQUE-ID", "COMMON-NAME", "REACTION"],
+)
+
+
+def _parse_table(args):
+    db_path, table, fields = args
+    file_name, unique_fields = DB_FILES[table]
+    return table, parse_metacyc_file(os.path.join(db_path, file_name), unique_fields, fields=fields)
+
+
+def parse_db(db_path, fields=None, processes=1):
+    """
+    Parse metacyc dat files to build dict containing entries, and indexes of reactions by EC number and compound
+    :param db_path: path to the metacyc dat files on disk
+    :param fields: dictionary of table name to the fields kept in its entries (e.g. DB_FIELDS), all fields are kept
+        for tables that are not included
+    :param processes: number of worker processes, each dat file is parsed in a separate process
+    :return: dictionary of compounds, reactions and enzymes tables and ec_reactions and compound_reactions indexes
+    """
+    if fields is None:
+        fields = dict()
+
+    tasks = [(db_path, table, fields.get(table)) for table in DB_FILES]
+    processes = max(1, min(processes, len(tasks)))
+    if processes == 1 or not can_start_workers():
+        database = dict(_parse_table(task) for task in tasks)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            database = dict(pool.map(_parse_table, tasks))
+        finally:
+            pool.close()
+            pool.join()
+
+    database.update(_index_dicts(database['reactions']))
+    return database
+
+
+def _index_dicts(reactions):
+    indexes = dict()
+    for index, rows in reaction_indexes(reactions).items():
+        indexes[index] = dict()
+        for key, reaction_id in rows:
+            indexes[index].setdefault(key, []).append(reaction_id)
+    return indexes
+
+
+def _reaction_index_rows(rid, react):
+    """ (key, reaction id) rows of the EC number and compound indexes for a single reaction """
+    ec_rows = [(eid, rid) for eid in react.get('EC-NUMBER', [])]
+
+    compounds = []
+    for mid in react.get('LEFT', []) + react.get('RIGHT', []):
+        mid = mid.replace('|', '')
+        if mid not in compounds:
+            compounds.append(mid)
+    return ec_rows, [(mid, rid) for mid in compounds]
+
+
+def reaction_indexes(reactions):
+    """
+    Index reactions by their EC numbers and the compounds they use
+    :param reactions: dictionary of reaction entries
+    :return: dictionary of index name to list of (key, reaction id) tuples, in the order of reactions
+    """
+    ec_rows = []
+    compound_rows = []
+    for rid, react in reactions.items():
+        rows = _reaction_index_rows(rid, react)
+        ec_rows += rows[0]
+        compound_rows += rows[1]
+
+    return dict(ec_reactions=ec_rows, compound_reactions=compound_rows)
+
+
+class DatabaseTable(Mapping):
+
+    def __init__(self, connection, table):
+        """
+        Read only dictionary of the entries of a dat file, stored in an sqlite database.
+        Entries are loaded when they are accessed, by their UNIQUE-ID.
+        :param connection: sqlite3 connection
+        :param table: table name
+        """
+        self._connection = connection
+        self._table = table
+
+    def __getitem__(self, unique_id):
+        row = self._connection.execute(
+            'SELECT data FROM {} WHERE unique_id = ?'.format(self._table), (unique_id,)).fetchone()
+        if row is None:
+            raise KeyError(unique_id)
+        return json.loads(row[0])
+
+    def __contains__(self, unique_id):
+        return self._connection.execute(
+            'SELECT 1 FROM {} WHERE unique_id = ?'.format(self._table), (unique_id,)).fetchone() is not None
+
+    def __iter__(self):
+        for row in self._connection.execute('SELECT unique_id FROM {}'.format(self._table)):
+            yield row[0]
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM {}'.format(self._table)).fetchone()[0]
+
+    def items(self):
+        for unique_id, data in self._connection.execute('SELECT unique_id, data FROM {}'.format(self._table)):
+            yield unique_id, json.loads(data)
+
+    def values(self):
+        for _, entry in self.items():
+            yield entry
+
+
+class DatabaseIndex(Mapping):
+
+    def __init__(self, connection, table):
+        """
+        Read only dictionary of key to the list of reaction ids with that key, stored in an sqlite database
+        :param connection: sqlite3 connection
+        :param table: index table name
+        """
+        self._connection = connection
+        self._table = table
+
+    def __getitem__(self, key):
+        rows = self._connection.execute(
+            'SELECT reaction_id FROM {} WHERE key = ? ORDER BY rowid'.format(self._table), (key,)).fetchall()
+        if not len(rows):
+            raise KeyError(key)
+        return [row[0] for row in rows]
+
+    def __iter__(self):
+        for row in self._connection.execute('SELECT DISTINCT key FROM {}'.format(self._table)):
+            yield row[0]
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(DISTINCT key) FROM {}'.format(self._table)).fetchone()[0]
+
+    def lookup(self, keys):
+        """
+        Reaction ids of many keys in as few queries as possible
+        :param keys: iterable of keys
+        :return: dictionary of key to list of reaction ids, keys without reactions are not included
+        """
+        keys = list(set(keys))
+        result = dict()
+        # sqlite limits the number of parameters in a query
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            query = 'SELECT key, reaction_id FROM {} WHERE key IN ({}) ORDER BY rowid'.format(
+                self._table, ', '.join('?' * len(chunk)))
+            for key, reaction_id in self._connection.execute(query, chunk):
+                result.setdefault(key, []).append(reaction_id)
+        return result
+
+
+# Open database caches, keyed by process and path. Connections are not shared with forked processes.
+_db_connections = dict()
+
+
+def _file_stamp(path):
+    """ Modification time and size of a file, cached data is rebuilt when either changes """
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+
+def _table_fields(fields, table):
+    """ Sorted fields kept in the entries of a table, None if all fields are kept """
+    if fields is None or fields.get(table) is None:
+        return None
+    return sorted(fields[table])
+
+
+def _update_db_cache(connection, db_path, fields):
+    """ Parse any dat files that have changed, or were parsed with different fields, since the cache was built """
+    if connection.execute('PRAGMA user_version').fetchone()[0] != DB_CACHE_VERSION:
+        connection.execute('DROP TABLE IF EXISTS sources')
+        connection.execute('PRAGMA user_version = {}'.format(DB_CACHE_VERSION))
+
+    connection.execute('CREATE TABLE IF NOT EXISTS sources '
+                       '(file_name TEXT PRIMARY KEY, mtime REAL, size INTEGER, fields TEXT)')
+    stamps = dict((row[0], tuple(row[1:]))
+                  for row in connection.execute('SELECT file_name, mtime, size, fields FROM sources'))
+
+    for table, (file_name, unique_fields) in DB_FILES.items():
+        path = os.path.join(db_path, file_name)
+        table_fields = _table_fields(fields, table)
+        stamp = _file_stamp(path) + (json.dumps(table_fields),)
+        if stamps.get(file_name) == stamp:
+            continue
+
+        # Entries are written as they are parsed, so the whole file is never held in memory
+        indexes = dict(ec_reactions=[], compound_reactions=[])
+
+        def _rows():
+            for uid, entry in iter_metacyc_file(path, unique_fields, fields=table_fields):
+                if table == 'reactions':
+                    ec_rows, compound_rows = _reaction_index_rows(uid, entry)
+                    indexes['ec_reactions'] += ec_rows
+                    indexes['compound_reactions'] += compound_rows
+                yield uid, json.dumps(entry)
+
+        with connection:
+            connection.execute('DROP TABLE IF EXISTS {}'.format(table))
+            connection.execute('CREATE TABLE {} (unique_id TEXT PRIMARY KEY, data TEXT)'.format(table))
+            connection.executemany('INSERT OR REPLACE INTO {} VALUES (?, ?)'.format(table), _rows())
+
+            if table == 'reactions':
+                for index, rows in indexes.items():
+                    connection.execute('DROP TABLE IF EXISTS {}'.format(index))
+                    connection.execute('CREATE TABLE {} (key TEXT, reaction_id TEXT)'.format(index))
+                    connection.execute('CREATE INDEX {0}_key ON {0} (key)'.format(index))
+                    connection.executemany('INSERT INTO {} VALUES (?, ?)'.format(index), rows)
+
+            connection.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)', (file_name,) + stamp)
+
+
+def load_db(db_path, cache_path=None, fields=DB_FIELDS):
+    """
+    Load a metacyc database, parsing the dat files only when they have changed since they were last loaded.
+
+    Parsed entries are stored in an sqlite database (by default next to the dat files) and are read by UNIQUE-ID when
+    they are used. Indexes of reactions by EC number and by compound are stored with them. The returned tables can be
+    used in place of those returned by parse_db.
+    Only the fields gsmodutils uses are kept by default. The cache is rebuilt when it is loaded with different fields.
+
+    :param db_path: path to the metacyc dat files on disk
+    :param cache_path: path of the sqlite cache file
+    :param fields: dictionary of table name to the fields kept in its entries, all fields are kept if None
+    :return: dictionary of compounds, reactions and enzymes tables and ec_reactions and compound_reactions indexes
+    """
+    if cache_path is None:
+        cache_path = os.path.join(db_path, DB_CACHE_NAME)
+    key = (os.getpid(), os.path.abspath(cache_path))
+
+    try:
+        if key not in _db_connections:
+            _db_connections[key] = sqlite3.connect(key[1])
+        _update_db_cache(_db_connections[key], db_path, fields)
+    except sqlite3.Error:
+        # The cache can't be written, e.g. a read only database directory
+        _db_connections.pop(key, None)
+        return parse_db(db_path, fields=fields)
+
+    database = dict((table, DatabaseTable(_db_connections[key], table)) for table in DB_FILES)
+    for index in ['ec_reactions', 'compound_reactions']:
+        database[index] = DatabaseIndex(_db_connections[key], index)
     return database
 
 
@@ -44,22 +305,24 @@ class FileEncodingCtx(object):
         return self.open_file
 
 
-def parse_metacyc_file(fpath, unique_fields):
+def iter_metacyc_file(fpath, unique_fields, fields=None):
     """
-    Parses a dat file
+    Lazily parses a dat file, one entry at a time
     :str fpath: path to dat file
     :list unique_fields: list of fields that there should only be a single item of in each entry
-    :return:
+    :list fields: fields kept in each entry, all fields are kept if None. UNIQUE-ID is always kept
+    :return: generator of (UNIQUE-ID, entry dictionary) tuples
     """
-    db = dict()
+    if fields is not None:
+        fields = set(fields) | {"UNIQUE-ID"}
 
     with FileEncodingCtx(fpath) as datfile:
-        entry = defaultdict(list)
+        entry = dict()
         lprev = None
         for line in datfile:
             line = line.strip()
             # Comments
-            if line[0] == "#":
+            if not line or line[0] == "#":
                 continue
 
             elif line[:2] == "//":
@@ -68,16 +331,17 @@ def parse_metacyc_file(fpath, unique_fields):
                     if it in entry:
                         entry[it] = entry[it][0]
 
-                db[entry["UNIQUE-ID"]] = dict(entry)
-                entry = defaultdict(list)
+                if "UNIQUE-ID" in entry:
+                    yield entry["UNIQUE-ID"], entry
+                entry = dict()
+                lprev = None
             else:
-                spt = line.split(" - ")
+                spt = line.split(" - ", 2)
                 if len(spt) < 2:
                     continue
 
                 it = spt[0]
                 val = str(spt[1])
-                entry[it].append(val)
                 if it == "^COEFFICIENT" and lprev is not None:
                     # repeat the last entry in metabolites
                     try:
@@ -86,15 +350,30 @@ def parse_metacyc_file(fpath, unique_fields):
                         coef = 1
                     entry[lprev[0]] += (coef - 1) * [lprev[1]]
                     lprev = None
-                elif it in ["LEFT", "RIGHT"]:
+                elif it in ["LEFT", "RIGHT"] and (fields is None or it in fields):
+                    # Compound ids are repeated across many entries and are only stored once
+                    val = intern(val)
                     lprev = (it, val)
                 else:
                     lprev = None
 
-    return db
+                if fields is None or it in fields:
+                    entry.setdefault(intern(it), []).append(val)
+
+
+def parse_metacyc_file(fpath, unique_fields, fields=None):
+    """
+    Parses a dat file
+    :str fpath: path to dat file
+    :list unique_fields: list of fields that there should only be a single item of in each entry
+    :list fields: fields kept in each entry, all fields are kept if None
+    :return: dictionary of UNIQUE-ID to entry
+    """
+    return dict(iter_metacyc_file(fpath, unique_fields, fields=fields))
 
 
-def add_pathway(model, enzyme_ids=None, reaction_ids=None, compartment="c", db_path=None, copy=False):
+def add_pathway(model, enzyme_ids=None, reaction_ids=None, compartment="c", db_path=None, copy=False,
+                cache_path=None):
     """
     For a given model add enzymes from metacyc database
     :param model: cobra model object
@@ -103,12 +382,13 @@ def add_pathway(model, enzyme_ids=None, reaction_ids=None, compartment="c", db_p
     :param compartment: compartment pathway is in
     :param db_path: path to the metacyc dat files on disk
     :param copy:
+    :param cache_path: path of the parsed database cache, see load_db
     :return:
     """
     if copy:
         model = model.copy()
 
-    db = parse_db(db_path)
+    db = load_db(db_path, cache_path=cache_path)
 
     if enzyme_ids is None:
         enzyme_ids = []
@@ -117,9 +397,9 @@ def add_pathway(model, enzyme_ids=None, reaction_ids=None, compartment="c", db_p
         reaction_ids = []
 
     # map enzyme ids to reactions
+    enzyme_reactions = get_enzymes_reactions(enzyme_ids, db)
     for eid in enzyme_ids:
-        erids = get_enzyme_reactions(eid, db)
-        reaction_ids += erids
+        reaction_ids += enzyme_reactions[eid]
 
     added_reactions = []
     added_metabolites = []
@@ -147,6 +427,17 @@ def add_pathway(model, enzyme_ids=None, reaction_ids=None, compartment="c", db_p
     return rdict
 
 
+def _lookup(db, index, keys):
+    """ Batch lookup of keys in an index of the database, either a DatabaseIndex or a dictionary """
+    if index not in db:
+        # Databases built without indexes
+        db[index] = _index_dicts(db['reactions'])[index]
+
+    if hasattr(db[index], 'lookup'):
+        return db[index].lookup(keys)
+    return dict((key, db[index][key]) for key in keys if key in db[index])
+
+
 def get_enzyme_reactions(eid, db):
     """
     For a given ec number return associated reaction ids
@@ -154,16 +445,67 @@ def get_enzyme_reactions(eid, db):
     :param db: database dict
     :return:
     """
-    erids = []
+    return get_enzymes_reactions([eid], db)[eid]
 
-    if eid[:3] != "EC-":
-        eid = "EC-{}".format(eid)
 
-    for rid, react in db['reactions'].items():
-        if 'EC-NUMBER' in react and eid in react['EC-NUMBER']:
-            erids.append(rid)
+def get_enzymes_reactions(eids, db):
+    """
+    Reaction ids associated with each of many ec numbers, looked up in the database's EC number index
+    :param eids: list of enzyme ids, format "EC-x.x.x.x" (the EC- prefix is optional)
+    :param db: database dict, from parse_db or load_db
+    :return: dictionary of each enzyme id, as given, to the list of its reaction ids
+    """
+    keys = dict((eid, eid if eid[:3] == "EC-" else "EC-{}".format(eid)) for eid in eids)
+    found = _lookup(db, 'ec_reactions', set(keys.values()))
+    return dict((eid, list(found.get(key, []))) for eid, key in keys.items())
+
 
-    return erids
+def get_compound_reactions(compound_ids, db):
+    """
+    Reactions that consume or produce each of many compounds
+    :param compound_ids: list of metacyc compound ids
+    :param db: database dict, from parse_db or load_db
+    :return: dictionary of compound id to list of reaction ids
+    """
+    found = _lookup(db, 'compound_reactions', compound_ids)
+    return dict((cid, list(found.get(cid, []))) for cid in compound_ids)
+
+
+def _reaction_stoichiometry(dbr):
+    """ Metabolite ids and coefficients of a reaction entry, raises KeyError if either side is missing """
+    metabolites = dict()
+    for mid, coef in Counter(dbr['LEFT']).items():
+        mid = mid.replace('|', '')
+        metabolites[mid] = coef
+
+    for mid, coef in Counter(dbr['RIGHT']).items():
+        mid = mid.replace('|', '')
+        metabolites[mid] = -1 * coef
+    return metabolites
+
+
+def _reaction_bounds(dbr):
+    """ Bounds of a reaction entry from its REACTION-DIRECTION """
+    if 'REACTION-DIRECTION' in dbr and dbr['REACTION-DIRECTION'] in ['LEFT-TO-RIGHT', 'PHYSIOL-LEFT-TO-RIGHT']:
+        return -1000.0, 0
+    elif 'REACTION-DIRECTION' in dbr and dbr['REACTION-DIRECTION'] in ['RIGHT-TO-LEFT', 'PHYSIOL-RIGHT-TO-LEFT']:
+        return 0, 1000.0
+    return -1000.0, 1000.0
+
+
+def _create_metabolite(mid, db, compartment):
+    """ cobrapy Metabolite for a metacyc compound id """
+    try:
+        cpd = db['compounds'][mid]
+    except KeyError:
+        # Handles missing metabolites
+        cpd = {"COMMON-NAME": mid}
+
+    m = Metabolite(id=mid)
+    m.name = cpd['COMMON-NAME']
+    m.annotation = dict(metacyc_data=cpd)
+    m.compartment = compartment
+    return m
 
 
 def add_reaction(model, reaction_id, db, compartment='c'):
@@ -175,76 +517,116 @@ def add_reaction(model, reaction_id, db, compartment='c'):
     :param compartment: compartment reactions takeplace in (default is "c")
     :return: tuple(reaction, added_metabolites) cobrapy Reaction and Metabolite instances
     """
-    metabolites = dict()
     reaction = Reaction(reaction_id)
 
     dbr = db['reactions'][reaction_id]
-    for mid, coef in Counter(dbr['LEFT']).items():
-        mid = mid.replace('|', '')
-        metabolites[mid] = coef
-
-    for mid, coef in Counter(dbr['RIGHT']).items():
-        mid = mid.replace('|', '')
-        metabolites[mid] = -1 * coef
+    metabolites = _reaction_stoichiometry(dbr)
 
     model.add_reactions([reaction])
     added_metabolites = []
     for mid in metabolites:
         if mid not in model.metabolites:
-            try:
-                cpd = db['compounds'][mid]
-            except KeyError:
-                # Handles missing metabolites
-                cpd = {"COMMON-NAME": mid}
-
-            m = Metabolite(id=mid)
-            m.name =cpd['COMMON-NAME']
-            m.annotation = dict(metacyc_data=cpd)
-            m.compartment = compartment
-            model.add_metabolites([m])
+            model.add_metabolites([_create_metabolite(mid, db, compartment)])
             added_metabolites.append(mid)
 
     reaction.add_metabolites(metabolites)
-    if 'REACTION-DIRECTION' in dbr and dbr['REACTION-DIRECTION'] in ['LEFT-TO-RIGHT', 'PHYSIOL-LEFT-TO-RIGHT']:
-        reaction.lower_bound = -1000.0
-        reaction.upper_bound = 0
-    elif 'REACTION-DIRECTION' in dbr and dbr['REACTION-DIRECTION'] in ['RIGHT-TO-LEFT', 'PHYSIOL-RIGHT-TO-LEFT']:
-        reaction.lower_bound = 0
-        reaction.upper_bound = 1000.0
-    else:
-        reaction.lower_bound = -1000.0
-        reaction.upper_bound = 1000.0
+    reaction.lower_bound, reaction.upper_bound = _reaction_bounds(dbr)
 
     reaction.annotation = dict(metacyc_data=dbr)  # TODO: Add enzyme identifiers
 
     return reaction, added_metabolites
 
 
-def build_universal_model(path, use_cache=True, cache_location='.metacyc_universal.json'):
+UNIVERSAL_CACHE_NAME = '.gsmodutils_metacyc_universal.pickle'
+# Universal model caches written with a different version are rebuilt
+UNIVERSAL_CACHE_VERSION = 2
+
+
+def _db_stamps(path):
+    """ Modification time and size of each dat file in a metacyc database """
+    return dict((file_name, _file_stamp(os.path.join(path, file_name))) for file_name, _ in DB_FILES.values())
+
+
+def _load_universal_cache(cache_location, key):
+    """ Cached universal model, or None if there is no cache or it was built from a different database """
+    try:
+        with open(cache_location, 'rb') as cache_file:
+            cached = pickle.load(cache_file)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        # Missing, truncated or newer pickle protocol caches are rebuilt
+        return None
+
+    if not isinstance(cached, dict) or cached.get('key') != key:
+        return None
+    return cached['model']
+
+
+def universal_model(db, compartment='c'):
+    """
+    Model containing every reaction in a metacyc database.
+    All reactions and metabolites are created first and then added to the model in bulk.
+    Badly formatted reactions are ignored.
+
+    :param db: dictionary db object
+    :param compartment: compartment reactions take place in (default is "c")
+    :return: cobrapy Model
+    """
+    metabolites = dict()
+    reactions = []
+    for reaction_id, dbr in db['reactions'].items():
+        try:
+            stoichiometry = _reaction_stoichiometry(dbr)
+            created = dict((mid, _create_metabolite(mid, db, compartment))
+                           for mid in stoichiometry if mid not in metabolites)
+        except KeyError:
+            continue
+
+        metabolites.update(created)
+        reaction = Reaction(reaction_id)
+        reaction.add_metabolites(dict((metabolites[mid], coef) for mid, coef in stoichiometry.items()))
+        reaction.lower_bound, reaction.upper_bound = _reaction_bounds(dbr)
+        reaction.annotation = dict(metacyc_data=dbr)
+        reactions.append(reaction)
+
+    model = Model()
+    # Metabolites are added before reactions so that cobra does not need to copy them in to the model
+    model.add_metabolites(list(metabolites.values()))
+    model.add_reactions(reactions)
+    return model
+
+
+def build_universal_model(path, use_cache=True, cache_location=None, fields=DB_FIELDS):
     """
     Constructs a universal model from all the reactions in the metacyc database
 
+    The cache is a pickle of the model, by default stored next to the dat files like the cache of load_db. It is
+    rebuilt when it was built from a different database path or fields, or when any of the dat files change. Only use
+    caches from trusted locations, loading a pickle can execute arbitrary code.
+
     :param path: path to folder containing metacyc dat files
     :param use_cache: optionally store the resulting model in cached form
-    :return:
+    :param cache_location: path of the cache file
+    :param fields: fields of the database entries kept in reaction and metabolite annotations, see load_db
+    :return: cobrapy Model
     """
-    try:
-        if use_cache and os.path.exists(cache_location):
-            model = load_model(cache_location)
+    if cache_location is None:
+        cache_location = os.path.join(path, UNIVERSAL_CACHE_NAME)
+    key = (UNIVERSAL_CACHE_VERSION, os.path.abspath(path), _db_stamps(path),
+           dict((table, _table_fields(fields, table)) for table in DB_FILES))
+
+    if use_cache:
+        model = _load_universal_cache(cache_location, key)
+        if model is not None:
             return model
-    except (IOError, TypeError):
-        pass  # This means cached model couldn't be loaded, we'll create a new one
 
-    db = parse_db(path)
-    model = Model()
-    for reaction_id in db['reactions']:
-        try:
-            add_reaction(model, reaction_id, db)
-        except KeyError:
-            # Exception handling ignores badly formatted reactions
-            pass
+    model = universal_model(parse_db(path, fields=fields))
 
     if use_cache:
-        save_json_model(model, cache_location)
+        try:
+            with open(cache_location, 'wb') as cache_file:
+                pickle.dump(dict(key=key, model=model), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError):
+            # The cache can't be written, e.g. a read only database directory
+            pass
 
     return model
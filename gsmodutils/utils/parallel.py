@@ -0,0 +1,143 @@
+"""
+Helpers for spreading work over a pool of worker processes.
+
+Each worker process holds its own GSMProject instance and a cache of the models it has loaded. Tasks that share a
+model or design therefore only pay the cost of parsing it once per worker, rather than once per task.
+Task functions must be defined at module level so that they can be pickled.
+"""
+from __future__ import print_function, absolute_import, division
+
+import multiprocessing
+
+_worker_state = dict(
+    project=None,
+    models=dict(),
+    memory_models=dict(),
+)
+
+
+def can_start_workers():
+    """
+    Daemon processes, such as isolated test workers, cannot start their own worker processes
+    :return: bool
+    """
+    return not multiprocessing.current_process().daemon
+
+
+def init_worker(project_path, memory_models=None):
+    """
+    Pool initializer, creates the project used by all tasks executed in this worker process
+    :param project_path: path to gsmodutils project, None if tasks only use in memory models
+    :param memory_models: dictionary of models that only exist in memory, as cobra.io.model_to_dict dictionaries
+    :return:
+    """
+    project = None
+    if project_path is not None:
+        from gsmodutils.project.interface import GSMProject
+        project = GSMProject(project_path)
+    set_worker_project(project, memory_models)
+
+
+def set_worker_project(project, memory_models=None):
+    """
+    Set the project used in the current process and clear any cached models
+    :param project: GSMProject instance or None
+    :param memory_models: dictionary of cobra models (or model dicts) that only exist in memory
+    :return:
+    """
+    if memory_models is None:
+        memory_models = dict()
+
+    _worker_state['project'] = project
+    _worker_state['models'] = dict()
+    _worker_state['memory_models'] = memory_models
+
+
+def worker_project():
+    """ The GSMProject instance of the current worker """
+    if _worker_state['project'] is None:
+        raise RuntimeError('Worker project has not been initialised')
+    return _worker_state['project']
+
+
+def worker_model(model_id=None, design_id=None):
+    """
+    Returns a model cached by this worker, loading it on first use.
+    Callers should make changes inside a `with model:` context so that the cached model is left unmodified.
+
+    :param model_id: project model path, or key of an in memory model passed to the worker
+    :param design_id: design to load (takes precedence over model_id)
+    :return: cobra model
+    """
+    key = (model_id, design_id)
+    if key not in _worker_state['models']:
+        if design_id is not None:
+            model = worker_project().load_design(design_id)
+        elif model_id in _worker_state['memory_models']:
+            model = _worker_state['memory_models'][model_id]
+            if isinstance(model, dict):
+                from cobra.io import model_from_dict
+                model = model_from_dict(model)
+        else:
+            model = worker_project().load_model(model_id)
+        _worker_state['models'][key] = model
+
+    return _worker_state['models'][key]
+
+
+def chunk_tasks(tasks, n_chunks):
+    """
+    Split a list of tasks in to at most n_chunks contiguous chunks of near equal size. Order is preserved.
+    :param tasks: list
+    :param n_chunks: int
+    :return: list of lists
+    """
+    tasks = list(tasks)
+    n_chunks = max(1, min(n_chunks, len(tasks)))
+    size, rem = divmod(len(tasks), n_chunks)
+    chunks = []
+    start = 0
+    for i in range(n_chunks):
+        end = start + size + (1 if i < rem else 0)
+        chunks.append(tasks[start:end])
+        start = end
+    return [c for c in chunks if len(c)]
+
+
+def map_tasks(func, tasks, project, processes=None, memory_models=None):
+    """
+    Apply func to each task, either in this process or distributed over a pool of worker processes.
+    Results are returned in the order of tasks.
+
+    :param func: module level function taking a single task argument
+    :param tasks: iterable of picklable tasks
+    :param project: GSMProject instance, None if tasks only use memory_models
+    :param processes: number of worker processes. None or 1 runs tasks in the current process
+    :param memory_models: dictionary of in memory cobra models, made available to tasks through worker_model
+    :return: list of results
+    """
+    if memory_models is None:
+        memory_models = dict()
+
+    tasks = list(tasks)
+    if processes is None or processes <= 1 or len(tasks) <= 1 or not can_start_workers():
+        set_worker_project(project, memory_models)
+        try:
+            return [func(task) for task in tasks]
+        finally:
+            set_worker_project(None)
+
+    # Models are sent to the workers as dictionaries. A pickled model also carries its solver state and, for project
+    # models, the whole project it was loaded from
+    from cobra.io import model_to_dict
+    model_dicts = dict((k, model_to_dict(m)) for k, m in memory_models.items())
+    project_path = None if project is None else project.project_path
+    pool = multiprocessing.Pool(min(processes, len(tasks)), initializer=init_worker,
+                                initargs=(project_path, model_dicts))
+    try:
+        results = pool.map(func, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
@@ -1,21 +1,64 @@
 from __future__ import print_function
 
 import click
+import hashlib
+import io
 import json
+import multiprocessing
 import os
 
 import cobra
 import re
+from fractions import Fraction
+from six.moves import cPickle as pickle
 
 from gsmodutils.utils import StringIO
+from gsmodutils.utils.parallel import can_start_workers
 
 
 class ParseError(Exception):
     pass
 
 
+# Direction tokens are always followed by a space so that a coefficient directly after them is a separate token.
+# "<->" is split as "<-" and ">", as it always has been.
+_DIRECTION_RE = re.compile(r'<->|->|<-|<>')
+# Quoted strings (which may be left open at the end of a line), punctuation and anything else up to the next space,
+# quote or punctuation character
+_TOKEN_RE = re.compile(r'"[^"]*"?|\'[^\']*\'?|[():,]|[^"\'():, ]+')
+_FRACTION_RE = re.compile(r'([0-9]+)/([0-9]+)$')
+_NUM_MATCH = re.compile(r'[0-9]*/[0-9]*')
+
+
+def _spaced_direction(match):
+    if match.group() == '<->':
+        return '<- > '
+    return match.group() + ' '
+
+
+def parse_coefficient(token):
+    """
+    Parse a stoichiometric coefficient, either a number or a fraction such as 1/2
+    :param token: string
+    :return: float, or None if the token is not a coefficient
+    :raises ParseError: if the token starts as a fraction but is not a valid one
+    """
+    try:
+        return float(token)
+    except ValueError:
+        pass
+
+    if not _NUM_MATCH.match(token):
+        return None
+
+    match = _FRACTION_RE.match(token)
+    if match is None or int(match.group(2)) == 0:
+        raise ParseError('Invalid stoichiometric coefficient {}'.format(token))
+    return float(Fraction(int(match.group(1)), int(match.group(2))))
+
+
 def load_scrumpy_model(filepath_or_string, name=None, model_id=None, media=None, objective_reactions=None,
-                       obj_dir='min', fixed_fluxes=None):
+                       obj_dir='min', fixed_fluxes=None, cache_dir=None, processes=1):
     """
     Specify a base scrumpy structural model file and returns a cobra model.
     This hasn't be thoroughly tested so expect there to be bugs
@@ -29,6 +72,8 @@ def load_scrumpy_model(filepath_or_string, name=None, model_id=None, media=None,
     :param objective_reactions:
     :param obj_dir:
     :param fixed_fluxes:
+    :param cache_dir: directory to cache parsed files in, see parse_file
+    :param processes: number of processes to parse included files with
     :return:
     """
 
@@ -41,40 +86,39 @@ def load_scrumpy_model(filepath_or_string, name=None, model_id=None, media=None,
     if os.path.isfile(filepath_or_string):
         rel_path = '/'.join(os.path.abspath(filepath_or_string).split('/')[:-1])
         fp = os.path.abspath(filepath_or_string).split('/')[-1]
-        reactions, metabolites, externals = parse_file(fp, rel_path=rel_path)
+        reactions, metabolites, externals = parse_file(fp, rel_path=rel_path, cache_dir=cache_dir, processes=processes)
     else:
         rel_path = '.'
-        reactions, metabolites, externals = parse_string(filepath_or_string, rel_path=rel_path)
+        reactions, metabolites, externals = parse_string(filepath_or_string, rel_path=rel_path, cache_dir=cache_dir,
+                                                         processes=processes)
 
     model = cobra.Model()
+    # All metabolites and reactions are created before any are added to the model, then each kind is added in a
+    # single call. Adding them one at a time is quadratic in cobra.
+    model_metabolites = dict()
     for mid in metabolites:
-        compartment = 'e'
-        if mid[:2] == "x_" or mid in externals:
-            compartment = 'e'
-        m = cobra.Metabolite(id=mid, compartment=compartment)  # ScrumPy does not use compartments
-        model.add_metabolites([m])
+        if mid not in model_metabolites:
+            # ScrumPy does not use compartments
+            model_metabolites[mid] = cobra.Metabolite(id=mid, compartment='e')
 
-    added_reactions = []
+    # The first definition of a reaction is used
+    model_reactions = dict()
     for reaction in reactions:
-        if reaction['id'] not in added_reactions:
-            r = cobra.Reaction(reaction['id'])
-            model.add_reactions([r])
-            r.lower_bound = reaction['bounds'][0]
-            r.upper_bound = reaction['bounds'][1]
-            r.add_metabolites(reaction['metabolites'])
-            added_reactions.append(reaction['id'])
+        if reaction['id'] not in model_reactions:
+            r = cobra.Reaction(reaction['id'], lower_bound=reaction['bounds'][0], upper_bound=reaction['bounds'][1])
+            r.add_metabolites(dict((model_metabolites[mid], coef) for mid, coef in reaction['metabolites'].items()))
+            model_reactions[r.id] = r
 
     # We need to add transporters for external metabolites not defined with the "External" directive
-    for metabolite in model.metabolites:
-        if metabolite.id[:2] == "x_":
-            r = cobra.Reaction("EX_{}".format(metabolite.id[2:]))
-            model.add_reactions([r])
-            r.lower_bound = -1000.0
-            r.upper_bound = 1000.0
-            r.add_metabolites({
-                metabolite.id: -1.0
-            })
-            added_reactions.append(r.id)
+    for metabolite in model_metabolites.values():
+        rid = "EX_{}".format(metabolite.id[2:])
+        if metabolite.id[:2] == "x_" and rid not in model_reactions:
+            r = cobra.Reaction(rid, lower_bound=-1000.0, upper_bound=1000.0)
+            r.add_metabolites({metabolite: -1.0})
+            model_reactions[rid] = r
+
+    model.add_metabolites(list(model_metabolites.values()))
+    model.add_reactions(list(model_reactions.values()))
 
     if media is not None:
         for ex_reaction in model.exchanges:
@@ -105,87 +149,186 @@ def load_scrumpy_model(filepath_or_string, name=None, model_id=None, media=None,
 
 def get_tokens(line):
     """
-    Goes through each charachter in scrumpy file attempting to find tokens
+    Split a line of a scrumpy file in to tokens, ignoring comments
 
-    FIXME: if there is a numeric after a direction token this fails
-    e.g. '->2 "PROTON"' fails but '-> 2 "PROTON"' works
-    :param line_dt:
-    :return:
+    Tokens are quoted strings, the characters ( ) : and , or any other run of characters up to a space, quote or one
+    of these characters. Direction tokens (->, <- and <>) are ended by the next character.
+    :param line:
+    :return: list of token strings
     """
-
     line_dt = line.strip().split('#')[0]
+    return _TOKEN_RE.findall(_DIRECTION_RE.sub(_spaced_direction, line_dt))
 
-    tokens = []
-    quoted = False
-    tk_str = ""
-    line_dt = line_dt.replace("->", "-> ")
-    line_dt = line_dt.replace("<-", "<- ")
-    line_dt = line_dt.replace("<>", "<> ")
-    
-    for ch in line_dt:
-        if ch in ['"', "'"]:
-            if not quoted:
-                quoted = True
-                if len(tk_str) and ch != " ":
-                    tokens.append(tk_str)
-                tk_str = ch
-            elif tk_str[0] == ch:
-                tk_str += ch
-                tokens.append(tk_str)
-                tk_str = ""
-                quoted = False
-            else:
-                tk_str += ch
-                
-        elif ch in ["(", ")", ":", ",", " "] and not quoted:
-            if len(tk_str):
-                tokens.append(tk_str)
-            tk_str = ""
-            if ch != " ":
-                tokens.append(ch)
-        else:
-            tk_str += ch
-    
-    if len(tk_str):
-        tokens.append(tk_str)
-            
-    return tokens
+
+# Parsed files, keyed by the name the file was included as and its absolute path
+_parse_cache = dict()
+
+
+def clear_parse_cache():
+    """ Forget all files parsed in this process, files cached on disk are kept """
+    _parse_cache.clear()
+
+
+def _file_hash(path):
+    with open(path, 'rb') as infile:
+        return hashlib.sha1(infile.read()).hexdigest()
+
+
+def _disk_cache_path(cache_dir, source_name, path):
+    key = hashlib.sha1('{}\0{}'.format(source_name, path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '{}.pickle'.format(key))
+
+
+def _cached_parse(source_name, path, digest, cache_dir):
+    """
+    Cached result of parsing a file, if the file and every file it includes are unchanged
+    :return: cache entry dictionary or None
+    """
+    entry = _parse_cache.get((source_name, path))
+    if (entry is None or entry['hash'] != digest) and cache_dir is not None:
+        try:
+            with open(_disk_cache_path(cache_dir, source_name, path), 'rb') as cache_file:
+                entry = pickle.load(cache_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            entry = None
+
+    if entry is None or entry['hash'] != digest:
+        return None
+
+    for dep_path, dep_hash in entry['dependencies'].items():
+        if not os.path.isfile(dep_path) or _file_hash(dep_path) != dep_hash:
+            return None
+
+    _parse_cache[(source_name, path)] = entry
+    return entry
 
 
-def parse_file(filepath, fp_stack=None, rel_path=''):
+def _copy_result(result):
+    """ Parsed reactions are shared with the cache, so callers get their own copies """
+    reactions, metabolites, externals = result
+    reactions = [dict(r, metabolites=dict(r['metabolites'])) for r in reactions]
+    for reaction in reactions:
+        if 'bounds' in reaction:
+            reaction['bounds'] = list(reaction['bounds'])
+    return reactions, list(metabolites), list(externals)
+
+
+def _parse_file(filepath, fp_stack, rel_path, cache_dir=None, processes=1):
+    """
+    Parse a file, or fetch it from the cache
+    :return: tuple of parsed (reactions, metabolites, externals) and cache entry of the file
+    """
+    fp_stack = fp_stack + [filepath]
+    path = os.path.abspath(os.path.join(rel_path, filepath))
+    with open(path, 'rb') as infile:
+        content = infile.read()
+    digest = hashlib.sha1(content).hexdigest()
+
+    entry = _cached_parse(filepath, path, digest, cache_dir)
+    if entry is not None:
+        for include in entry['includes']:
+            if include in fp_stack:
+                raise ParseError('Cyclic dependency for file {}'.format(include))
+        return _copy_result(entry['result']), entry
+
+    with io.StringIO(content.decode('utf-8'), newline=None) as infile:
+        result, includes = _parse_fobj(infile, fp_stack, rel_path, filepath, cache_dir, processes)
+
+    entry = dict(hash=digest, result=result, dependencies=dict(), includes=set())
+    for include, include_entry in includes:
+        entry['includes'] |= include_entry['includes'] | {include}
+        entry['dependencies'].update(include_entry['dependencies'])
+        entry['dependencies'][include_entry['path']] = include_entry['hash']
+    entry['path'] = path
+
+    _parse_cache[(filepath, path)] = entry
+    if cache_dir is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(_disk_cache_path(cache_dir, filepath, path), 'wb') as cache_file:
+            pickle.dump(entry, cache_file, pickle.HIGHEST_PROTOCOL)
+
+    return _copy_result(result), entry
+
+
+def _parse_include_task(args):
+    """ Worker task, parse an included file """
+    return _parse_file(*args)
+
+
+def parse_file(filepath, fp_stack=None, rel_path='', cache_dir=None, processes=1):
     """
      Recursive function - takes in a scrumpy spy file and parses it, returning a set of reactions
 
+    Parsed files are cached in memory, and on disk if a cache directory is given, so files included by many models
+    are only parsed again when they, or a file they include, change.
+
     Note this code is not fully tested. Expect some bugs.
     :param filepath:
-    :param fp_stack:
+    :param fp_stack: files including this one
     :param rel_path:
+    :param cache_dir: directory to store parsed files in
+    :param processes: number of processes to parse the files included by this file with
     :return:
     """
     if fp_stack is None:
-        fp_stack = [filepath]
-    else:
-        fp_stack.append(filepath)
+        fp_stack = []
 
-    with open(os.path.join(rel_path, filepath)) as infile:
-        reactions, metabolites, externals = parse_fobj(infile, fp_stack, rel_path, filepath)
-    return reactions, metabolites, externals
+    result, _ = _parse_file(filepath, list(fp_stack), rel_path, cache_dir, processes)
+    return result
 
 
-def parse_string(spy_string, rel_path='.'):
+def parse_string(spy_string, rel_path='.', cache_dir=None, processes=1):
     with StringIO() as fstr:
         fstr.write(spy_string)
         fstr.seek(0)
-        reactions, metabolites, externals = parse_fobj(fstr, [], rel_path, "scrumpy_string")
+        reactions, metabolites, externals = parse_fobj(fstr, [], rel_path, "scrumpy_string", cache_dir=cache_dir,
+                                                       processes=processes)
     return reactions, metabolites, externals
 
 
-def parse_fobj(infile, fp_stack, rel_path, source_name):
+def parse_fobj(infile, fp_stack, rel_path, source_name, cache_dir=None, processes=1):
+    result, _ = _parse_fobj(infile, fp_stack, rel_path, source_name, cache_dir, processes)
+    return result
+
+
+def _parse_includes(includes, fp_stack, rel_path, cache_dir, processes):
+    """
+    Parse included files, concurrently if there is more than one process
+    :return: list of (reactions, metabolites, externals) and cache entry tuples, one for each included file
+    """
+    for include in includes:
+        if include in fp_stack:
+            raise ParseError('Cyclic dependency for file {}'.format(include))
+
+    tasks = [(include, fp_stack, rel_path, cache_dir) for include in includes]
+    processes = min(processes, len(tasks))
+    if processes <= 1 or not can_start_workers():
+        return [_parse_include_task(task) for task in tasks]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        parsed = pool.map(_parse_include_task, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
 
-    num_match = re.compile("[0-9]*/[0-9]*")
+    # Keep the worker's results for later loads in this process
+    for include, (_, entry) in zip(includes, parsed):
+        _parse_cache[(include, entry['path'])] = entry
+    return parsed
+
+
+def _parse_fobj(infile, fp_stack, rel_path, source_name, cache_dir=None, processes=1):
+    """
+    Parse a scrumpy file object, included files are parsed once the whole file has been read
+    :return: tuple of (reactions, metabolites, externals) and list of (included file, cache entry) tuples
+    """
     reactions = []
     metabolites = []
     externals = []
+    # Positions in the reactions, metabolites and externals lists where included files are inserted
+    includes = []
 
     in_include = False
     in_external = False
@@ -217,19 +360,16 @@ def parse_fobj(infile, fp_stack, rel_path, source_name):
                 elif token == "+":
                     pass
                 else:
-                    try:
-                        si = float(token)
-                    except ValueError:
+                    coefficient = parse_coefficient(token)
+                    if coefficient is not None:
+                        si = coefficient
+                    elif len(token.strip()):
+                        metab = token.replace('"', '').replace("'", '')
 
-                        if num_match.match(token):
-                            si = eval(token)
-                        elif len(token.strip()):
-                            metab = token.replace('"', '').replace("'", '')
-
-                            metabolites.append(metab)
-                            # not a stoichiometric value
-                            reaction['metabolites'][metab] = s_coef * si
-                            si = 1.0
+                        metabolites.append(metab)
+                        # not a stoichiometric value
+                        reaction['metabolites'][metab] = s_coef * si
+                        si = 1.0
 
                 prev_token = token
                 continue
@@ -261,13 +401,8 @@ def parse_fobj(infile, fp_stack, rel_path, source_name):
 
                 elif token == ')':
                     in_include = False
-                elif token in fp_stack:
-                    raise ParseError('Cyclic dependency for file {}'.format(token))
                 else:
-                    rset, mset, exset = parse_file(token, fp_stack, rel_path)
-                    reactions += rset
-                    metabolites += mset
-                    externals += exset
+                    includes.append((token, len(reactions), len(metabolites), len(externals)))
                 continue
 
             if token == 'External':
@@ -287,7 +422,14 @@ def parse_fobj(infile, fp_stack, rel_path, source_name):
 
             prev_token = token
 
-    return reactions, metabolites, externals
+    parsed = _parse_includes([include[0] for include in includes], fp_stack, rel_path, cache_dir, processes)
+    # Insert from the end so that earlier positions are unchanged
+    for (_, rpos, mpos, epos), ((rset, mset, exset), _) in reversed(list(zip(includes, parsed))):
+        reactions[rpos:rpos] = rset
+        metabolites[mpos:mpos] = mset
+        externals[epos:epos] = exset
+
+    return (reactions, metabolites, externals), [(include[0], entry) for include, (_, entry) in zip(includes, parsed)]
 
 
 @click.command()
@@ -4,9 +4,17 @@ Standard cobrapy model validator
 Taken from https://github.com/aebrahim/cobra_sbml_validator
 (released under MIT license at the time of writing)
 """
+import numpy as np
 from cobra.core import get_solution
 from gsmodutils.utils.io import load_model
 
+try:
+    from cobra import Configuration
+    BALANCE_TOLERANCE = Configuration().tolerance
+except ImportError:  # pragma: no cover
+    # Older versions of cobra check for an exact balance
+    BALANCE_TOLERANCE = 0.0
+
 
 def validate_model_file(model_path):
     """
@@ -16,23 +24,157 @@ def validate_model_file(model_path):
     return validate_model(model)
 
 
-def validate_model(model):
+def composition_matrix(metabolites):
+    """
+    Element and charge composition of metabolites, parsing each formula only once
+    :param metabolites: list of cobra metabolites
+    :return: list of row labels (elements followed by 'charge') and numpy array of rows by metabolites
+    :raises ValueError: if a formula can not be parsed
+    """
+    compositions = []
+    elements = set()
+    for metabolite in metabolites:
+        composition = metabolite.elements
+        if composition is None:
+            raise ValueError("No elements found in metabolite {}".format(metabolite.id))
+        compositions.append(composition)
+        elements |= set(composition)
+
+    labels = sorted(elements) + ['charge']
+    index = dict((label, i) for i, label in enumerate(labels))
+    matrix = np.zeros((len(labels), len(metabolites)))
+    for j, (metabolite, composition) in enumerate(zip(metabolites, compositions)):
+        for element, amount in composition.items():
+            matrix[index[element], j] = amount
+        if metabolite.charge is not None:
+            matrix[index['charge'], j] = metabolite.charge
+
+    return labels, matrix
+
+
+def mass_balance(model, reaction_ids=None):
+    """
+    Mass and charge balance of reactions, as given by reaction.check_mass_balance.
+    The balance of every reaction is computed as a single product of the composition matrix with the sparse
+    stoichiometric matrix of the reactions.
+
+    :param model: cobra model
+    :param reaction_ids: reactions to check, all reactions in the model by default
+    :return: dictionary of reaction id to dictionary of unbalanced elements (and charge), balanced reactions are
+        not included
+    :raises ValueError: if the formula of a metabolite in the reactions can not be parsed
+    """
+    if reaction_ids is None:
+        reactions = list(model.reactions)
+    else:
+        reactions = [model.reactions.get_by_id(rid) for rid in reaction_ids]
+
+    # Stoichiometric matrix in coordinate form
+    metabolites, met_index = [], dict()
+    rows, cols, coefficients = [], [], []
+    for j, reaction in enumerate(reactions):
+        for metabolite, coefficient in reaction.metabolites.items():
+            if metabolite.id not in met_index:
+                met_index[metabolite.id] = len(metabolites)
+                metabolites.append(metabolite)
+            rows.append(met_index[metabolite.id])
+            cols.append(j)
+            coefficients.append(coefficient)
+
+    labels, composition = composition_matrix(metabolites)
+    balance = np.zeros((len(reactions), len(labels)))
+    np.add.at(balance, np.array(cols, dtype=int),
+              (composition[:, np.array(rows, dtype=int)] * np.array(coefficients, dtype=float)).T)
+
+    unbalanced = dict()
+    for j, i in zip(*np.nonzero(np.abs(balance) > BALANCE_TOLERANCE)):
+        unbalanced.setdefault(reactions[j].id, dict())[labels[i]] = balance[j, i]
+    return unbalanced
+
+
+def orphan_metabolites(model, metabolite_ids=None):
+    """
+    Metabolites that are not used by any reaction, or that the reactions of the model can only produce or only consume.
+    Reaction bounds are used to decide the directions a reaction can carry flux in.
+
+    :param model: cobra model
+    :param metabolite_ids: metabolites to check, all metabolites in the model by default
+    :return: dictionary of orphan metabolite id to 'unused', 'not_consumed' or 'not_produced'
+    """
+    if metabolite_ids is None:
+        metabolites = list(model.metabolites)
+    else:
+        metabolites = [model.metabolites.get_by_id(mid) for mid in metabolite_ids]
+
+    orphans = dict()
+    for metabolite in metabolites:
+        produced = consumed = False
+        for reaction in metabolite.reactions:
+            coefficient = reaction.metabolites[metabolite]
+            if reaction.upper_bound > 0:
+                produced |= coefficient > 0
+                consumed |= coefficient < 0
+            if reaction.lower_bound < 0:
+                produced |= coefficient < 0
+                consumed |= coefficient > 0
+
+        if not len(metabolite.reactions):
+            orphans[metabolite.id] = 'unused'
+        elif not consumed:
+            orphans[metabolite.id] = 'not_consumed'
+        elif not produced:
+            orphans[metabolite.id] = 'not_produced'
+
+    return orphans
+
+
+def check_structure(model, reaction_ids=None, metabolite_ids=None):
+    """
+    Checks of a model that do not need the model to be solved, mass balance and orphan metabolites
+    :param model: cobra model
+    :param reaction_ids: reactions to check the mass balance of, all reactions by default
+    :param metabolite_ids: metabolites to check for orphans, all metabolites by default
+    :return: dictionary of errors, warnings, unbalanced reactions and orphan metabolites
+    """
+    errors = []
+    warnings = []
+
+    try:
+        unbalanced = mass_balance(model, reaction_ids)
+    except ValueError as ex:
+        errors.append(str(ex))
+        unbalanced = dict()
+
+    for reaction in model.reactions:
+        if reaction.id in unbalanced:
+            warnings.append("reaction '%s' is not balanced for %s" %
+                            (reaction.id, ", ".join(sorted(unbalanced[reaction.id]))))
+
+    orphans = orphan_metabolites(model, metabolite_ids)
+    for mid in sorted(orphans):
+        warnings.append("metabolite '%s' is an orphan (%s)" % (mid, orphans[mid].replace('_', ' ')))
+
+    return {"errors": errors, "warnings": warnings, "unbalanced": unbalanced, "orphans": orphans}
+
+
+def validate_model(model, reaction_ids=None):
     """
     Cobra model validator 
     
     Modified from https://github.com/aebrahim/cobra_sbml_validator (MIT LICENCE)
+
+    :param model: cobra model
+    :param reaction_ids: only check the mass balance of these reactions, for example those changed by a design
     """
     errors = []
     warnings = []
 
     # test mass balance
+    unbalanced = mass_balance(model, reaction_ids)
     for reaction in model.reactions:
-        
-        balance = reaction.check_mass_balance()
-        
-        if len(balance):
+        if reaction.id in unbalanced:
             warnings.append("reaction '%s' is not balanced for %s" %
-                            (reaction.id, ", ".join(sorted(balance))))
+                            (reaction.id, ", ".join(sorted(unbalanced[reaction.id]))))
 
     # try solving
     model.optimize()
@@ -116,6 +116,63 @@ def test_export(fmt, excode):
                 assert l_model.reactions.EX_glc__D_e.lower_bound == 0.0
 
 
+def test_evaluate():
+    with FakeProjectContext() as ctx:
+        ctx.add_fake_conditions()
+        ctx.add_fake_designs()
+        runner = CliRunner()
+
+        opt = os.path.join(ctx.path, 'evaluation.csv')
+        result = runner.invoke(gsmodutils.cli.evaluate, ['--project_path', ctx.path, '--output', opt,
+                                                         '--design', 'cbb_cycle', '--conditions', 'xyl_src',
+                                                         '--flux', 'RBPC', '--processes', '2'])
+        assert result.exit_code == 0
+        assert os.path.exists(opt)
+
+        with open(opt) as csv_file:
+            # header + design x conditions rows
+            assert len(csv_file.read().strip().split("\n")) == 2
+
+        df = ctx.project.evaluate_designs(designs=['cbb_cycle'], conditions=['xyl_src', None], fluxes=['RBPC'])
+        assert len(df) == 2
+        assert df.index[0] == ('cbb_cycle', 'xyl_src')
+        assert (df['status'] == 'optimal').all()
+
+        result = runner.invoke(gsmodutils.cli.evaluate, ['--project_path', ctx.path, '--design', 'cbb_cycle'])
+        assert result.exit_code == 0
+        assert 'cbb_cycle' in result.output
+
+        result = runner.invoke(gsmodutils.cli.evaluate, ['--project_path', ctx.path, '--design', 'not_there'])
+        assert result.exit_code == -1
+
+
+def test_validate():
+    with FakeProjectContext() as ctx:
+        ctx.add_fake_conditions()
+        ctx.add_fake_designs()
+        runner = CliRunner()
+
+        opt = os.path.join(ctx.path, 'validation.json')
+        result = runner.invoke(gsmodutils.cli.validate, ['--project_path', ctx.path, '--output', opt,
+                                                         '--design', 'cbb_cycle', '--processes', '2', '--verbose'])
+        assert result.exit_code == 0
+        assert 'design::cbb_cycle - 0 errors' in result.output
+        assert "reaction 'PRUK' is not balanced for charge" in result.output
+
+        with open(opt) as report_file:
+            report = json.load(report_file)
+        assert report['errors'] == 0
+        assert [r['design'] for r in report['results']] == ['cbb_cycle']
+
+        # The python design adds a sink without a compartment, so the xyl_src media can't be applied
+        result = runner.invoke(gsmodutils.cli.validate, ['--project_path', ctx.path, '--design', 'fake_testpy'])
+        assert result.exit_code == -1
+        assert 'conditions xyl_src could not be applied' in result.output
+
+        result = runner.invoke(gsmodutils.cli.validate, ['--project_path', ctx.path, '--design', 'not_there'])
+        assert result.exit_code == -1
+
+
 def test_import_conditions():
     with FakeProjectContext() as ctx:
         runner = CliRunner()
@@ -398,3 +455,124 @@ def test_create_project():
         # attempting rerun will raise exception
         result = runner.invoke(gsmodutils.cli.init, [ctx.path, _CORE_MODEL_PATH], input=inpt)
         assert result.exit_code == -1
+
+
+def test_daemon():
+    import subprocess
+    import sys
+    import time
+    from gsmodutils import daemon
+
+    with FakeProjectContext() as ctx:
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(gsmodutils.__file__))
+        proc = subprocess.Popen([sys.executable, '-c', 'from gsmodutils.cli import cli; cli()', 'serve',
+                                 '--project_path', ctx.path], env=env)
+        try:
+            for _ in range(600):
+                if daemon.daemon_running(ctx.path):
+                    break
+                time.sleep(0.2)
+            assert daemon.daemon_running(ctx.path)
+
+            runner = CliRunner()
+            opt = os.path.join(ctx.path, 'testmdl.json')
+            result = runner.invoke(gsmodutils.cli.cli, ['export', 'json', opt, '--project_path', ctx.path])
+            assert result.exit_code == 0
+            assert 'successfully written' in result.output
+            assert os.path.exists(opt)
+
+            # Changed files are picked up by the daemon
+            project = GSMProject(ctx.path)
+            model = project.load_model()
+            model.reactions.EX_xyl__D_e.lower_bound = -8.00
+            model.reactions.EX_glc__D_e.lower_bound = 0.0
+            project.save_conditions(model, 'xylose_growth')
+
+            result = runner.invoke(gsmodutils.cli.cli, ['export', 'json', opt, '--project_path', ctx.path,
+                                                        '--conditions', 'xylose_growth', '--overwrite'])
+            assert result.exit_code == 0
+            assert load_model(opt).reactions.EX_xyl__D_e.lower_bound == -8.00
+
+            # Errors are passed back from the daemon
+            result = runner.invoke(gsmodutils.cli.cli, ['export', 'json', opt, '--project_path', ctx.path])
+            assert result.exit_code == -1
+
+            result = runner.invoke(gsmodutils.cli.serve, ['--project_path', ctx.path, '--stop'])
+            assert result.exit_code == 0
+            assert 'Daemon stopped' in result.output
+            proc.wait(timeout=60)
+            assert not os.path.exists(daemon.socket_path(ctx.path))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+
+
+def test_daemon_invalidate():
+    """ The daemon only forgets the models and designs read from changed files """
+    import time
+    from gsmodutils import daemon
+
+    def touch(path):
+        mtime = time.time() + 10
+        os.utime(path, (mtime, mtime))
+
+    with FakeProjectContext() as ctx:
+        ctx.add_fake_designs()
+        server = daemon.ProjectDaemon(ctx.path)
+        project = server.get_project(ctx.path)
+        mpath = project.config.default_model
+        project.read_model_file(mpath)
+        project.get_design('cbb_cycle')
+        project.get_design('mevalonate_cbb')
+        assert 'fake_testpy' in project.list_designs
+
+        # Conditions and tests are read by every command, nothing cached is dropped
+        touch(project.conditions_file)
+        with open(os.path.join(project.tests_dir, 'test_new.json'), 'w') as tf:
+            json.dump(dict(), tf)
+        server.invalidate()
+        assert server.get_project(ctx.path) is project
+        assert mpath in project._model_cache
+        assert set(project._json_design_cache) == {'cbb_cycle', 'mevalonate_cbb'}
+
+        touch(os.path.join(project.design_path, 'cbb_cycle.json'))
+        touch(os.path.join(project.design_path, 'design_fake.py'))
+        server.invalidate()
+        assert server.get_project(ctx.path) is project
+        assert set(project._json_design_cache) == {'mevalonate_cbb'}
+        assert not len(project._py_compiled_designs)
+        assert mpath in project._model_cache
+        assert 'fake_testpy' in project.list_designs
+
+        touch(os.path.join(ctx.path, mpath))
+        server.invalidate()
+        assert mpath not in project._model_cache
+
+        # A changed project configuration reloads the whole project
+        touch(project.project_file)
+        server.invalidate()
+        assert server.get_project(ctx.path) is not project
+
+
+def test_daemon_timeout(monkeypatch):
+    """ Commands run in the client when the daemon does not respond """
+    import socket
+    from gsmodutils import daemon
+
+    with FakeProjectContext() as ctx:
+        # Accepts connections but never responds
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(daemon.socket_path(ctx.path))
+        server.listen(5)
+        monkeypatch.setenv(daemon.TIMEOUT_ENV, '0.5')
+        try:
+            assert daemon.forward_command(ctx.path, ['info', '--project_path', ctx.path]) is None
+
+            runner = CliRunner()
+            opt = os.path.join(ctx.path, 'testmdl.json')
+            result = runner.invoke(gsmodutils.cli.cli, ['export', 'json', opt, '--project_path', ctx.path])
+            assert result.exit_code == 0
+            assert os.path.exists(opt)
+        finally:
+            server.close()
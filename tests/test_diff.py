@@ -2,7 +2,7 @@ from gsmodutils import load_model
 import gsmodutils.model_diff
 import pytest
 import cobra
-from tutils import _CORE_MODEL_PATH
+from tutils import _CORE_MODEL_PATH, FakeProjectContext
 
 
 def test_model_ident():
@@ -85,3 +85,27 @@ def test_model_error():
 
     with pytest.raises(TypeError):
         gsmodutils.model_diff.model_diff(model_a, model_b)
+
+
+def test_objective_change():
+    """
+    Reactions whose objective coefficient changes are included, so designs saved from a model keep its objective
+    """
+    from cobra.util.solver import linear_reaction_coefficients
+    model_a = load_model(_CORE_MODEL_PATH)
+    model_b = load_model(_CORE_MODEL_PATH)
+    model_b.objective = 'ATPM'
+
+    objective_a = [r.id for r in linear_reaction_coefficients(model_a)]
+    diff = gsmodutils.model_diff.model_diff(model_a, model_b)
+    assert sorted(r['id'] for r in diff['reactions']) == sorted(objective_a + ['ATPM'])
+    coefficients = dict((r['id'], r['objective_coefficient']) for r in diff['reactions'])
+    assert coefficients['ATPM'] == 1
+    assert all(coefficients[rid] == 0 for rid in objective_a)
+
+    with FakeProjectContext() as ctx:
+        model = ctx.project.load_model()
+        model.objective = 'ATPM'
+        ctx.project.save_design(model, 'atp', 'ATP maintenance')
+        design = ctx.project.load_design('atp')
+        assert [r.id for r in linear_reaction_coefficients(design)] == ['ATPM']
@@ -0,0 +1,57 @@
+"""
+Import time regression tests
+
+Heavy dependencies should only be imported when they are first used, so that the command line interface starts
+quickly.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+_HEAVY_MODULES = ['cobra', 'pandas', 'tqdm', 'jsonschema', 'fasteners', 'optlang']
+
+
+def _imported_modules(statement):
+    """
+    Runs a statement in a clean interpreter
+    :return: set of the names of modules in sys.modules once the statement has run
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    statement += "\nimport sys\nsys.stdout.write('\\n'.join(sys.modules))"
+    proc = subprocess.Popen([sys.executable, '-c', statement], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    assert proc.returncode == 0, err
+    return set(out.decode('utf-8').splitlines())
+
+
+# Heavy dependencies are only imported lazily with module level __getattr__
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="requires module __getattr__")
+@pytest.mark.parametrize("statement", [
+    "import gsmodutils",
+    "import gsmodutils.cli",
+    "from gsmodutils.cli import cli\ntry:\n    cli(['--help'])\nexcept SystemExit:\n    pass",
+])
+def test_no_heavy_imports(statement):
+    modules = _imported_modules(statement)
+    assert 'gsmodutils' in modules
+    for module in _HEAVY_MODULES:
+        assert module not in modules, "{} imported by '{}'".format(module, statement)
+
+
+def test_lazy_attributes():
+    import gsmodutils
+    from gsmodutils import GSMProject, StrainDesign
+    from gsmodutils.project.interface import GSMProject as InterfaceProject
+    from gsmodutils.exceptions import ValidationError
+    import jsonschema
+
+    assert GSMProject is InterfaceProject
+    assert StrainDesign is gsmodutils.StrainDesign
+    assert ValidationError is jsonschema.ValidationError
+
+    with pytest.raises(AttributeError):
+        getattr(gsmodutils, 'not_an_attribute')
@@ -3,9 +3,12 @@ Tests for metacyc integration
 
 Requires the use of fake database as real metacyc databases require a license
 """
-from tutils import METACYC_DB_PATH, FakeProjectContext
+from tutils import METACYC_DB_PATH, FakeProjectContext, CleanUpDir
 from gsmodutils.utils import metacyc
+import cobra
 import os
+import pytest
+import shutil
 
 
 def test_db():
@@ -21,3 +24,170 @@ def test_db():
         metacyc.add_pathway(model, reaction_ids=["ALCOHOL-DEHYDROG-RXN"], db_path=METACYC_DB_PATH)
         model = ctx.model
         metacyc.add_pathway(model, enzyme_ids=["EC-1.1.1.1"], db_path=METACYC_DB_PATH)
+
+
+def test_db_cache():
+    """ Parsed database is stored in sqlite and rebuilt when dat files change """
+    with CleanUpDir() as tmp:
+        db_path = os.path.join(tmp.path, 'metacyc_db')
+        shutil.copytree(METACYC_DB_PATH, db_path)
+        cache_path = os.path.join(tmp.path, 'metacyc.sqlite')
+
+        parsed = metacyc.parse_db(db_path)
+        db = metacyc.load_db(db_path, cache_path=cache_path, fields=None)
+        assert os.path.exists(cache_path)
+        for table in ['compounds', 'reactions', 'enzymes']:
+            assert len(db[table]) == len(parsed[table])
+            assert dict(db[table].items()) == parsed[table]
+
+        assert db['reactions']['ALCOHOL-DEHYDROG-RXN'] == parsed['reactions']['ALCOHOL-DEHYDROG-RXN']
+        assert 'NOT-A-REACTION' not in db['reactions']
+        with pytest.raises(KeyError):
+            _ = db['reactions']['NOT-A-REACTION']
+
+        # Changes to the dat files are picked up
+        with open(os.path.join(db_path, 'reactions.dat'), 'a') as datfile:
+            datfile.write('\nUNIQUE-ID - NEW-RXN\nLEFT - ETOH\nRIGHT - ACETALD\n//\n')
+
+        db = metacyc.load_db(db_path, cache_path=cache_path, fields=None)
+        assert db['reactions']['NEW-RXN']['LEFT'] == ['ETOH']
+        assert len(db['compounds']) == len(parsed['compounds'])
+
+        # Only the fields that are used are kept by default, the cache is rebuilt when the fields change
+        projected = metacyc.parse_db(db_path, fields=metacyc.DB_FIELDS)
+        db = metacyc.load_db(db_path, cache_path=cache_path)
+        for table in ['compounds', 'reactions', 'enzymes']:
+            assert dict(db[table].items()) == projected[table]
+
+        model = cobra.Model()
+        result = metacyc.add_pathway(model, reaction_ids=['NEW-RXN'], db_path=db_path, cache_path=cache_path)
+        assert 'NEW-RXN' in result['model'].reactions
+
+
+def test_reaction_indexes():
+    """ EC number and compound lookups use indexes built when the database is parsed """
+    with CleanUpDir() as tmp:
+        cache_path = os.path.join(tmp.path, 'metacyc.sqlite')
+        parsed = metacyc.parse_db(METACYC_DB_PATH)
+        cached = metacyc.load_db(METACYC_DB_PATH, cache_path=cache_path)
+
+        for db in [parsed, cached]:
+            reactions = metacyc.get_enzymes_reactions(['EC-1.1.1.1', '1.1.1.1', 'EC-0.0.0.0'], db)
+            assert reactions == {
+                'EC-1.1.1.1': ['ALCOHOL-DEHYDROG-RXN'],
+                '1.1.1.1': ['ALCOHOL-DEHYDROG-RXN'],
+                'EC-0.0.0.0': [],
+            }
+            assert metacyc.get_enzyme_reactions('1.1.1.1', db) == ['ALCOHOL-DEHYDROG-RXN']
+
+            reactions = metacyc.get_compound_reactions(['ETOH', 'NOT-A-COMPOUND'], db)
+            assert reactions == {'ETOH': ['ALCOHOL-DEHYDROG-RXN'], 'NOT-A-COMPOUND': []}
+
+        assert dict(cached['ec_reactions'].items()) == parsed['ec_reactions']
+        assert dict(cached['compound_reactions'].items()) == parsed['compound_reactions']
+
+        # Databases without indexes are indexed when first used
+        db = dict((table, parsed[table]) for table in ['compounds', 'reactions', 'enzymes'])
+        assert metacyc.get_enzyme_reactions('EC-1.1.1.1', db) == ['ALCOHOL-DEHYDROG-RXN']
+
+
+def test_universal_model():
+    """ Universal model is built in bulk and cached until the dat files change """
+    db = metacyc.parse_db(METACYC_DB_PATH)
+    expected = cobra.Model()
+    for reaction_id in db['reactions']:
+        try:
+            metacyc.add_reaction(expected, reaction_id, db)
+        except KeyError:
+            pass
+
+    model = metacyc.universal_model(db)
+    assert sorted(r.id for r in model.reactions) == sorted(r.id for r in expected.reactions)
+    assert sorted(m.id for m in model.metabolites) == sorted(m.id for m in expected.metabolites)
+    for reaction in expected.reactions:
+        built = model.reactions.get_by_id(reaction.id)
+        assert built.bounds == reaction.bounds
+        assert dict((m.id, c) for m, c in built.metabolites.items()) == \
+            dict((m.id, c) for m, c in reaction.metabolites.items())
+        assert built.annotation == reaction.annotation
+
+    with CleanUpDir() as tmp:
+        db_path = os.path.join(tmp.path, 'metacyc_db')
+        shutil.copytree(METACYC_DB_PATH, db_path)
+        cache_location = os.path.join(tmp.path, 'universal.pickle')
+
+        model = metacyc.build_universal_model(db_path, cache_location=cache_location)
+        assert os.path.exists(cache_location)
+        assert len(model.reactions) == len(expected.reactions)
+
+        cached = metacyc.build_universal_model(db_path, cache_location=cache_location)
+        assert sorted(r.id for r in cached.reactions) == sorted(r.id for r in model.reactions)
+
+        with open(os.path.join(db_path, 'reactions.dat'), 'a') as datfile:
+            datfile.write('\nUNIQUE-ID - NEW-RXN\nLEFT - ETOH\nRIGHT - ACETALD\n//\n')
+
+        model = metacyc.build_universal_model(db_path, cache_location=cache_location)
+        assert 'NEW-RXN' in model.reactions
+
+        # Unreadable caches are rebuilt
+        with open(cache_location, 'w') as cache_file:
+            cache_file.write('{}')
+        model = metacyc.build_universal_model(db_path, cache_location=cache_location)
+        assert 'NEW-RXN' in model.reactions
+
+        # Caches are stored with the database and are not shared between databases
+        model = metacyc.build_universal_model(db_path)
+        assert os.path.exists(os.path.join(db_path, metacyc.UNIVERSAL_CACHE_NAME))
+        assert 'NEW-RXN' in model.reactions
+
+        model = metacyc.build_universal_model(METACYC_DB_PATH, cache_location=cache_location)
+        assert 'NEW-RXN' not in model.reactions
+
+        # Annotations only keep the fields that are used unless all fields are requested
+        annotation = model.reactions.get_by_id('ALCOHOL-DEHYDROG-RXN').annotation['metacyc_data']
+        assert set(annotation) <= set(metacyc.DB_FIELDS['reactions'])
+        model = metacyc.build_universal_model(METACYC_DB_PATH, cache_location=cache_location, fields=None)
+        annotation = model.reactions.get_by_id('ALCOHOL-DEHYDROG-RXN').annotation['metacyc_data']
+        assert annotation == db['reactions']['ALCOHOL-DEHYDROG-RXN']
+
+
+def test_parse_fields():
+    """ dat files are parsed lazily and entries can be limited to the fields that are used """
+    path = os.path.join(METACYC_DB_PATH, 'reactions.dat')
+    unique_fields = metacyc.DB_FILES['reactions'][1]
+    entries = metacyc.iter_metacyc_file(path, unique_fields)
+    assert not isinstance(entries, dict)
+    full = dict(entries)
+    assert full == metacyc.parse_metacyc_file(path, unique_fields)
+
+    fields = metacyc.DB_FIELDS['reactions']
+    projected = metacyc.parse_metacyc_file(path, unique_fields, fields=fields)
+    assert sorted(projected) == sorted(full)
+    for uid, entry in projected.items():
+        assert entry == dict((k, v) for k, v in full[uid].items() if k in fields)
+
+    with CleanUpDir() as tmp:
+        path = os.path.join(tmp.path, 'reactions.dat')
+        with open(path, 'w') as datfile:
+            datfile.write('# comment\nUNIQUE-ID - RXN-1\nLEFT - A\n^COEFFICIENT - 2\n^COMPARTMENT - CCO-IN\n'
+                          'LEFT - B\nRIGHT - C\n^COMPARTMENT - CCO-OUT\n^COEFFICIENT - 3\nCOMMENT - x - y\n/more\n'
+                          '//\n\nLEFT - D\n//\n')
+
+        for fields in [None, ['LEFT', 'RIGHT']]:
+            db = metacyc.parse_metacyc_file(path, unique_fields, fields=fields)
+            assert list(db) == ['RXN-1']
+            assert db['RXN-1']['LEFT'] == ['A', 'A', 'B']
+            assert db['RXN-1']['RIGHT'] == ['C']
+            assert db['RXN-1']['UNIQUE-ID'] == 'RXN-1'
+
+        assert db['RXN-1'] == {'UNIQUE-ID': 'RXN-1', 'LEFT': ['A', 'A', 'B'], 'RIGHT': ['C']}
+        assert metacyc.parse_metacyc_file(path, unique_fields)['RXN-1']['COMMENT'] == ['x']
+
+    parsed = metacyc.parse_db(METACYC_DB_PATH)
+    assert metacyc.parse_db(METACYC_DB_PATH, processes=3) == parsed
+
+    projected = metacyc.parse_db(METACYC_DB_PATH, fields=metacyc.DB_FIELDS)
+    assert projected['ec_reactions'] == parsed['ec_reactions']
+    assert projected['compound_reactions'] == parsed['compound_reactions']
+    model = metacyc.universal_model(projected)
+    assert sorted(r.id for r in model.reactions) == sorted(r.id for r in metacyc.universal_model(parsed).reactions)
@@ -435,3 +435,155 @@ def test_add_essential_pathways():
 
         with pytest.raises(KeyError):
             fp.project.add_essential_pathway("foo4", reactions=reactions, models=["foo"])
+
+
+def test_evaluate_conditions():
+    with FakeProjectContext() as ctx:
+        project = GSMProject(ctx.path)
+        model = project.model
+        project.save_conditions(model, 'glucose_growth')
+
+        model.reactions.EX_xyl__D_e.lower_bound = -8.00
+        model.reactions.EX_glc__D_e.lower_bound = 0.0
+        project.save_conditions(model, 'xylose_growth', carbon_source="EX_xyl__D_e")
+
+        model.reactions.EX_xyl__D_e.lower_bound = 0.0
+        project.save_conditions(model, 'no_growth', observe_growth=False)
+
+        fluxes = ["EX_xyl__D_e", "EX_glc__D_e"]
+        df = project.evaluate_conditions(fluxes=fluxes)
+        assert list(df.index) == ['glucose_growth', 'xylose_growth', 'no_growth']
+        assert df.loc['xylose_growth', 'status'] == 'optimal'
+        assert df.loc['xylose_growth', 'EX_xyl__D_e'] == -8.0
+        assert df.loc['glucose_growth', 'objective_value'] > 0
+        assert df.loc['no_growth', 'status'] == 'infeasible' or df.loc['no_growth', 'objective_value'] == 0
+
+        # Model is not modified by evaluation
+        assert model.reactions.EX_xyl__D_e.lower_bound == 0.0
+
+        df_model = project.evaluate_conditions(model, conditions=['xylose_growth'], fluxes=fluxes)
+        assert df_model.loc['xylose_growth', 'objective_value'] == pytest.approx(
+            df.loc['xylose_growth', 'objective_value'])
+
+        df_parallel = project.evaluate_conditions(conditions=['glucose_growth', 'xylose_growth'], processes=2)
+        assert df_parallel.loc['glucose_growth', 'objective_value'] == pytest.approx(
+            df.loc['glucose_growth', 'objective_value'])
+
+        with pytest.raises(KeyError):
+            project.evaluate_conditions('not_a_design')
+
+        with pytest.raises(KeyError):
+            project.evaluate_conditions(conditions=['not_conditions'])
+
+
+def test_biomass_debug_designs():
+    with FakeProjectContext() as ctx:
+        ctx.add_fake_designs()
+        project = GSMProject(ctx.path)
+        biomass = 'BIOMASS_Ec_iAF1260_core_59p81M'
+
+        model = project.load_model()
+        model.reactions.get_by_id(biomass).add_metabolites({cobra.Metabolite('fake_c', compartment='c'): -1.0})
+        project.save_design(model, 'fake_precursor', 'Unproducible precursor')
+
+        df = project.biomass_debug_designs(biomass, designs=['fake_precursor', 'cbb_cycle'])
+        assert list(df.index) == ['fake_precursor', 'cbb_cycle']
+        assert 'fake_c' in df.columns
+        assert df.loc['fake_precursor', 'fake_c'] == False
+        assert df.loc['cbb_cycle', 'fake_c'] is None
+        assert df.loc['cbb_cycle'].drop('fake_c').all()
+
+        df_parallel = project.biomass_debug_designs(biomass, designs=['fake_precursor', 'cbb_cycle'], processes=4)
+        assert df_parallel.equals(df)
+
+        with pytest.raises(KeyError):
+            project.biomass_debug_designs(biomass, designs=['not_a_design'])
+
+        with pytest.raises(KeyError):
+            project.biomass_debug_designs('not_a_reaction', designs=['cbb_cycle'])
+
+
+def test_design_validate(monkeypatch):
+    """ Designs only check the mass balance of changed reactions """
+    with FakeProjectContext() as ctx:
+        ctx.add_fake_designs()
+        project = GSMProject(ctx.path)
+        design = project.get_design('cbb_cycle')
+
+        result = design.validate()
+        assert len(result['errors']) == 0
+        checked = [w.split("'")[1] for w in result['warnings'] if w.startswith('reaction')]
+        assert set(checked) <= set(r['id'] for r in design.reactions) | \
+            set(r.id for m in design.metabolites for r in design.load().metabolites.get_by_id(m['id']).reactions)
+
+        # Unbalanced reactions added by the design are reported
+        model = project.load_design('cbb_cycle')
+        reaction = cobra.Reaction('UNBALANCED')
+        reaction.add_metabolites({model.metabolites.h2o_c: -1, model.metabolites.h_c: 1})
+        model.add_reactions([reaction])
+        design = project.save_design(model, 'unbalanced', 'unbalanced', parent='cbb_cycle', overwrite=True)
+        result = design.validate()
+        assert "reaction 'UNBALANCED' is not balanced for H, O, charge" in result['warnings']
+        assert result['unbalanced']['UNBALANCED']
+
+        # Project validation checks designs with StrainDesign.validate
+        validated = []
+        original = StrainDesign.validate
+
+        def counted_validate(self, model=None):
+            validated.append(self.id)
+            return original(self, model)
+
+        monkeypatch.setattr(StrainDesign, 'validate', counted_validate)
+        report = project.validate(models=[], designs=['unbalanced'], conditions=[])
+        assert validated == ['unbalanced']
+        assert "reaction 'UNBALANCED' is not balanced for H, O, charge" in report['results'][0]['warnings']
+
+
+def test_validate_project():
+    """ Validation of all models and designs under all conditions """
+    with FakeProjectContext() as ctx:
+        ctx.add_fake_conditions()
+        ctx.add_fake_designs()
+        project = GSMProject(ctx.path)
+
+        report = project.validate(designs=['cbb_cycle'])
+        assert report['errors'] == 0
+        assert [(r['model'], r['design']) for r in report['results']] == [('iAF1260.json', None), (None, 'cbb_cycle')]
+        for result in report['results']:
+            assert [c['conditions'] for c in result['conditions']] == [None, 'xyl_src']
+            assert all(c['status'] == 'optimal' for c in result['conditions'])
+
+        model_result, design_result = report['results']
+        assert 'BIOMASS_Ec_iAF1260_core_59p81M' in model_result['unbalanced']
+        # Designs only check the reactions they change
+        assert set(design_result['unbalanced']) <= set(r['id'] for r in project.get_design('cbb_cycle').reactions)
+
+        # Orphans and growth failures are reported
+        model = project.load_model()
+        model.add_metabolites([cobra.Metabolite('orphan_c', formula='C', compartment='c')])
+        model.reactions.ATPM.bounds = (9.0, 1000.0)
+        design = project.save_design(model, 'no_growth', 'no growth', overwrite=True)
+
+        # Infeasible designs can't be saved, so the maintenance requirement is raised in the design file
+        design_path = os.path.join(project.design_path, 'no_growth.json')
+        with open(design_path) as design_file:
+            design_dict = json.load(design_file)
+        for reaction in design_dict['reactions']:
+            if reaction['id'] == 'ATPM':
+                reaction['lower_bound'] = 1000.0
+        with open(design_path, 'w') as design_file:
+            json.dump(design_dict, design_file)
+
+        report = project.validate(models=[], designs=['no_growth'], processes=2)
+        result = report['results'][0]
+        assert result['orphans']['orphan_c'] == 'unused'
+        assert "model does not grow without conditions (status 'infeasible')" in result['errors']
+        assert "model does not grow with conditions xyl_src (status 'infeasible')" in result['errors']
+        assert report['errors'] == len(result['errors']) == 2
+
+        with pytest.raises(KeyError):
+            project.validate(designs=['not_a_design'])
+
+        with pytest.raises(KeyError):
+            project.validate(conditions=['not_conditions'])
@@ -1,5 +1,6 @@
 from gsmodutils.utils.io import load_model
-from gsmodutils.utils.scrumpy import load_scrumpy_model, ParseError, get_tokens
+from gsmodutils.utils.scrumpy import load_scrumpy_model, ParseError, get_tokens, parse_coefficient, parse_file, \
+    clear_parse_cache
 from tutils import scrumpy_model_path, scrumpy_biomass_path, scrumpy_media_path, CleanUpDir
 import tempfile
 import cobra
@@ -9,6 +10,8 @@ import os
 import string
 import random
 import pytest
+import glob
+import time
 
 
 def test_cli_tool():
@@ -122,3 +125,196 @@ def test_get_tokens():
     assert tuple(tokens) == ("\"FOO\"", "<-", "\"POO")
 
 
+
+
+def _reference_tokens(line):
+    """ Character by character tokenizer that get_tokens must match """
+    line_dt = line.strip().split('#')[0]
+    line_dt = line_dt.replace("->", "-> ").replace("<-", "<- ").replace("<>", "<> ")
+
+    tokens = []
+    quoted = False
+    tk_str = ""
+    for ch in line_dt:
+        if ch in ['"', "'"]:
+            if not quoted:
+                quoted = True
+                if len(tk_str):
+                    tokens.append(tk_str)
+                tk_str = ch
+            elif tk_str[0] == ch:
+                tokens.append(tk_str + ch)
+                tk_str = ""
+                quoted = False
+            else:
+                tk_str += ch
+        elif ch in ["(", ")", ":", ",", " "] and not quoted:
+            if len(tk_str):
+                tokens.append(tk_str)
+            tk_str = ""
+            if ch != " ":
+                tokens.append(ch)
+        else:
+            tk_str += ch
+
+    if len(tk_str):
+        tokens.append(tk_str)
+    return tokens
+
+
+def _scrumpy_lines():
+    lines = []
+    for path in glob.glob(os.path.join(os.path.dirname(scrumpy_model_path), '*.spy')):
+        with open(path) as spy_file:
+            lines += spy_file.readlines()
+    return lines
+
+
+def test_tokens_equivalence():
+    """ Tokens match the character by character tokenizer on model files and random lines """
+    for line in _scrumpy_lines():
+        assert get_tokens(line) == _reference_tokens(line)
+
+    rand = random.Random(42)
+    characters = 'ab1/ "\'():,<>-#\t~+'
+    for _ in range(20000):
+        line = ''.join(rand.choice(characters) for _ in range(rand.randint(0, 16)))
+        assert get_tokens(line) == _reference_tokens(line), line
+
+
+def test_parse_coefficient():
+    assert parse_coefficient('2') == 2.0
+    assert parse_coefficient('1e-3') == 1e-3
+    assert parse_coefficient('1/2') == 0.5
+    assert parse_coefficient('2/3') == 2 / 3
+    assert parse_coefficient('PROTON') is None
+    assert parse_coefficient('"1/2"') is None
+
+    for token in ['1/0', '1/', '/', '1/2x']:
+        with pytest.raises(ParseError):
+            parse_coefficient(token)
+
+
+def test_tokens_benchmark():
+    """ Tokenizing the test model files should be faster than the character by character tokenizer """
+    lines = _scrumpy_lines()
+
+    start = time.time()
+    for _ in range(5):
+        for line in lines:
+            _reference_tokens(line)
+    reference_time = time.time() - start
+
+    start = time.time()
+    for _ in range(5):
+        for line in lines:
+            get_tokens(line)
+    tokens_time = time.time() - start
+
+    assert tokens_time < reference_time
+
+    reactions, metabolites, externals = parse_file(os.path.basename(scrumpy_model_path),
+                                                   rel_path=os.path.dirname(scrumpy_model_path))
+    assert len(reactions) == 1162
+
+
+def test_load_large_model():
+    """ Models are built in bulk, duplicate reactions keep their first definition """
+    lines = ['External("x_A0")']
+    for i in range(3000):
+        lines.append('R{0}:\n    "M{0}" + 1/2 x_B{1} -> 2 "M{2}"\n    ~'.format(i, i % 50, i + 1))
+    # Redefined reaction
+    lines.append('R5:\n    "M1" <> "M2"\n    ~')
+    spy_string = '\n'.join(lines)
+
+    model = load_scrumpy_model(spy_string, objective_reactions=[])
+    # Reactions, the x_A0 transporter and an exchange for each of the 51 x_ metabolites
+    assert len(model.reactions) == 3000 + 1 + 51
+    assert len(model.metabolites) == 3001 + 51
+    assert model.reactions.R5.bounds == (0.0, 1000.0)
+    assert model.reactions.R5.metabolites == {
+        model.metabolites.M5: -1.0,
+        model.metabolites.x_B5: -0.5,
+        model.metabolites.M6: 2.0,
+    }
+    assert model.reactions.EX_B1.metabolites == {model.metabolites.x_B1: -1.0}
+    assert model.reactions.x_A0_tx.metabolites == {model.metabolites.x_A0: -1.0}
+    assert all(m.model is model for r in model.reactions for m in r.metabolites)
+
+
+def test_include_cache():
+    """ Included files are cached in memory and on disk until they change """
+    core = """
+External(x_A)
+R1:
+    x_A -> B
+    ~
+"""
+    pathway = """
+Include(core.spy)
+R2:
+    B -> 1/2 C
+    ~
+"""
+    model_1 = """
+Include(core.spy, pathway.spy)
+R3:
+    C -> D
+    ~
+"""
+    with CleanUpDir() as tmp:
+        for name, content in [('core.spy', core), ('pathway.spy', pathway), ('model_1.spy', model_1)]:
+            with open(os.path.join(tmp.path, name), 'w') as spy_file:
+                spy_file.write(content)
+
+        cache_dir = os.path.join(tmp.path, 'cache')
+        clear_parse_cache()
+        reactions, metabolites, externals = parse_file('model_1.spy', rel_path=tmp.path, cache_dir=cache_dir)
+        # Included reactions are in the position of the Include statement, core.spy is included twice
+        assert [r['id'] for r in reactions] == ['x_A_tx', 'R1', 'x_A_tx', 'R1', 'R2', 'R3']
+        assert reactions[4]['source'] == 'pathway.spy'
+        assert externals == ['x_A', 'x_A']
+        assert len(os.listdir(cache_dir)) == 3
+
+        # Same results from memory, disk and when parsing included files concurrently
+        assert parse_file('model_1.spy', rel_path=tmp.path) == (reactions, metabolites, externals)
+        clear_parse_cache()
+        assert parse_file('model_1.spy', rel_path=tmp.path, cache_dir=cache_dir) == (reactions, metabolites, externals)
+        clear_parse_cache()
+        assert parse_file('model_1.spy', rel_path=tmp.path, processes=2) == (reactions, metabolites, externals)
+
+        # Changes to the returned reactions do not change the cache
+        reactions[0]['metabolites']['x_B'] = 1.0
+        assert 'x_B' not in parse_file('model_1.spy', rel_path=tmp.path)[0][0]['metabolites']
+
+        # Changing a nested include is picked up from both caches
+        with open(os.path.join(tmp.path, 'core.spy'), 'w') as spy_file:
+            spy_file.write(core.replace('x_A -> B', 'x_A -> 2 B'))
+
+        reactions, _, _ = parse_file('model_1.spy', rel_path=tmp.path, cache_dir=cache_dir)
+        assert reactions[1]['metabolites']['B'] == 2.0
+        clear_parse_cache()
+        reactions, _, _ = parse_file('model_1.spy', rel_path=tmp.path, cache_dir=cache_dir)
+        assert reactions[3]['metabolites']['B'] == 2.0
+
+        model = load_scrumpy_model(os.path.join(tmp.path, 'model_1.spy'), cache_dir=cache_dir, objective_reactions=[])
+        assert model.reactions.R2.metabolites[model.metabolites.C] == 0.5
+
+        # Cycles through cached files are still found
+        with open(os.path.join(tmp.path, 'core.spy'), 'w') as spy_file:
+            spy_file.write(core + "Include(model_1.spy)")
+
+        with pytest.raises(ParseError):
+            parse_file('model_1.spy', rel_path=tmp.path, cache_dir=cache_dir)
+
+        with open(os.path.join(tmp.path, 'core.spy'), 'w') as spy_file:
+            spy_file.write(core)
+        with open(os.path.join(tmp.path, 'model_2.spy'), 'w') as spy_file:
+            spy_file.write("Include(pathway.spy)")
+        parse_file('model_2.spy', rel_path=tmp.path, cache_dir=cache_dir)
+
+        with open(os.path.join(tmp.path, 'pathway.spy'), 'w') as spy_file:
+            spy_file.write(pathway + "Include(model_2.spy)")
+
+        with pytest.raises(ParseError):
+            parse_file('model_2.spy', rel_path=tmp.path, cache_dir=cache_dir)
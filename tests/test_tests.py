@@ -32,6 +32,16 @@ def test_json_tests():
                 ),
                 required_reactions=["DHQS"],
                 description='TEST JSON TEST'
+            ),
+            # required_reactions is optional
+            test_2=dict(
+                models=[],
+                conditions=[],
+                designs=[],
+                reaction_fluxes=dict(
+                    BIOMASS_Ec_iAF1260_core_59p81M=[0.72, 0.74]
+                ),
+                description='TEST JSON TEST'
             )
         )
         
@@ -72,6 +82,9 @@ def test_json_tests():
         tester.run_all()
         assert len(tester.load_errors) == 1
         assert len(tester.invalid_tests) == 1
+        test = tester.get_test('test_x.json::test_2::iAF1260.json')
+        assert test.log.is_success
+        assert test.references()['reactions'] == {'BIOMASS_Ec_iAF1260_core_59p81M'}
 
         runner = CliRunner()
         result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--verbose'])
@@ -329,3 +342,868 @@ def test_func(model, project, log):
         tests2 = model2.run_tests(display_progress=False)
         assert len(tests2) == 1
         assert tests2["model::e_coli_core.json"].log.is_success
+
+
+def test_watch():
+    """ Watch mode only reruns tests affected by changed files """
+    from gsmodutils.test import watch
+    with FakeProjectContext() as fp:
+        fp.add_fake_conditions()
+        project = GSMProject(fp.path)
+        jtest = dict(
+            test_1=dict(
+                models=[],
+                conditions=[],
+                designs=[],
+                reaction_fluxes=dict(
+                    BIOMASS_Ec_iAF1260_core_59p81M=[0.72, 0.74]
+                ),
+                required_reactions=[],
+                description='TEST JSON TEST'
+            )
+        )
+        tpath = os.path.join(project.tests_dir, 'test_x.json')
+        with open(tpath, "w+") as ff:
+            json.dump(jtest, ff)
+
+        watcher = watch.TestWatcher(fp.path)
+        report = watcher.run_all()
+        assert len(report.ran) == report.total
+        assert len(report.failures) == 0
+        assert watcher.poll() is None
+
+        # Changing the json test file only reruns its tests and makes it fail
+        jtest['test_1']['reaction_fluxes']['BIOMASS_Ec_iAF1260_core_59p81M'] = [10.0, 20.0]
+        with open(tpath, "w+") as ff:
+            json.dump(jtest, ff, indent=4)
+
+        tester = watcher.tester
+        default_test = tester.get_test('model::iAF1260.json')
+        report = watcher.poll()
+        # Only the changed test file is loaded again
+        assert watcher.tester is tester
+        assert tester.get_test('model::iAF1260.json') is default_test
+        assert report.changed == [os.path.join(project.config.tests_dir, 'test_x.json')]
+        assert report.ran == ['test_x.json::test_1::iAF1260.json']
+        assert 'test_x.json::test_1::iAF1260.json' in report.failures
+        assert report.total_failing == 1
+
+        # Saving new conditions only runs the default test for the new conditions
+        mdl = project.load_conditions('xyl_src')
+        mdl.reactions.EX_o2_e.lower_bound = -10.0
+        project.save_conditions(mdl, 'low_o2')
+        report = watcher.poll()
+        assert report.ran == ['model::iAF1260.json::conditions::low_o2']
+
+        with open(tpath, "w+") as ff:
+            json.dump(dict(), ff)
+
+        report = watcher.poll()
+        assert report.total_failing == 0
+        assert not any('test_x.json' in line for line in report.lines())
+
+        # Changing a model reruns everything that depends on it
+        with open(os.path.join(fp.path, project.config.default_model), 'a') as ff:
+            ff.write(' ')
+        report = watcher.poll()
+        assert 'model::iAF1260.json::conditions::xyl_src' in report.ran
+        # Logs of rerun tests only hold the latest results
+        assert len(watcher.tester.get_test('model::iAF1260.json').log.success) == 1
+
+        gsmodutils.cli._watch_tests(fp.path, False, 0.0, max_cycles=1)
+
+
+def test_affected_by():
+    """ Tests that solve the model are affected by any change, structural tests only by objects they reference """
+    from gsmodutils.model_diff import model_diff
+    from gsmodutils.test.impact import record_accesses, load_index, index_path
+
+    code_str = """
+def test_pgi(model, project, log):
+    log.assertion(model.reactions.PGI.upper_bound > 0, "PGI forward", "PGI reversed")
+
+
+def test_atp(model, project, log):
+    log.assertion('ATPM' in model.reactions, "ATPM present", "ATPM missing")
+
+
+def test_growth(model, project, log):
+    log.assertion(model.slim_optimize() > 0, "Model grows", "Model does not grow")
+"""
+    jtest = dict(
+        test_biomass=dict(
+            models=[],
+            conditions=[],
+            designs=[],
+            reaction_fluxes=dict(
+                BIOMASS_Ec_iAF1260_core_59p81M=[0.72, 0.74]
+            ),
+            required_reactions=[],
+            description='TEST JSON TEST'
+        )
+    )
+
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        with open(os.path.join(project.tests_dir, 'test_code.py'), 'w+') as testf:
+            testf.write(code_str)
+
+        with open(os.path.join(project.tests_dir, 'test_x.json'), 'w+') as testf:
+            json.dump(jtest, testf)
+
+        model = project.load_model()
+        with record_accesses(model) as accessed:
+            model.reactions.get_by_id('PGI')
+            assert 'ATPM' in model.reactions
+            model.metabolites[0]
+            for _ in model.genes:
+                pass
+        assert accessed == dict(reactions={'PGI', 'ATPM'}, metabolites=set(), genes=set(), solves=False)
+        with record_accesses(model) as accessed:
+            model.optimize()
+        assert accessed['solves']
+        assert 'optimize' not in model.solver.__dict__
+        assert type(model.reactions) is not type(accessed)
+        assert not hasattr(model.reactions, '_accessed')
+
+        # python tests that have never run are always affected
+        model.reactions.PGI.upper_bound = 0
+        mdiff = model_diff(project.load_model(), model)
+        tester = project.project_tester()
+        tester.collect_tests()
+        affected = tester.affected_by(mdiff)
+        assert 'test_code.py::test_atp' in affected
+        # Flux tests solve the model, so any change to bounds can affect them
+        assert 'test_x.json::test_biomass::iAF1260.json' in affected
+
+        runner = CliRunner()
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default'])
+        assert result.exit_code == 0
+        # The index is only saved when asked for
+        assert not os.path.exists(index_path(project))
+
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default', '--save_index'])
+        assert result.exit_code == 0
+        index = load_index(project)
+        assert index['test_code.py::test_pgi']['references']['reactions'] == ['PGI']
+        assert index['test_x.json::test_biomass::iAF1260.json']['resources']['model'] == ['iAF1260.json']
+
+        tester = project.project_tester()
+        tester.collect_tests()
+        affected = tester.affected_by(mdiff)
+        assert index['test_code.py::test_growth']['references']['solves']
+        assert not index['test_code.py::test_atp']['references']['solves']
+
+        tester = project.project_tester()
+        tester.collect_tests()
+        affected = tester.affected_by(mdiff)
+        assert 'test_code.py::test_pgi' in affected
+        assert 'test_code.py::test_atp' not in affected
+        assert 'test_code.py::test_growth' in affected
+        assert 'test_x.json::test_biomass::iAF1260.json' in affected
+        assert 'model::iAF1260.json' in affected
+
+        # Changes to the objective only affect tests that solve the model
+        model = project.load_model()
+        model.objective = 'ATPM'
+        objective_diff = model_diff(project.load_model(), model)
+        assert sorted(r['id'] for r in objective_diff['reactions']) == ['ATPM', 'BIOMASS_Ec_iAF1260_core_59p81M']
+        affected = tester.affected_by(objective_diff)
+        assert 'test_code.py::test_growth' in affected
+        assert 'test_x.json::test_biomass::iAF1260.json' in affected
+        assert 'test_code.py::test_pgi' not in affected
+
+        diff_path = os.path.join(fp.path, 'diff.json')
+        with open(diff_path, 'w') as outfile:
+            json.dump(mdiff, outfile)
+
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default',
+                                                     '--affected-by', diff_path])
+        assert result.exit_code == 0
+        assert '3 tests affected' in result.output
+        assert 'test_pgi' in result.output
+        assert 'test_atp' not in result.output
+
+
+def test_shard_partition():
+    from gsmodutils.test.shard import partition, select_shard, parse_shard, log_durations, merge_logs
+
+    ids = ['t{}'.format(i) for i in range(7)]
+    shards = partition(reversed(ids), 3)
+    assert shards == partition(ids, 3)
+    assert sorted(sum(shards, [])) == ids
+    assert [len(s) for s in shards] == [3, 2, 2]
+
+    # Longest processing time first balancing
+    durations = dict(t0=10.0, t1=6.0, t2=5.0, t3=4.0, t4=1.0)
+    shards = partition(['t0', 't1', 't2', 't3', 't4'], 2, durations)
+    assert shards == [['t0', 't3'], ['t1', 't2', 't4']]
+    assert select_shard(['t0', 't1', 't2', 't3', 't4'], '2/2', durations) == ['t1', 't2', 't4']
+
+    assert parse_shard('1/4') == (1, 4)
+    for spec in ['0/2', '3/2', 'a/b', '1']:
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+    log_a = dict(f=dict(id='f', children=dict(a=dict(id='a', children={}, error=[], success=[['ok', '']],
+                                                       is_success=True, run_time=1, duration=2.0)),
+                        error=[], success=[], is_success=True, run_time=1, duration=None))
+    log_b = dict(f=dict(id='f', children=dict(b=dict(id='b', children={}, error=[['bad', '']], success=[],
+                                                       is_success=False, run_time=2, duration=3.0)),
+                        error=[], success=[], is_success=True, run_time=2, duration=None))
+    merged = merge_logs([log_a, log_b])
+    assert set(merged['f']['children']) == {'a', 'b'}
+    assert not merged['f']['is_success']
+    assert log_durations(merged) == dict(a=2.0, b=3.0)
+
+    record = ResultRecord.from_dict(merged['f'])
+    assert record.log_count == (2, 1)
+    assert record.children['a'].duration == 2.0
+
+
+def test_shard_cli():
+    code_str = """
+def test_a(model, project, log):
+    log.assertion(True, "a", "a")
+
+
+def test_b(model, project, log):
+    log.assertion(False, "b", "b failed")
+
+
+def test_c(model, project, log):
+    log.assertion(True, "c", "c")
+"""
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        with open(os.path.join(project.tests_dir, 'test_code.py'), 'w+') as testf:
+            testf.write(code_str)
+
+        runner = CliRunner()
+        log_paths = []
+        for i in range(1, 3):
+            lpath = os.path.join(fp.path, 'shard_{}.json'.format(i))
+            result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default',
+                                                         '--shard', '{}/2'.format(i), '--log_path', lpath])
+            assert result.exit_code == 0
+            log_paths.append(lpath)
+
+        durations_log = os.path.join(fp.path, 'merged.json')
+        result = runner.invoke(gsmodutils.cli.merge_logs, log_paths + ['--output', durations_log])
+        assert result.exit_code == -1
+        assert 'Ran 3 test assertions with a total of 1 errors' in result.output
+
+        stream_paths = []
+        for i in range(1, 3):
+            lpath = os.path.join(fp.path, 'shard_{}.ndjson'.format(i))
+            result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default',
+                                                         '--shard', '{}/2'.format(i), '--log_path', lpath,
+                                                         '--log_format', 'ndjson'])
+            assert result.exit_code == 0
+            stream_paths.append(lpath)
+
+        result = runner.invoke(gsmodutils.cli.merge_logs, stream_paths)
+        assert result.exit_code == -1
+        assert 'Ran 3 test assertions with a total of 1 errors' in result.output
+
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default', '--shard', '1/2',
+                                                     '--durations_log', durations_log])
+        assert result.exit_code == 0
+        assert 'Running shard 1/2' in result.output
+
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--shard', '3/2'])
+        assert result.exit_code == -1
+
+
+def test_lazy_collection():
+    """ Selecting a test only loads the test file it belongs to """
+    code_a = """
+from gsmodutils.test.utils import ModelTestSelector
+
+
+def test_func(model, project, log):
+    log.assertion(True, "Works", "Does not work")
+
+
+@ModelTestSelector(models="*", designs="*")
+def test_selector(model, project, log):
+    log.assertion(True, "Works", "Does not work")
+"""
+    code_b = """
+def test_other(model, project, log):
+    log.assertion(True, "Works", "Does not work")
+"""
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        with open(os.path.join(project.tests_dir, 'test_a.py'), 'w+') as testf:
+            testf.write(code_a)
+        with open(os.path.join(project.tests_dir, 'test_b.py'), 'w+') as testf:
+            testf.write(code_b)
+
+        tester = project.project_tester()
+        assert tester.has_test('test_a.py::test_func')
+        assert not tester.has_test('test_a.py::test_not_there')
+        assert not tester.has_test('test_c.py::test_func')
+        log = tester.run_by_id('test_a.py::test_func')
+        assert log.is_success
+
+        assert set(tester.log.keys()) == {'test_a.py'}
+        # Wildcards of unselected tests are not expanded
+        assert tester.get_test('test_a.py::test_selector')._children is None
+
+        tid = 'test_a.py::test_selector::{}'.format(project.config.default_model)
+        assert tester.has_test(tid)
+        assert tester.has_test('model::{}'.format(project.config.default_model))
+        assert set(tester.log.keys()) == {'test_a.py', 'default_tests'}
+        assert len(tester.default_tests)
+
+        tester.collect_tests()
+        assert 'test_b.py::test_other' in tester.test_ids
+        assert tester.test_ids.count(tid) == 1
+
+        runner = CliRunner()
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--test_id', 'test_b.py::test_other'])
+        assert result.exit_code == 0
+        assert 'Collecting tests' not in result.output
+
+
+def test_isolated_tests():
+    """ Hanging and crashing tests are recorded as errors without stopping the run """
+    code_str = """
+import os
+
+
+def test_ok(model, project, log):
+    log.assertion(True, "Works", "Does not work")
+
+
+def test_hang(model, project, log):
+    while True:
+        pass
+
+
+def test_crash(model, project, log):
+    os._exit(3)
+
+
+def test_memory(model, project, log):
+    data = bytearray(16 * 1024 ** 3)
+    log.assertion(len(data), "Allocated", "Not allocated")
+"""
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        with open(os.path.join(project.tests_dir, 'test_code.py'), 'w+') as testf:
+            testf.write(code_str)
+
+        tester = project.project_tester()
+        tester.isolated_tests(skip_default=True, processes=2, timeout=20, memory_limit=8 * 1024)
+
+        log = tester.log['test_code.py']
+        assert log.children['test_code.py::test_ok'].is_success
+        assert log.children['test_code.py::test_ok'].duration is not None
+        assert log.children['test_code.py::test_hang'].error[0][1]['desc'] == '.timeout'
+        assert log.children['test_code.py::test_crash'].error[0][1]['desc'] == '.worker_crash'
+        assert 'exit code 3' in log.children['test_code.py::test_crash'].error[0][0]
+        assert not log.children['test_code.py::test_memory'].is_success
+
+        runner = CliRunner()
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default', '--timeout', '20',
+                                                     '--processes', '2'])
+        assert result.exit_code == 0
+        assert 'Test timed out after 20.0 seconds' in result.output
+        assert 'Test worker crashed' in result.output
+
+
+def test_isolated_tests_polling(monkeypatch):
+    """ Workers are polled when multiprocessing.connection.wait is not available (python 2.7) """
+    from gsmodutils.test import isolation
+    code_str = """
+import os
+
+
+def test_ok(model, project, log):
+    log.assertion(True, "Works", "Does not work")
+
+
+def test_hang(model, project, log):
+    while True:
+        pass
+
+
+def test_crash(model, project, log):
+    os._exit(3)
+"""
+    monkeypatch.setattr(isolation, 'wait', None)
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        with open(os.path.join(project.tests_dir, 'test_code.py'), 'w+') as testf:
+            testf.write(code_str)
+
+        tester = project.project_tester()
+        tester.isolated_tests(skip_default=True, processes=2, timeout=10)
+
+        log = tester.log['test_code.py']
+        assert log.children['test_code.py::test_ok'].is_success
+        assert log.children['test_code.py::test_hang'].error[0][1]['desc'] == '.timeout'
+        assert log.children['test_code.py::test_crash'].error[0][1]['desc'] == '.worker_crash'
+
+
+def test_stream_log():
+    """ Test results are written as json lines and can be rebuilt in to the nested log format """
+    from gsmodutils.test.report import nested_from_stream, read_log
+    code_str = """
+from gsmodutils.test.utils import ModelTestSelector
+
+
+def test_a(model, project, log):
+    log.assertion(True, "a", "a")
+
+
+@ModelTestSelector(conditions=["xyl_src"])
+def test_b(model, project, log):
+    log.assertion(False, "b", "b failed")
+"""
+    with FakeProjectContext() as fp:
+        fp.add_fake_conditions()
+        project = GSMProject(fp.path)
+        with open(os.path.join(project.tests_dir, 'test_code.py'), 'w+') as testf:
+            testf.write(code_str)
+
+        lpath = os.path.join(fp.path, 'log.ndjson')
+        runner = CliRunner()
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default',
+                                                     '--log_path', lpath, '--log_format', 'ndjson'])
+        assert result.exit_code == 0
+
+        with open(lpath) as lf:
+            lines = lf.readlines()
+        assert len(lines) == 2
+        entries = [json.loads(line) for line in lines]
+        tid = 'test_code.py::test_b::iAF1260.json::xyl_src'
+        entry = [e for e in entries if e['id'] == tid][0]
+        assert entry['status'] == 'failed'
+        assert entry['path'] == ['test_code.py', 'test_code.py::test_b', tid]
+        assert entry['error'][0][0] == 'b failed'
+        assert entry['duration'] is not None
+
+        # A partially written line is ignored
+        nested = nested_from_stream(lines + ['{"id": "test_code.py::test'])
+        log = nested['test_code.py']
+        assert not log['is_success']
+        assert log['children']['test_code.py::test_a']['is_success']
+        assert log['children']['test_code.py::test_b']['children'][tid]['error'][0][0] == 'b failed'
+        assert read_log(lpath) == nested_from_stream(lines)
+
+        nested_path = os.path.join(fp.path, 'nested.json')
+        result = runner.invoke(gsmodutils.cli.cli, ['merge-logs', lpath, '--output', nested_path])
+        assert result.exit_code == -1
+        assert 'Ran 2 test assertions with a total of 1 errors' in result.output
+        with open(nested_path) as lf:
+            assert json.load(lf) == nested
+
+        rr = ResultRecord('a')
+        child = rr.create_child('b')
+        child.create_child('c', param_child=True)
+        assert rr.to_dict()['children']['b']['children']['c']['id'] == 'c'
+
+
+def test_result_record_aggregates():
+    """ Success and assertion counts are kept up to date as entries are added and removed """
+    import pickle
+    rr = ResultRecord('a')
+    child = rr.create_child('b')
+    leaf = child.create_child('c', param_child=True)
+    leaf.assertion(True, 'ok', 'fail')
+    assert rr.is_success
+    assert rr.log_count == (1, 0)
+
+    leaf.assertion(False, 'ok', 'fail', desc='.check')
+    assert not rr.is_success and not child.is_success
+    assert rr.log_count == (2, 1)
+    assert leaf.error[0][1]['desc'] == '.check'
+
+    leaf.error.pop()
+    assert rr.is_success
+    assert rr.log_count == (1, 0)
+
+    leaf.error = [('one', '.x'), ('two', '.x')]
+    child.add_error('loading')
+    assert rr.log_count == (4, 3)
+    del leaf.error[:]
+    assert not rr.is_success
+    child.error.remove(child.error[0])
+    assert rr.is_success
+    assert rr.log_count == (1, 0)
+
+    leaf.add_error('failed', '.check')
+    copy = ResultRecord.from_dict(json.loads(json.dumps(rr.to_dict())))
+    assert copy.log_count == rr.log_count
+    assert not copy.is_success
+    assert copy.children['b'].children['c'].error == leaf.error
+    assert pickle.loads(pickle.dumps(leaf.error)) == leaf.error
+
+    # Replacing or resetting children removes their counts, e.g. when a test is run again
+    failed = rr.create_child('d')
+    failed.add_error('failed')
+    rr.children['b'].reset()
+    assert rr.log_count == (1, 1)
+    passed = rr.create_child('d')
+    passed.assertion(True, 'ok', 'fail')
+    assert rr.is_success
+    assert rr.log_count == (1, 0)
+    assert failed.parent is None
+    ResultRecord.from_dict(dict(id='d', error=[('failed', '')]), parent=rr)
+    assert not rr.is_success
+    assert rr.log_count == (1, 1)
+
+
+def test_result_record_benchmark():
+    """ Large result trees are built and reported on in linear time and bounded memory """
+    import time
+    tracemalloc = pytest.importorskip('tracemalloc')
+
+    n_files, n_leaves = 100, 1000
+    tracemalloc.start()
+    try:
+        start = time.time()
+        root = ResultRecord('root')
+        for i in range(n_files):
+            tf = root.create_child('test_{}.py'.format(i))
+            for j in range(n_leaves):
+                leaf = tf.create_child('test_{}.py::{}'.format(i, j), param_child=True)
+                leaf.assertion(j % 100 != 99, 'passed', 'failed')
+                # Progress reporting checks the status of the whole tree after every test
+                assert root.is_success == (i == 0 and j < 99)
+                assert root.log_count[0] == i * n_leaves + j + 1
+        memory = tracemalloc.get_traced_memory()[0]
+
+        # Reporting checks the status of every node
+        statuses = [tf.is_success for tf in root.children.values()]
+        statuses += [leaf.is_success for tf in root.children.values() for leaf in tf.children.values()]
+        log_dict = root.to_dict()
+        elapsed = time.time() - start
+    finally:
+        tracemalloc.stop()
+
+    assert root.log_count == (n_files * n_leaves, n_files * n_leaves // 100)
+    assert statuses.count(False) == n_files * 11
+    assert not log_dict['is_success']
+    assert memory / (n_files * n_leaves) < 1024
+    assert elapsed < 60
+
+
+def test_json_flux_ranges():
+    """ Many flux ranges are checked against one query of the solver with the same messages as before """
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        model = project.load_model()
+        solution = model.optimize()
+
+        flux_ranges = dict()
+        expected_errors, expected_success = [], []
+        for i, reaction in enumerate(model.reactions):
+            flux = solution.fluxes[reaction.id]
+            if i % 3:
+                lb, ub = flux - 1.0, flux + 1.0
+            else:
+                lb, ub = flux + 1.0, flux + 2.0
+            flux_ranges[reaction.id] = [lb, ub]
+
+        flux_ranges['NOT_A_REACTION'] = [0, 1]
+        jtest = dict(
+            test_1=dict(
+                models=[],
+                conditions=[],
+                designs=[],
+                reaction_fluxes=flux_ranges,
+                required_reactions=['NOT_REQUIRED', 'PGI'],
+                description='Many flux ranges'
+            )
+        )
+        with open(os.path.join(project.tests_dir, 'test_ranges.json'), 'w+') as ff:
+            json.dump(jtest, ff)
+
+        # Messages in the order the entries are listed, as a test reading each reaction flux would give
+        with open(os.path.join(project.tests_dir, 'test_ranges.json')) as ff:
+            entry = json.load(ff)['test_1']
+
+        expected_errors.append('required reaction NOT_REQUIRED not found in model')
+        if solution.fluxes['PGI'] == 0:
+            expected_success.append('required reaction PGI not active')
+        else:
+            expected_errors.append('required reaction PGI present at steady state')
+
+        for rid, (lb, ub) in entry['reaction_fluxes'].items():
+            if rid not in model.reactions:
+                expected_errors.append('required reaction {} not found in model'.format(rid))
+            elif solution.fluxes[rid] < lb or solution.fluxes[rid] > ub:
+                expected_errors.append('reaction {} outside of flux bounds {}, {}'.format(rid, lb, ub))
+            else:
+                expected_success.append('reaction {} inside flux bounds {}, {}'.format(rid, lb, ub))
+
+        tester = project.project_tester()
+        log = tester.run_by_id('test_ranges.json::test_1::iAF1260.json')
+        assert [msg for msg, _ in log.error] == expected_errors
+        assert [msg for msg, _ in log.success] == expected_success
+        assert len(log.success) > len(model.reactions) // 2
+
+
+def test_dataset_tests():
+    """ Rows of an experimental dataset are each compared against the model's predictions """
+    biomass = 'BIOMASS_Ec_iAF1260_core_59p81M'
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        with open(os.path.join(project.tests_dir, 'growth.csv'), 'w+') as dataset:
+            dataset.write('id,lb:EX_glc__D_e,ub:EX_glc__D_e,flux:{},notes\n'.format(biomass))
+            dataset.write('glc_10,-10,,0.8856,\n')
+            dataset.write('glc_5,-5,,0.4478,\n')
+            dataset.write('wrong,-5,,0.9,expected failure\n')
+            dataset.write('unmeasured,-5,,,\n')
+            dataset.write('invalid,5,1,0.1,\n')
+
+        jtest = dict(
+            growth=dict(
+                type='dataset',
+                dataset='growth.csv',
+                description='Growth on glucose',
+            ),
+            growth_parallel=dict(
+                type='dataset',
+                dataset='growth.csv',
+                processes=2,
+                tolerance=0.0,
+                relative_tolerance=0.01,
+                description='Growth on glucose',
+            ),
+            missing=dict(
+                type='dataset',
+                dataset='not_a_file.tsv',
+                description='Dataset does not exist',
+            ),
+        )
+        with open(os.path.join(project.tests_dir, 'test_data.json'), 'w+') as ff:
+            json.dump(jtest, ff)
+
+        with open(os.path.join(project.tests_dir, 'test_unknown.json'), 'w+') as ff:
+            json.dump(dict(unknown=dict(type='not_a_test_type', description='Test type does not exist')), ff)
+
+        tester = project.project_tester()
+        tester.collect_tests()
+        assert len(tester.invalid_tests) == 1
+        assert tester.invalid_tests[0][1] == 'unknown'
+
+        for entry in ['growth', 'growth_parallel']:
+            tid = 'test_data.json::{}::iAF1260.json'.format(entry)
+            log = tester.run_by_id(tid)
+            rows = log.children
+            assert sorted(rows) == sorted('{}::{}'.format(tid, r) for r in ['glc_10', 'glc_5', 'wrong', 'unmeasured',
+                                                                            'invalid'])
+            assert rows[tid + '::glc_10'].is_success
+            assert rows[tid + '::glc_5'].is_success
+            assert rows[tid + '::unmeasured'].is_success
+            assert rows[tid + '::unmeasured'].log_count == (0, 0)
+            assert not rows[tid + '::wrong'].is_success
+            assert 'differs from measured 0.9' in rows[tid + '::wrong'].error[0][0]
+            assert rows[tid + '::invalid'].error[0][1]['desc'] == '.invalid_bounds'
+            assert log.log_count == (4, 2)
+
+        log = tester.run_by_id('test_data.json::missing::iAF1260.json')
+        assert 'Error loading dataset not_a_file.tsv' in log.error[0][0]
+
+        # Rows are kept when the test runs in a worker process
+        tid = 'test_data.json::growth::iAF1260.json'
+        tester = project.project_tester()
+        tester.isolated_tests(test_ids=[tid])
+        log = tester.get_test(tid).log
+        assert not log.is_success
+        assert log.log_count == (4, 2)
+        assert not log.children[tid + '::wrong'].is_success
+
+        # Rows are kept when the test is streamed and rebuilt
+        from gsmodutils.test.report import nested_from_stream, stream_entry
+        nested = nested_from_stream([json.dumps(stream_entry(log))])
+        assert not nested['test_data.json']['is_success']
+        rebuilt = ResultRecord.from_dict(nested['test_data.json']['children']['test_data.json::growth'])
+        assert not rebuilt.is_success
+        assert rebuilt.log_count == (4, 2)
+
+        # Isolated runs streamed to an ndjson log keep the failing rows
+        from gsmodutils.test.report import read_log
+        lpath = os.path.join(fp.path, 'log.ndjson')
+        runner = CliRunner()
+        result = runner.invoke(gsmodutils.cli.test, ['--project_path', fp.path, '--skip_default', '--isolate',
+                                                     '--log_path', lpath, '--log_format', 'ndjson'])
+        assert result.exit_code == 0
+        assert 'differs from measured 0.9' in result.output
+        entry = read_log(lpath)['test_data.json']['children']['test_data.json::growth']['children'][tid]
+        assert not entry['is_success']
+        assert not entry['children'][tid + '::wrong']['is_success']
+        assert ResultRecord.from_dict(entry).log_count == (4, 2)
+
+        test = tester.get_test('test_data.json::growth::iAF1260.json')
+        assert ('file', os.path.join(project.tests_dir, 'growth.csv')) in test.dependencies()
+        assert test.references()['reactions'] == {'EX_glc__D_e', biomass}
+
+
+def test_fva_tests(monkeypatch):
+    """ FVA ranges are computed once for all tests on the same model configuration """
+    import cobra.flux_analysis
+    from gsmodutils.test import fva
+
+    calls = []
+    original = cobra.flux_analysis.flux_variability_analysis
+
+    def counted_fva(model, reaction_list, **kwargs):
+        calls.append(sorted(reaction_list))
+        return original(model, reaction_list, **kwargs)
+
+    monkeypatch.setattr(cobra.flux_analysis, 'flux_variability_analysis', counted_fva)
+    fva.clear_cache()
+
+    loads = []
+    original_load = ModelLoader.load
+
+    def counted_load(self, log):
+        loads.append((self.model_id, self.conditions_id, self.design_id))
+        return original_load(self, log)
+
+    monkeypatch.setattr(ModelLoader, 'load', counted_load)
+
+    with FakeProjectContext() as fp:
+        project = GSMProject(fp.path)
+        jtest = dict(
+            glycolysis=dict(
+                type='fva',
+                reaction_ranges=dict(
+                    PGI=dict(minimum=[4.0, 5.0], maximum=[4.0, 5.0]),
+                    PFK=dict(maximum=[0.0, 1.0]),
+                ),
+                description='Glycolysis at optimal growth',
+            ),
+            growth=dict(
+                type='fva',
+                reaction_ranges=dict(
+                    BIOMASS_Ec_iAF1260_core_59p81M=dict(minimum=[0.7, 0.8]),
+                    NOT_A_REACTION=dict(minimum=[0.0, 1.0]),
+                ),
+                description='Growth at optimal growth',
+            ),
+            suboptimal=dict(
+                type='fva',
+                fraction_of_optimum=0.9,
+                processes=2,
+                reaction_ranges=dict(PGI=dict(minimum=[-30, -20], maximum=[20, 30])),
+                description='Flexible glycolysis',
+            ),
+        )
+        with open(os.path.join(project.tests_dir, 'test_fva.json'), 'w+') as ff:
+            json.dump(jtest, ff)
+
+        tester = project.project_tester()
+        tester.collect_tests()
+
+        log = tester.run_by_id('test_fva.json::glycolysis::iAF1260.json')
+        assert log.log_count == (3, 1)
+        assert log.error[0][0] == 'reaction PFK maximum flux 6.19118 outside 0.0, 1.0'
+        assert calls == [['BIOMASS_Ec_iAF1260_core_59p81M', 'PFK', 'PGI']]
+
+        log = tester.run_by_id('test_fva.json::growth::iAF1260.json')
+        assert log.log_count == (2, 1)
+        assert log.error[0][0] == 'required reaction NOT_A_REACTION not found in model'
+        assert len(calls) == 1
+        # The model is loaded once for the batch
+        assert len(loads) == 1
+
+        log = tester.run_by_id('test_fva.json::suboptimal::iAF1260.json')
+        assert log.is_success
+        assert len(calls) == 2
+        assert len(loads) == 2
+
+        # Batches are computed again after project files change
+        tester.reset_batches()
+        tester.run_by_id('test_fva.json::growth::iAF1260.json')
+        assert len(loads) == 3
+
+        # A new tester of the same project on the same unchanged model uses the cached results
+        tester = project.project_tester()
+        tester.run_by_id('test_fva.json::glycolysis::iAF1260.json')
+        assert len(calls) == 2
+
+        # Results are cached for each project, so a reloaded project computes them again
+        GSMProject(fp.path).project_tester().run_by_id('test_fva.json::glycolysis::iAF1260.json')
+        assert len(calls) == 3
+
+        # Reactions of removed tests are no longer computed once the tests are updated
+        del jtest['growth']
+        with open(os.path.join(project.tests_dir, 'test_fva.json'), 'w+') as ff:
+            json.dump(jtest, ff)
+        fva.clear_cache()
+        tester.update_tests(['test_fva.json'])
+        tester.run_by_id('test_fva.json::glycolysis::iAF1260.json')
+        assert calls[-1] == ['PFK', 'PGI']
+
+        model = project.load_model()
+        assert fva.model_hash(model) == fva.model_hash(project.load_model())
+        model.reactions.PGI.upper_bound = 0
+        assert fva.model_hash(model) != fva.model_hash(project.load_model())
+
+
+def test_essentiality_tests():
+    """ Single gene and reaction deletions are checked for every model, conditions and design combination """
+    with FakeProjectContext() as fp:
+        fp.add_fake_conditions()
+        fp.add_fake_designs()
+        project = GSMProject(fp.path)
+        jtest = dict(
+            essential=dict(
+                type='essentiality',
+                conditions=['xyl_src'],
+                designs=['cbb_cycle', 'not_a_design'],
+                genes=dict(b0720=True, b4025=False, b3916=True, not_a_gene=False),
+                reactions=dict(CS=True, PGI=False),
+                processes=2,
+                description='Known essential genes',
+            ),
+        )
+        with open(os.path.join(project.tests_dir, 'test_essential.json'), 'w+') as ff:
+            json.dump(jtest, ff)
+
+        tester = project.project_tester()
+        tester.collect_tests()
+        tid = 'test_essential.json::essential::iAF1260.json::xyl_src::cbb_cycle'
+        assert sorted(tester.leaf_ids(skip_default=True)) == [
+            tid, 'test_essential.json::essential::iAF1260.json::xyl_src::not_a_design']
+
+        log = tester.run_by_id('test_essential.json::essential::iAF1260.json::xyl_src::not_a_design')
+        assert 'not_a_design not found' in log.error[0][0]
+
+        log = tester.run_by_id(tid)
+        assert log.log_count == (6, 2)
+        errors = [msg for msg, _ in log.error]
+        assert 'gene not_a_gene not found in model' in errors
+        assert any(msg.startswith('gene b3916 is not essential (growth') for msg in errors)
+        assert 'gene b0720 is essential' in [msg for msg, _ in log.success]
+
+        test = tester.get_test(tid)
+        assert test.references()['genes'] == {'b0720', 'b4025', 'b3916', 'not_a_gene'}
+        assert ('conditions', 'xyl_src') in test.dependencies()
+
+
+def test_deletion_result_shapes():
+    """ Deletion results are read from the current and older cobra result layouts """
+    import math
+    import pandas
+    from gsmodutils.test.essentiality import _deletion_growth
+
+    growth = [0.5, float('nan')]
+    status = ['optimal', 'infeasible']
+    current = pandas.DataFrame(dict(ids=[{'b0720'}, {'b3916'}], growth=growth, status=status))
+    older = pandas.DataFrame(dict(growth=growth, status=status),
+                             index=[frozenset(['b0720']), frozenset(['b3916'])])
+    oldest = pandas.DataFrame(dict(growth=growth, status=status), index=['b0720', 'b3916'])
+
+    for frame in [current, older, oldest]:
+        result = _deletion_growth(frame)
+        assert sorted(result) == ['b0720', 'b3916']
+        assert result['b0720'] == 0.5
+        assert math.isnan(result['b3916'])
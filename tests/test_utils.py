@@ -2,7 +2,8 @@ from tutils import FakeProjectContext
 import pytest
 from gsmodutils.utils.io import load_model, load_medium
 import tempfile
-from gsmodutils.utils.validator import validate_model
+import os
+from gsmodutils.utils.validator import validate_model, mass_balance
 import cobra
 from gsmodutils.utils import FrozenDict, convert_stoich, equal_stoich, biomass_debug
 
@@ -50,6 +51,32 @@ def test_validator():
         assert len(result['warnings']) == 1
 
 
+def test_mass_balance():
+    """ Vectorised mass balance matches cobra's per reaction check """
+    model = cobra.io.load_json_model(os.path.join(os.path.dirname(__file__), 'helpers', 'iAF1260.json'))
+    expected = dict()
+    for reaction in model.reactions:
+        balance = reaction.check_mass_balance()
+        if len(balance):
+            expected[reaction.id] = balance
+
+    unbalanced = mass_balance(model)
+    assert set(unbalanced) == set(expected)
+    for rid, balance in expected.items():
+        assert set(unbalanced[rid]) == set(balance)
+        for element, value in balance.items():
+            assert abs(unbalanced[rid][element] - value) < 1e-9
+
+    # Subsets of reactions
+    rids = sorted(expected)[:5] + ['PGI']
+    assert set(mass_balance(model, rids)) == set(rids[:5])
+
+    # Formulas that can't be parsed
+    model.metabolites.get_by_id('h2o_c').formula = 'H2O('
+    with pytest.raises(ValueError), pytest.warns(UserWarning):
+        mass_balance(model, ['ENO'])
+
+
 def test_forzen_dict():
     """"""
     fd = FrozenDict({'x': 'moo'})
@@ -87,6 +114,10 @@ def test_stoich_st():
         assert not equal_stoich(model.reactions[20], model.reactions[30])
 
 
+def _daemon_biomass_debug(model, queue):
+    queue.put(biomass_debug(model, 'BIOMASS_Ec_iAF1260_core_59p81M', processes=2))
+
+
 def test_biomass_debug():
     with pytest.raises(TypeError):
         biomass_debug(None, 'foo')
@@ -98,3 +129,23 @@ def test_biomass_debug():
         non_products = biomass_debug(model, model.reactions.BIOMASS_Ec_iAF1260_core_59p81M)
         assert len(non_products) == 0
 
+        # Precursors that cannot be produced are found, the model is left unchanged
+        biomass = model.reactions.BIOMASS_Ec_iAF1260_core_59p81M
+        biomass.add_metabolites({cobra.Metabolite('fake_c', compartment='c'): -1.0})
+        n_reactions = len(model.reactions)
+        objective = str(model.objective.expression)
+
+        assert biomass_debug(model, 'BIOMASS_Ec_iAF1260_core_59p81M') == ['fake_c']
+        assert biomass_debug(model, biomass, processes=2) == ['fake_c']
+
+        # Daemon processes, e.g. isolated test workers, check precursors in process
+        import multiprocessing
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_daemon_biomass_debug, args=(model, queue))
+        process.daemon = True
+        process.start()
+        assert queue.get(timeout=120) == ['fake_c']
+        process.join()
+        assert len(model.reactions) == n_reactions
+        assert str(model.objective.expression) == objective
+